@@ -0,0 +1,326 @@
+import logging
+import os
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from integrated_system import IntegratedSystem, NO_SPEECH_REPLY, ERROR_REPLY
+from remote_clients import GeminiClient
+from audio_utils import write_pcm16_wav
+from metrics import setup_logging
+from circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+class AsyncIntegratedSystem(IntegratedSystem):
+    """
+    asyncio variant of IntegratedSystem.
+
+    CPU-bound stages (emotion, Whisper, sentiment, playback) run in the thread
+    pool; Gemini and ElevenLabs are called over REST as awaitables with
+    deadlines, through the same circuit breakers as IntegratedSystem. A call
+    that misses its deadline fails and the turn falls back immediately. The
+    HTTP client's own timeout only bounds each socket operation, not the
+    whole request, so the deadline is what limits a turn's wait.
+    Base URLs can point at stub_servers.py to run fully offline.
+    """
+    def __init__(self, gemini_api_key=None, elevenlabs_api_key=None, gemini_base_url=None,
+                 elevenlabs_base_url=None, generate_timeout=10, synthesize_timeout=15,
+                 analysis_timeout=60, **kwargs):
+        # Deadline in seconds for the analysis stages (remote deadlines are kept by the base class)
+        self.analysis_timeout = analysis_timeout
+
+        # The REST client replaces the blocking Gemini SDK call
+        self.gemini_client = None
+        if gemini_api_key:
+            self.gemini_client = GeminiClient(gemini_api_key, base_url=gemini_base_url, timeout=generate_timeout)
+
+        # Remote calls get their own threads so they never queue behind model stages
+        self.io_executor = ThreadPoolExecutor(max_workers=4)
+
+        super().__init__(gemini_api_key, elevenlabs_api_key, elevenlabs_base_url=elevenlabs_base_url,
+                         generate_timeout=generate_timeout, synthesize_timeout=synthesize_timeout, **kwargs)
+
+    def _init_gemini(self):
+        """The REST client is used instead of the google.generativeai SDK"""
+        if self.gemini_model is None and not self.gemini_api_key:
+            logger.info("No Gemini API key provided. Response generation will be simulated.")
+        return self.gemini_model
+
+    def _init_elevenlabs(self):
+        """The REST client is used instead of the elevenlabs SDK"""
+        if not self.elevenlabs_api_key:
+            logger.info("No ElevenLabs API key provided. Voice synthesis will be simulated.")
+
+    def _stream_gemini(self, prompt, transcript):
+        """Streams over REST when a client is configured; each chunk must arrive within generate_timeout"""
+        if self.gemini_client:
+            yield from self.gemini_breaker.stream(self.gemini_client.stream_generate, prompt,
+                                                  timeout=self.generate_timeout, deadline=self.generate_timeout)
+        else:
+            yield from super()._stream_gemini(prompt, transcript)
+    
+    async def _run(self, fn, *args, timeout=None, executor=None):
+        """Runs a blocking call in an executor and awaits it with an optional deadline"""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor or self.executor, fn, *args)
+        return await asyncio.wait_for(future, timeout)
+
+    async def generate_response_async(self, transcript):
+        """Generates a response using Gemini, falling back if the deadline is missed"""
+        if not transcript or transcript.strip() == "":
+            return NO_SPEECH_REPLY
+
+        # Add user message to conversation history
+        self.conversation_history.add("user", transcript)
+
+        try:
+            if self.gemini_client:
+                request = functools.partial(self.gemini_breaker.call, self.gemini_client.generate,
+                                            self._build_prompt(), deadline=self.generate_timeout)
+                ai_response = await self._run(request, executor=self.io_executor)
+            else:
+                # Simulate response if no API key
+                ai_response = f"This is a simulated response to: '{transcript}'"
+        except CircuitOpenError as e:
+            logger.warning(f"⚡ {e}; using the fallback reply")
+            return ERROR_REPLY
+        except (asyncio.TimeoutError, TimeoutError):
+            logger.warning(f"⚠️ Gemini did not answer within {self.generate_timeout}s")
+            self.metrics.inc("errors_total", component="generate")
+            return ERROR_REPLY
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            self.metrics.inc("errors_total", component="generate")
+            return ERROR_REPLY
+
+        # Add AI response to conversation history
+        self.conversation_history.add("assistant", ai_response)
+        return ai_response
+
+    async def synthesize_voice_async(self, text, tone):
+        """Synthesizes `text` to RESPONSE_AUDIO. Returns True if audio was produced."""
+        # Cached phrases need no API call
+        cached = self._cached_speech(text, tone)
+        if cached is not None:
+            write_pcm16_wav(self.RESPONSE_AUDIO, cached, self.tts_sample_rate)
+            return True
+        
+        if self.elevenlabs_client:
+            try:
+                request = functools.partial(self.elevenlabs_breaker.call, self.elevenlabs_client.synthesize,
+                                            self._format_tts_text(text, tone), self.VOICE_ID, self.TTS_MODEL,
+                                            self.VOICE_SETTINGS, deadline=self.synthesize_timeout)
+                pcm = await self._run(request, executor=self.io_executor)
+                if self.tts_cache is not None:
+                    self.tts_cache.put(self._tts_cache_key(text, tone), pcm)
+                write_pcm16_wav(self.RESPONSE_AUDIO, pcm, self.elevenlabs_client.sample_rate)
+                return True
+            except CircuitOpenError as e:
+                logger.warning(f"⚡ {e}; using simulated voice")
+            except (asyncio.TimeoutError, TimeoutError):
+                logger.warning(f"⚠️ ElevenLabs did not answer within {self.synthesize_timeout}s. Falling back to simulated voice.")
+                self.metrics.inc("errors_total", component="synthesize")
+            except Exception as e:
+                logger.error(f"ElevenLabs API error: {str(e)}")
+                self.metrics.inc("errors_total", component="synthesize")
+
+        # Simulate voice synthesis (fallback or if API key not provided)
+        logger.info(f"\n[Simulated Voice] Speaking with {tone['style']} tone, {tone['rate']} rate, {tone['pitch']} pitch:")
+        logger.info(f"'{text}'")
+        return False
+
+    async def process_interaction_async(self, next_audio=None):
+        """
+        Process a single interaction as an asyncio task graph.
+        `next_audio` may be a task capturing this turn's utterance.
+        Returns a task capturing the next utterance (or None).
+        """
+        timings = {}
+        turn_start = time.perf_counter()
+
+        # Record audio
+        if next_audio is None:
+            audio, transcript = await self._run(self.capture_turn)
+        else:
+            audio, transcript = await next_audio
+        utterance_end = time.perf_counter()
+        timings["record"] = utterance_end - turn_start
+        if audio is None or len(audio) == 0:
+            logger.error("❌ Failed to record audio")
+            return None
+
+        # Transcription and sentiment need the background-loaded models
+        ready = await self._run(self.wait_until_ready, executor=self.io_executor)
+        if not ready:
+            logger.error("❌ Models failed to load")
+            return None
+
+        # Voice emotion and transcription run concurrently
+        try:
+            (emotion_result, timings["emotion"]), (transcript, timings["transcribe"]) = await asyncio.wait_for(
+                asyncio.gather(
+                    self._run(self._timed, self.voice_detector.detect_emotion_from_array, audio, None,
+                              self.emotion_state),
+                    self._run(self._timed, self._transcript_for, audio, transcript),
+                ),
+                self.analysis_timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Audio analysis took longer than {self.analysis_timeout}s")
+            self.metrics.inc("errors_total", component="analysis")
+            return None
+        Voice_emotion, Voice_confidence = emotion_result
+        transcript = transcript.strip()
+        logger.info(f"Voice Emotion: {Voice_emotion.upper()} (confidence: {Voice_confidence:.2f})")
+
+        if not transcript:
+            logger.warning("⚠️ No speech detected or transcription failed")
+            return None
+
+        logger.info(f"📝 Transcript: \"{transcript}\"")
+
+        # Sentiment and response generation are independent of each other
+        sentiment_task = asyncio.ensure_future(self._run(self._timed, self.text_checker.analyze_transcript, transcript))
+        
+        if self.stream_llm:
+            return await self._stream_response_async(transcript, Voice_emotion, sentiment_task, utterance_end,
+                                                     timings)
+        
+        generate_start = time.perf_counter()
+        response_text = await self.generate_response_async(transcript)
+        timings["generate"] = time.perf_counter() - generate_start
+        (sentiment_score, sentiment_label), timings["sentiment"] = await sentiment_task
+
+        if sentiment_score is not None:
+            logger.info(f"Text Sentiment: {sentiment_label.upper()} (score: {sentiment_score:.2f})")
+
+        # Pick the tone for this reply
+        current_tone = self.tone_switcher.decide_now(transcript, Voice_emotion, sentiment_label)
+        logger.info(f"AI Response: \"{response_text}\"")
+        logger.info(f"Selected tone: {current_tone['style']} (rate: {current_tone['rate']}, pitch: {current_tone['pitch']})")
+
+        # Start capturing the next utterance while this response plays
+        next_task = None
+
+        if self.stream_tts and self.elevenlabs_client:
+            # Synthesis and playback overlap; the response starts with the first chunk
+            if self.pipelined and self.use_vad:
+                next_task = asyncio.ensure_future(self._run(self.capture_turn))
+            voice_success, timings["speak"] = await self._run(self._timed, self.speak_streaming, response_text,
+                                                              current_tone, utterance_end, executor=self.io_executor)
+            if voice_success:
+                timings["first_audio"] = self.player.last_time_to_first_audio
+            timings["critical_path"] = timings.get("first_audio", time.perf_counter() - utterance_end)
+        else:
+            # Synthesize voice
+            synthesize_start = time.perf_counter()
+            voice_success = await self.synthesize_voice_async(response_text, current_tone)
+            timings["synthesize"] = time.perf_counter() - synthesize_start
+            timings["critical_path"] = time.perf_counter() - utterance_end
+
+            if self.pipelined and self.use_vad:
+                next_task = asyncio.ensure_future(self._run(self.capture_turn))
+
+            if voice_success:
+                _, timings["play"] = await self._run(self._timed, self.play_audio, self.RESPONSE_AUDIO)
+
+        self._finish_turn(timings, voice_emotion=Voice_emotion, sentiment=sentiment_label, tone=current_tone)
+        return next_task
+
+    async def _stream_response_async(self, transcript, voice_emotion, sentiment_task, utterance_end, timings):
+        """Speaks the response sentence by sentence while Gemini streams it; `voice_emotion` is this utterance's"""
+        (sentiment_score, sentiment_label), timings["sentiment"] = await sentiment_task
+        if sentiment_score is not None:
+            logger.info(f"Text Sentiment: {sentiment_label.upper()} (score: {sentiment_score:.2f})")
+        
+        current_tone = self.tone_switcher.decide_now(transcript, voice_emotion, sentiment_label)
+        logger.info(f"Selected tone: {current_tone['style']} (rate: {current_tone['rate']}, pitch: {current_tone['pitch']})")
+        
+        next_task = None
+        if self.pipelined and self.use_vad:
+            next_task = asyncio.ensure_future(self._run(self.capture_turn))
+        
+        sentences = self.generate_response(transcript, stream=True)
+        (response_text, speak_timings), timings["speak"] = await self._run(
+            self._timed, self.speak_sentences, sentences, current_tone, utterance_end, executor=self.io_executor)
+        timings.update(speak_timings)
+        logger.info(f"AI Response: \"{response_text}\"")
+        timings["critical_path"] = timings.get("first_audio", time.perf_counter() - utterance_end)
+        
+        self._finish_turn(timings, voice_emotion=voice_emotion, sentiment=sentiment_label, tone=current_tone)
+        return next_task
+    
+    async def run(self):
+        """Main loop: one interaction task after another"""
+        logger.info("Speak into the microphone when prompted.")
+        logger.info("Press Ctrl+C to exit.")
+        next_audio = None
+        try:
+            while True:
+                logger.info("\n----- New Interaction -----")
+                next_audio = await self.process_interaction_async(next_audio)
+                if not self.use_vad:
+                    logger.info("\nReady for next interaction in 2 seconds...")
+                    await asyncio.sleep(2)
+        finally:
+            if next_audio is not None:
+                next_audio.cancel()
+
+    def start(self):
+        """Start the asyncio main loop"""
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            logger.info("\n\n✅ System stopped. Exiting...")
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        """Clean up resources."""
+        self.io_executor.shutdown(wait=False)
+        super().cleanup()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the asyncio Feel-Aware system")
+    parser.add_argument("--stub", action="store_true",
+                        help="use local Gemini/ElevenLabs stub servers instead of the real APIs")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve /metrics and /metrics.json on this port")
+    parser.add_argument("--trace-log", default=None, help="append one JSON line per turn to this file")
+    parser.add_argument("--emotion-backend", default="rules", choices=["rules", "wav2vec2", "cascade"],
+                        help="voice emotion classifier (cascade: rules, wav2vec2 only when unsure)")
+    args = parser.parse_args()
+    setup_logging()
+
+    # Load environment variables from .env file
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        print("⚠️ dotenv package not found. Using environment variables directly.")
+
+    gemini_api_key = os.environ.get("GEMINI_API_KEY")
+    elevenlabs_api_key = os.environ.get("ELEVENLABS_API_KEY")
+    gemini_base_url = None
+    elevenlabs_base_url = None
+
+    if args.stub:
+        from stub_servers import StubGeminiServer, StubElevenLabsServer
+        gemini_stub = StubGeminiServer().start()
+        elevenlabs_stub = StubElevenLabsServer().start()
+        gemini_api_key, gemini_base_url = "stub", gemini_stub.url
+        elevenlabs_api_key, elevenlabs_base_url = "stub", elevenlabs_stub.url
+        print(f"🧪 Using stub servers: {gemini_base_url}, {elevenlabs_base_url}")
+
+    system = AsyncIntegratedSystem(gemini_api_key, elevenlabs_api_key,
+                                   gemini_base_url=gemini_base_url,
+                                   elevenlabs_base_url=elevenlabs_base_url,
+                                   background_load=True,
+                                   metrics_port=args.metrics_port, trace_log=args.trace_log,
+                                   emotion_backend=args.emotion_backend)
+    if system.metrics_server is not None:
+        print(f"📈 Metrics at {system.metrics_server.url}")
+    system.start()
@@ -0,0 +1,131 @@
+import logging
+import time
+import threading
+import numpy as np
+import pyaudio
+from audio_utils import pcm16_to_float32
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+class MicrophoneCapture:
+    """
+    Single long-lived microphone input stream feeding a preallocated ring buffer.
+
+    One capture thread owns the PyAudio stream; consumers (emotion windows,
+    utterance recorder, ...) read at their own cadence using absolute sample
+    positions. The ring is stored twice back to back, so any window up to
+    `capacity` samples long is a contiguous zero-copy view. A view stays valid
+    until the writer laps it, i.e. for roughly `buffer_seconds`.
+    """
+    def __init__(self, audio, rate=16000, chunk=1024, buffer_seconds=60):
+        self.audio = audio
+        self.RATE = rate
+        self.CHUNK = chunk
+        self.CHANNELS = 1
+        self.FORMAT = pyaudio.paInt16
+
+        # Capacity is a whole number of chunks so a chunk never straddles the end
+        self.capacity = max(1, int(rate * buffer_seconds) // chunk) * chunk
+        self._buffer = np.zeros(2 * self.capacity, dtype=np.float32)
+
+        # Total samples captured so far (monotonic, never wraps)
+        self._position = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._stream = None
+        self._thread = None
+
+    @property
+    def position(self):
+        """Absolute index of the next sample to be captured"""
+        with self._cond:
+            return self._position
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        """Opens the input stream and starts the capture thread"""
+        if self._running:
+            return
+        self._stream = self.audio.open(format=self.FORMAT, channels=self.CHANNELS,
+                                       rate=self.RATE, input=True,
+                                       frames_per_buffer=self.CHUNK)
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop)
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info("🎙️ Microphone capture started")
+
+    def _capture_loop(self):
+        """Thread that reads the stream and writes each chunk into the ring"""
+        while self._running:
+            try:
+                data = self._stream.read(self.CHUNK, exception_on_overflow=False)
+            except Exception as e:
+                logger.error(f"Error in microphone capture: {str(e)}")
+                get_metrics().inc("errors_total", component="microphone")
+                time.sleep(0.1)
+                continue
+
+            # Write the chunk and its mirror copy, then publish the new position
+            offset = self._position % self.capacity
+            chunk = self._buffer[offset:offset + self.CHUNK]
+            pcm16_to_float32(data, out=chunk)
+            self._buffer[offset + self.capacity:offset + self.capacity + self.CHUNK] = chunk
+
+            with self._cond:
+                self._position += self.CHUNK
+                self._cond.notify_all()
+
+    def wait_for(self, position, timeout=None):
+        """Blocks until `position` samples have been captured. Returns False on timeout or stop."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._position >= position or not self._running, timeout)
+            return self._position >= position
+
+    def read(self, start, num_samples, timeout=None):
+        """
+        Returns a zero-copy view of samples [start, start + num_samples),
+        waiting until they have been captured.
+        Returns None on timeout or if capture stopped first.
+        """
+        if num_samples > self.capacity:
+            raise ValueError(f"Cannot read {num_samples} samples from a ring of {self.capacity}")
+
+        if not self.wait_for(start + num_samples, timeout):
+            return None
+
+        with self._cond:
+            if self._position - start > self.capacity:
+                raise BufferError("Requested audio has already been overwritten")
+
+        offset = start % self.capacity
+        return self._buffer[offset:offset + num_samples]
+
+    def latest(self, num_samples):
+        """Returns a zero-copy view of the most recent `num_samples` captured samples"""
+        num_samples = min(num_samples, self.capacity)
+        with self._cond:
+            end = self._position
+        start = max(0, end - num_samples)
+        offset = start % self.capacity
+        return self._buffer[offset:offset + (end - start)]
+
+    def stop(self):
+        """Stops the capture thread and closes the stream"""
+        if not self._running:
+            return
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        try:
+            self._stream.stop_stream()
+            self._stream.close()
+        except Exception as e:
+            logger.error(f"Error closing microphone stream: {str(e)}")
+        logger.info("🛑 Microphone capture stopped")
@@ -0,0 +1,132 @@
+import logging
+import time
+import queue
+import threading
+import pyaudio
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+class StreamingPlayer:
+    """
+    Persistent PyAudio output stream fed through a bounded chunk buffer.
+
+    play() accepts any iterable of 16-bit PCM chunks (e.g. an HTTP response
+    being streamed) and starts playback with the first chunk instead of
+    waiting for the last. The bounded buffer applies back-pressure to the
+    producer, so memory stays flat however long the audio is.
+    """
+    def __init__(self, audio, rate=16000, channels=1, max_buffered_chunks=16):
+        self.audio = audio
+        self.RATE = rate
+        self.CHANNELS = channels
+        self.FORMAT = pyaudio.paInt16
+
+        self.buffer = queue.Queue(maxsize=max_buffered_chunks)
+        self.stream = None
+        self.stream_rate = None
+        self.thread = None
+
+        # Time from play() being called to the first chunk reaching the output
+        self.last_time_to_first_audio = None
+        self.last_first_audio_at = None
+        self.time_to_first_audio = []
+
+        # Whether play() is running, and when it last finished (for echo gating)
+        self.playing = False
+        self.last_playback_end = None
+
+    def _ensure_stream(self, rate):
+        """Opens the output stream once and keeps it open (reopened only if the rate changes)"""
+        if self.stream is not None and self.stream_rate == rate:
+            return
+        if self.stream is not None:
+            self._drain()
+            self.stream.stop_stream()
+            self.stream.close()
+        self.stream = self.audio.open(format=self.FORMAT, channels=self.CHANNELS,
+                                      rate=rate, output=True)
+        self.stream_rate = rate
+
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._playback_loop)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def _playback_loop(self):
+        """Thread that writes buffered chunks to the output stream"""
+        while True:
+            item = self.buffer.get()
+            if item is None:
+                break
+            if isinstance(item, threading.Event):
+                item.set()  # Marks the end of one play() call
+                continue
+            try:
+                self.stream.write(item)
+            except Exception as e:
+                logger.error(f"Error playing audio: {str(e)}")
+                get_metrics().inc("errors_total", component="play")
+
+    def _drain(self):
+        """Blocks until everything queued so far has been written"""
+        done = threading.Event()
+        self.buffer.put(done)
+        done.wait()
+
+    def play(self, chunks, rate=None, start_time=None):
+        """
+        Plays PCM chunks as they arrive and returns once playback has finished.
+        `start_time` (a perf_counter value) is where time-to-first-audio is
+        measured from; defaults to now.
+        Returns True if any audio was played.
+        """
+        start_time = start_time if start_time is not None else time.perf_counter()
+        self._ensure_stream(rate or self.RATE)
+
+        played = False
+        remainder = b""
+        self.playing = True
+        try:
+            for chunk in chunks:
+                # Keep samples whole when a chunk splits one
+                data = remainder + chunk
+                cut = len(data) - len(data) % (2 * self.CHANNELS)
+                data, remainder = data[:cut], data[cut:]
+                if not data:
+                    continue
+                if not played:
+                    played = True
+                    self.last_first_audio_at = time.perf_counter()
+                    self.last_time_to_first_audio = self.last_first_audio_at - start_time
+                    self.time_to_first_audio.append(self.last_time_to_first_audio)
+                self.buffer.put(data)  # Blocks while the buffer is full
+
+            self._drain()
+        finally:
+            self.playing = False
+            self.last_playback_end = time.monotonic()
+        return played
+
+    def is_playing(self, tail_seconds=0.0):
+        """
+        True while play() is running and for `tail_seconds` after it returns,
+        which covers the device's own buffer and the room's echo.
+        """
+        if self.playing:
+            return True
+        return self.last_playback_end is not None and time.monotonic() - self.last_playback_end < tail_seconds
+
+    def close(self):
+        """Stops the playback thread and closes the output stream"""
+        if self.thread is not None:
+            self.buffer.put(None)
+            self.thread.join(timeout=2)
+            self.thread = None
+        if self.stream is not None:
+            try:
+                self.stream.stop_stream()
+                self.stream.close()
+            except Exception as e:
+                logger.error(f"Error closing output stream: {str(e)}")
+            self.stream = None
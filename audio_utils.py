@@ -0,0 +1,59 @@
+import wave
+import numpy as np
+
+# Scale factor from int16 PCM to float32 samples in [-1, 1)
+INT16_SCALE = 1.0 / 32768.0
+
+def pcm16_to_float32(data, out=None):
+    """
+    Converts raw int16 PCM bytes to float32 samples in [-1, 1).
+    If `out` is given the samples are written into it (no intermediate
+    float64 copy), which lets callers fill a preallocated buffer chunk by chunk.
+    """
+    samples = np.frombuffer(data, dtype=np.int16)
+    if out is None:
+        out = np.empty(samples.shape, dtype=np.float32)
+    np.multiply(samples, np.float32(INT16_SCALE), out=out, casting="unsafe")
+    return out
+
+def float32_to_pcm16(audio):
+    """Converts float32 samples in [-1, 1] back to int16 PCM bytes"""
+    clipped = np.clip(audio, -1.0, 1.0 - INT16_SCALE)
+    return (clipped * 32768.0).astype(np.int16).tobytes()
+
+def write_wav(filename, audio, rate, channels=1):
+    """Writes a float32 buffer to a 16-bit WAV file (used for debugging only)"""
+    with wave.open(filename, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(float32_to_pcm16(audio))
+    return filename
+
+def load_audio(filename, rate):
+    """Loads an audio file from disk as a mono float32 buffer at `rate`"""
+    import librosa
+    audio, _ = librosa.load(filename, sr=rate)
+    return audio.astype(np.float32, copy=False)
+
+def rms(audio):
+    """Root-mean-square energy of a float32 buffer"""
+    if len(audio) == 0:
+        return 0.0
+    return float(np.sqrt(np.mean(np.square(audio, dtype=np.float32))))
+
+def zero_crossing_rate(audio):
+    """Fraction of adjacent sample pairs whose sign differs"""
+    if len(audio) < 2:
+        return 0.0
+    signs = np.signbit(audio)
+    return float(np.count_nonzero(signs[1:] != signs[:-1]) / (len(audio) - 1))
+
+def write_pcm16_wav(filename, pcm, rate, channels=1):
+    """Writes raw 16-bit PCM bytes to a WAV file"""
+    with wave.open(filename, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(pcm)
+    return filename
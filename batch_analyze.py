@@ -0,0 +1,222 @@
+"""
+Offline batch analysis of recorded audio.
+
+Runs voice emotion, Whisper transcription, text sentiment and the tone
+decision over a directory (or manifest) of audio files on a process pool.
+Each worker loads the models once. Results stream to JSONL, or to a Parquet
+dataset directory, and an interrupted run picks up where it left off.
+
+    python batch_analyze.py recordings/ -o results.jsonl --workers 4
+    python batch_analyze.py --manifest calls.txt -o results.parquet --format parquet
+"""
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+RATE = 16000
+
+# Per-worker components, created once by _init_worker()
+_worker = {}
+
+def find_audio_files(directory, pattern="**/*.wav"):
+    """Audio files under `directory`, sorted so runs are reproducible"""
+    return sorted(glob.glob(os.path.join(directory, pattern), recursive=True))
+
+def read_manifest(path):
+    """One audio path per line (relative paths are relative to the manifest); # starts a comment"""
+    base = os.path.dirname(os.path.abspath(path))
+    files = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                files.append(line if os.path.isabs(line) else os.path.join(base, line))
+    return files
+
+def _init_worker(whisper_model_size, whisper_options, threads):
+    """Loads every model once per worker process"""
+    try:
+        import torch
+        torch.set_num_threads(threads)  # Workers share the cores instead of oversubscribing them
+    except ImportError:
+        pass
+
+    from voice_emotion_detector import VoiceEmotionDetector
+    from text_sentiment_checker import TextSentimentChecker
+    from tone_switcher import ToneSwitcher
+    from transcriber import WhisperTranscriber
+
+    _worker["detector"] = VoiceEmotionDetector()
+    _worker["checker"] = TextSentimentChecker()
+    _worker["transcriber"] = WhisperTranscriber(whisper_model_size, **whisper_options)
+    _worker["switcher"] = ToneSwitcher(_worker["detector"], _worker["checker"])
+
+def analyze_file(path):
+    """Analyzes one recording in a worker. Returns a result row (with "error" set on failure)."""
+    from audio_utils import load_audio
+
+    start = time.perf_counter()
+    row = {"path": path}
+    try:
+        audio = load_audio(path, RATE)
+        row["duration"] = len(audio) / RATE
+
+        emotion, confidence = _worker["detector"].detect_emotion_from_array(audio, RATE)
+        row["voice_emotion"] = emotion
+        row["voice_confidence"] = float(confidence)
+
+        # Every recording is its own session, so its language is detected afresh
+        transcriber = _worker["transcriber"]
+        transcriber.reset_session()
+        row["transcript"] = transcriber.transcribe(audio)
+        row["language"] = transcriber.session_language
+
+        score, label = _worker["checker"].analyze_transcript(row["transcript"]) if row["transcript"] else (0.0, "neutral")
+        row["sentiment_score"] = float(score)
+        row["sentiment_label"] = label
+
+        # The same decision the live loop makes from these two inputs
+        tone = _worker["switcher"].decide_now(row["transcript"], emotion, label)
+        row["tone_style"] = tone["style"]
+        row["tone_rate"] = tone["rate"]
+        row["tone_pitch"] = tone["pitch"]
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["seconds"] = time.perf_counter() - start
+    return row
+
+class JsonlWriter:
+    """Appends one JSON object per line, flushed per row so a crash loses nothing"""
+    def __init__(self, path):
+        self.path = path
+
+    def completed(self):
+        """Paths that already have a successful row"""
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Torn last line from an interrupted run
+                if "error" not in row:
+                    done.add(row["path"])
+        return done
+
+    def __enter__(self):
+        self.file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def write(self, row):
+        self.file.write(json.dumps(row) + "\n")
+        self.file.flush()
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+class ParquetWriter:
+    """
+    Writes a Parquet dataset directory, one part file per `rows_per_part` rows,
+    so finished parts survive an interrupted run.
+    """
+    def __init__(self, path, rows_per_part=500):
+        self.path = path
+        self.rows_per_part = rows_per_part
+        self.rows = []
+
+    def completed(self):
+        done = set()
+        if not os.path.isdir(self.path):
+            return done
+        import pandas as pd
+        for part in glob.glob(os.path.join(self.path, "part-*.parquet")):
+            frame = pd.read_parquet(part)
+            if "error" in frame:
+                frame = frame[frame["error"].isna()]
+            done.update(frame["path"])
+        return done
+
+    def __enter__(self):
+        import pandas as pd  # Fails early if Parquet support is missing
+        os.makedirs(self.path, exist_ok=True)
+        self.pd = pd
+        return self
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.rows_per_part:
+            self._flush()
+
+    def _flush(self):
+        if not self.rows:
+            return
+        name = f"part-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{len(os.listdir(self.path)):05d}.parquet"
+        self.pd.DataFrame(self.rows).to_parquet(os.path.join(self.path, name), index=False)
+        self.rows = []
+
+    def __exit__(self, *exc):
+        self._flush()
+
+def run(files, writer, workers, whisper_model_size="tiny", whisper_options=None, threads_per_worker=None):
+    """Analyzes `files` on a process pool, skipping those already in the output. Returns (ok, failed)."""
+    done = writer.completed()
+    pending = [path for path in files if path not in done]
+    print(f"📂 {len(files)} files, {len(done & set(files))} already done, {len(pending)} to analyze")
+    if not pending:
+        return 0, 0
+
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    ok = failed = 0
+    start = time.perf_counter()
+    with writer, ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(whisper_model_size, whisper_options or {}, threads)) as pool:
+        futures = [pool.submit(analyze_file, path) for path in pending]
+        for count, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            writer.write(row)
+            if "error" in row:
+                failed += 1
+                print(f"❌ [{count}/{len(pending)}] {row['path']}: {row['error']}")
+            else:
+                ok += 1
+                print(f"✅ [{count}/{len(pending)}] {row['path']}: {row['voice_emotion']}, "
+                      f"{row['sentiment_label']} -> {row['tone_style']} ({row['seconds']:.1f}s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"🏁 {ok} analyzed, {failed} failed in {elapsed:.1f}s ({len(pending) / elapsed:.2f} files/s)")
+    return ok, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-analyze recorded audio files")
+    parser.add_argument("directory", nargs="?", help="directory to search for audio files")
+    parser.add_argument("--manifest", help="file listing one audio path per line")
+    parser.add_argument("--pattern", default="**/*.wav", help="glob used inside the directory")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default=None,
+                        help="defaults to the output file extension")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--language", default=None, help="skip language detection, e.g. en")
+    parser.add_argument("--beam-size", type=int, default=5)
+    args = parser.parse_args()
+
+    if not args.directory and not args.manifest:
+        parser.error("give a directory or --manifest")
+    files = read_manifest(args.manifest) if args.manifest else find_audio_files(args.directory, args.pattern)
+
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "jsonl")
+    writer = ParquetWriter(args.output) if output_format == "parquet" else JsonlWriter(args.output)
+
+    whisper_options = {"language": args.language, "beam_size": args.beam_size}
+    _, failed = run(files, writer, args.workers, args.whisper_model, whisper_options, args.threads_per_worker)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Micro-benchmark: the original librosa feature path (pyin + rms + zcr +
+spectral centroid, each framing the signal again) against the single-pass
+extractor in voice_features.py, on the same input.
+
+Usage:
+    python benchmarks/feature_benchmark.py [--seconds 1] [--repeat 20] [--wav clip.wav]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from voice_features import extract_features, summarize
+
+RATE = 16000
+
+def synthetic_voice(seconds, rate=RATE, seed=0):
+    """Deterministic voice-like signal: a gliding harmonic tone with noise and pauses"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    f0 = 140 + 40 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = (np.sin(2 * np.pi * 2 * t) > -0.3).astype(np.float64)
+    return (0.1 * voice * envelope + 0.005 * rng.standard_normal(len(t))).astype(np.float32)
+
+def librosa_path(audio, sr):
+    """The detector's original feature computation"""
+    import librosa
+    f0, voiced_flag, voiced_probs = librosa.pyin(audio, fmin=librosa.note_to_hz('C2'), fmax=librosa.note_to_hz('C7'))
+    return {
+        "energy": float(np.mean(librosa.feature.rms(y=audio))),
+        "zero_crossing": float(np.mean(librosa.feature.zero_crossing_rate(y=audio))),
+        "spectral_centroid": float(np.mean(librosa.feature.spectral_centroid(y=audio, sr=sr))),
+        "pitch": float(np.nanmean(f0)) if np.any(~np.isnan(f0)) else None,
+    }
+
+def time_call(fn, repeat):
+    """Returns (median seconds, last result) over `repeat` calls after one warm-up call"""
+    result = fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare voice feature extraction paths")
+    parser.add_argument("--seconds", type=float, default=1.0, help="length of the synthetic clip")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--wav", help="use this audio file instead of a synthetic clip")
+    args = parser.parse_args()
+
+    if args.wav:
+        from audio_utils import load_audio
+        audio = load_audio(args.wav, RATE)
+    else:
+        audio = synthetic_voice(args.seconds)
+    print(f"Input: {len(audio) / RATE:.2f} s at {RATE} Hz, {args.repeat} runs each\n")
+
+    paths = [
+        ("single pass", lambda: summarize(extract_features(audio, RATE))),
+        ("single pass + YIN pitch", lambda: summarize(extract_features(audio, RATE, pitch=True))),
+    ]
+    try:
+        import librosa  # noqa: F401
+        paths.insert(0, ("librosa (pyin + 3 calls)", lambda: librosa_path(audio, RATE)))
+    except ImportError:
+        print("⚠️ librosa not installed; skipping the original path\n")
+
+    results = {}
+    for name, fn in paths:
+        seconds, features = time_call(fn, args.repeat)
+        results[name] = (seconds, features)
+        pitch = features.get("pitch")
+        pitch_text = f"{pitch:7.1f} Hz" if pitch else "      -   "
+        print(f"{name:<28}{seconds * 1000:9.2f} ms   energy={features['energy']:.4f} "
+              f"zcr={features['zero_crossing']:.4f} centroid={features['spectral_centroid']:7.1f} "
+              f"pitch={pitch_text}")
+
+    baseline = results.get("librosa (pyin + 3 calls)")
+    if baseline:
+        print()
+        for name, (seconds, _) in results.items():
+            if name != "librosa (pyin + 3 calls)":
+                print(f"{name}: {baseline[0] / seconds:.1f}x faster than the original path")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Pipeline benchmark: times every stage on deterministic synthetic audio (or
+recorded fixtures) and reports p50/p95/p99 latency and peak allocations.
+
+Stages: detect_emotion_from_file, transcribe_audio, get_sentiment_score,
+_decide_tone, generate_ssml and an end-to-end process_interaction. Gemini,
+ElevenLabs and PyAudio are always stubbed (stub_servers.py and a silent
+in-process audio device). --stub-models also replaces Whisper and the
+sentiment model so the suite runs without any model downloads.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py --json results.json
+    python benchmarks/pipeline_benchmark.py --json new.json --baseline results.json [--tolerance 0.2]
+
+Comparing against a baseline exits with status 1 if any stage's p50 or p95
+got slower by more than the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import types
+import shutil
+import logging
+import contextlib
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from feature_benchmark import synthetic_voice
+from audio_utils import write_wav
+
+RATE = 16000
+STAGES = ["detect_emotion_from_file", "transcribe_audio", "get_sentiment_score",
+          "_decide_tone", "generate_ssml", "process_interaction"]
+
+TRANSCRIPTS = [
+    "I had a really great day at work today",
+    "I'm so frustrated, nothing is going right",
+    "Can you tell me what the weather is like",
+    "I feel a bit sad about how things turned out",
+]
+
+# Stub audio device
+
+class _StubStream:
+    """Silent input paced like a real microphone; output is discarded"""
+    def __init__(self, rate, frames_per_buffer):
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+
+    def read(self, frames, exception_on_overflow=True):
+        time.sleep(frames / self.rate)
+        return bytes(2 * frames)
+
+    def write(self, data):
+        pass
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+class StubPyAudio:
+    def open(self, rate=RATE, frames_per_buffer=1024, **kwargs):
+        return _StubStream(rate, frames_per_buffer)
+
+    def get_format_from_width(self, width):
+        return 8
+
+    def terminate(self):
+        pass
+
+def _ensure_pyaudio():
+    """The benchmark never touches a real device, so PortAudio is optional"""
+    try:
+        import pyaudio  # noqa: F401
+    except ImportError:
+        sys.modules["pyaudio"] = types.SimpleNamespace(paInt16=8, PyAudio=StubPyAudio)
+
+# Stub models
+
+def _stub_sentiment(texts, batch_size=None):
+    return [{"label": "POSITIVE" if len(text) % 2 else "NEGATIVE", "score": 0.9} for text in texts]
+
+def _stub_transcribe(audio, partial=False):
+    return TRANSCRIPTS[len(audio) % len(TRANSCRIPTS)]
+
+def make_registry(stub_models):
+    from model_registry import ModelRegistry
+    registry = ModelRegistry()
+    registry.register("pyaudio", lambda variant: StubPyAudio())
+    if stub_models:
+        registry.register("sentiment", lambda variant: _stub_sentiment)
+        registry.register("whisper", lambda variant: types.SimpleNamespace(is_multilingual=False))
+    return registry
+
+# Inputs
+
+def synthetic_clips(seconds, count, seed=0):
+    """Deterministic mix of voice-like audio, pure tones and noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * RATE)) / RATE
+    clips = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            clip = synthetic_voice(seconds, seed=seed + i)
+        elif kind == 1:
+            clip = 0.2 * np.sin(2 * np.pi * (110 + 40 * i) * t)
+        else:
+            clip = 0.05 * rng.standard_normal(len(t))
+        clips.append(clip.astype(np.float32))
+    return clips
+
+def load_fixtures(directory):
+    from audio_utils import load_audio
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".wav"))
+    return [load_audio(path, RATE) for path in paths]
+
+# Measurement
+
+@contextlib.contextmanager
+def _quiet_logging(level=logging.ERROR):
+    """Raises the root logger to `level` for the enclosed block"""
+    root = logging.getLogger()
+    previous = root.level
+    root.setLevel(level)
+    try:
+        yield
+    finally:
+        root.setLevel(previous)
+
+def measure(fn, inputs, iterations, warmup=2):
+    """Times fn(input) over `iterations` calls cycling through `inputs`, then one traced call for peak memory"""
+    for i in range(warmup):
+        fn(inputs[i % len(inputs)])
+    times = []
+    for i in range(iterations):
+        item = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        fn(item)
+        times.append(time.perf_counter() - start)
+
+    # Tracing slows calls down, so peak allocations come from a separate run
+    tracemalloc.start()
+    fn(inputs[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times_ms = np.array(times) * 1000
+    return {
+        "n": iterations,
+        "mean_ms": float(np.mean(times_ms)),
+        "p50_ms": float(np.percentile(times_ms, 50)),
+        "p95_ms": float(np.percentile(times_ms, 95)),
+        "p99_ms": float(np.percentile(times_ms, 99)),
+        "peak_alloc_bytes": int(peak),
+    }
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """
+    Prints p50/p95 changes against a baseline and returns the regressed stages.
+    Slowdowns smaller than `min_delta_ms` are ignored as timer noise.
+    """
+    regressions = []
+    print(f"\n📊 Against baseline (tolerance {tolerance:.0%})")
+    for stage, stats in results["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base:
+            print(f"   {stage:<28}(not in baseline)")
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms"):
+            ratio = stats[metric] / base[metric] if base[metric] else 1.0
+            changes.append(f"{metric[:3]} {ratio - 1:+.0%}")
+            if ratio > 1 + tolerance and stats[metric] - base[metric] > min_delta_ms:
+                regressions.append((stage, metric, base[metric], stats[metric]))
+        print(f"   {stage:<28}" + ", ".join(changes))
+    for stage, metric, before, after in regressions:
+        print(f"❌ Regression: {stage} {metric} {before:.2f} ms -> {after:.2f} ms")
+    return regressions
+
+def run(args):
+    _ensure_pyaudio()
+    from stub_servers import StubElevenLabsServer, FakeStreamingGeminiModel
+    from integrated_system import IntegratedSystem
+
+    clips = load_fixtures(args.fixtures) if args.fixtures else synthetic_clips(args.seconds, args.clips)
+    registry = make_registry(args.stub_models)
+    stages = args.stages or STAGES
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "inputs": "fixtures" if args.fixtures else f"{args.clips} synthetic clips of {args.seconds}s",
+            "stub_models": args.stub_models,
+            "iterations": args.iterations,
+        },
+        "stages": {},
+    }
+
+    elevenlabs = StubElevenLabsServer().start()
+    elevenlabs.chunk_delay = 0
+    temp_dir = tempfile.mkdtemp(prefix="pipeline_benchmark_")
+    class BenchmarkSystem(IntegratedSystem):
+        def _init_elevenlabs(self):
+            """Synthesis goes through the REST client to the stub; the SDK is not needed"""
+
+    system = None
+    try:
+        system = BenchmarkSystem(
+            elevenlabs_api_key="stub", elevenlabs_base_url=elevenlabs.url,
+            gemini_model=FakeStreamingGeminiModel(chunk_delay=0),
+            registry=registry, pipelined=False, use_tts_cache=False
+        )
+        if args.stub_models:
+            system.transcriber.transcribe = _stub_transcribe
+        switcher = system.tone_switcher
+
+        # Stage inputs
+        wav_paths = []
+        for i, clip in enumerate(clips):
+            path = os.path.join(temp_dir, f"clip_{i}.wav")
+            write_wav(path, clip, RATE)
+            wav_paths.append(path)
+        texts = [f"{text} ({i})" for i in range(args.iterations + 2) for text in TRANSCRIPTS]
+        tone_inputs = [(emotion, sentiment) for emotion in ["neutral", "happy", "sad", "angry"]
+                       for sentiment in ["very_negative", "negative", "neutral", "positive", "very_positive"]]
+
+        def decide(inputs):
+            switcher.current_voice_emotion, switcher.current_text_sentiment = inputs
+            return switcher._decide_tone()
+
+        stage_fns = {
+            "detect_emotion_from_file": (system.voice_detector.detect_emotion_from_file, wav_paths),
+            "transcribe_audio": (system.transcribe_audio, clips),
+            # Distinct texts so the LRU cache does not hide the model
+            "get_sentiment_score": (system.text_checker.get_sentiment_score, texts),
+            "_decide_tone": (decide, tone_inputs),
+            "generate_ssml": (switcher.generate_ssml, TRANSCRIPTS),
+            "process_interaction": (system.process_interaction, clips),
+        }
+
+        for stage in stages:
+            if stage == "detect_emotion_from_file":
+                try:
+                    import librosa  # noqa: F401
+                except ImportError:
+                    print(f"⚠️ librosa not installed; skipping {stage}")
+                    continue
+            fn, inputs = stage_fns[stage]
+            iterations = args.e2e_iterations if stage == "process_interaction" else args.iterations
+            print(f"⏱️  {stage}...")
+            if stage == "process_interaction":
+                # Keep the per-turn logging from drowning the report
+                with _quiet_logging():
+                    stats = measure(fn, inputs, iterations)
+            else:
+                stats = measure(fn, inputs, iterations)
+            results["stages"][stage] = stats
+    finally:
+        if system is not None:
+            with _quiet_logging():
+                system.cleanup()
+        elevenlabs.stop()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency and memory benchmark")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--e2e-iterations", type=int, default=10, help="iterations of process_interaction")
+    parser.add_argument("--seconds", type=float, default=2.0, help="length of each synthetic clip")
+    parser.add_argument("--clips", type=int, default=6, help="number of synthetic clips")
+    parser.add_argument("--fixtures", help="directory of recorded .wav clips to use instead")
+    parser.add_argument("--stages", nargs="*", choices=STAGES)
+    parser.add_argument("--stub-models", action="store_true", help="replace Whisper and the sentiment model")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="ignore slowdowns smaller than this (timer noise on tiny stages)")
+    args = parser.parse_args()
+
+    results = run(args)
+
+    print(f"\n{'stage':<28}{'p50':>10}{'p95':>10}{'p99':>10}{'peak alloc':>14}")
+    for stage, stats in results["stages"].items():
+        print(f"{stage:<28}{stats['p50_ms']:8.3f}ms{stats['p95_ms']:8.3f}ms{stats['p99_ms']:8.3f}ms"
+              f"{stats['peak_alloc_bytes'] / 1e6:11.2f} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📄 Results written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance, args.min_delta_ms):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
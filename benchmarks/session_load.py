@@ -0,0 +1,200 @@
+"""
+Load generator for session_server.py: replays WAV files as many concurrent
+callers, so throughput can be measured without a microphone.
+
+Each simulated caller connects, streams a file at real-time pace (or
+faster with --speed), follows it with silence so the server endpoints the
+utterance, then sends SYNC and reads replies until the server answers it.
+A file with long pauses can hold several utterances, each with its own
+RESULT. Latency is measured from the last sample of speech sent to the
+file's last result (and to the first frame of that result's speech).
+
+Usage:
+    python benchmarks/session_load.py recordings/*.wav --sessions 1 4 16 --turns 3
+    python benchmarks/session_load.py clip.wav --sessions 8 16 32 --slo-ms 1500 --json load.json
+
+With --slo-ms, the report names the largest session count whose p95
+latency stayed within the target, and that count per CPU core.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import session_protocol as protocol
+from audio_utils import load_audio, float32_to_pcm16
+
+RATE = 16000
+
+def _percentiles(values):
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    values_ms = np.array(values) * 1000
+    return {
+        "p50_ms": float(np.percentile(values_ms, 50)),
+        "p95_ms": float(np.percentile(values_ms, 95)),
+        "p99_ms": float(np.percentile(values_ms, 99)),
+    }
+
+def _read_replies(sock):
+    """
+    Reads one turn's frames, up to the server's answer to SYNC.
+    Returns (results, first_speech_time, error); first_speech_time belongs to the last result.
+    """
+    results = []
+    first_speech = None
+    while True:
+        kind, payload = protocol.recv_frame(sock)
+        if kind is None:
+            return results, first_speech, "connection closed"
+        if kind == protocol.ERROR:
+            return results, first_speech, json.loads(payload)["error"]
+        if kind == protocol.SYNC:
+            return results, first_speech, None
+        if kind == protocol.RESULT:
+            result = json.loads(payload)
+            result["received"] = time.perf_counter()
+            results.append(result)
+            first_speech = None
+        elif kind == protocol.SPEECH:
+            if payload and first_speech is None:
+                first_speech = time.perf_counter()
+
+def run_caller(index, clips, turns, host, port, speed, chunk_seconds, silence_seconds, timeout, stats, lock):
+    """One simulated caller; appends per-turn measurements to `stats` (shared by all callers, guarded by `lock`)"""
+    chunk = int(chunk_seconds * RATE)
+    silence = bytes(2 * int(silence_seconds * RATE))
+    try:
+        sock = socket.create_connection((host, port), timeout=timeout)
+    except OSError as e:
+        with lock:
+            stats["errors"].append(f"connect: {e}")
+        return
+    with sock:
+        try:
+            protocol.send_json(sock, protocol.HELLO, {"rate": RATE})
+            kind, payload = protocol.recv_frame(sock)
+            if kind != protocol.READY:
+                with lock:
+                    stats["errors"].append(payload.decode("utf-8", "replace") if payload else "no READY")
+                return
+
+            for turn in range(turns):
+                pcm = clips[(index + turn) % len(clips)]
+                speech_end = None
+                for audio in (pcm, silence):
+                    # Silence is paced too, so the server's hangover counts towards latency
+                    for start in range(0, len(audio), 2 * chunk):
+                        protocol.send_frame(sock, protocol.AUDIO, audio[start:start + 2 * chunk])
+                        if speed > 0:
+                            time.sleep(chunk_seconds / speed)
+                    if speech_end is None:
+                        speech_end = time.perf_counter()
+                protocol.send_frame(sock, protocol.SYNC)
+
+                results, first_speech, error = _read_replies(sock)
+                if not error and not results:
+                    error = "no utterance endpointed in the file"
+                with lock:
+                    if error:
+                        stats["errors"].append(error)
+                        return
+                    stats["latency"].append(results[-1]["received"] - speech_end)
+                    if first_speech is not None:
+                        stats["first_speech"].append(first_speech - speech_end)
+                    stats["turns"] += 1
+                    stats["utterances"] += len(results)
+            protocol.send_frame(sock, protocol.END)
+        except OSError as e:
+            with lock:
+                stats["errors"].append(str(e))
+
+def run_level(sessions, clips, args):
+    """Runs `sessions` concurrent callers and returns the measurements"""
+    stats = {"turns": 0, "utterances": 0, "latency": [], "first_speech": [], "errors": []}
+    lock = threading.Lock()
+    callers = [threading.Thread(target=run_caller,
+                                args=(i, clips, args.turns, args.host, args.port, args.speed,
+                                      args.chunk_seconds, args.silence_seconds, args.timeout, stats, lock))
+               for i in range(sessions)]
+    start = time.perf_counter()
+    for caller in callers:
+        caller.start()
+        time.sleep(args.stagger)
+    for caller in callers:
+        caller.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "sessions": sessions,
+        "turns": stats["turns"],
+        "utterances": stats["utterances"],
+        "errors": len(stats["errors"]),
+        "first_errors": stats["errors"][:5],
+        "seconds": elapsed,
+        "turns_per_second": stats["turns"] / elapsed if elapsed else 0.0,
+        "latency": _percentiles(stats["latency"]),
+        "first_speech": _percentiles(stats["first_speech"]),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay WAV files against session_server.py")
+    parser.add_argument("files", nargs="+", help="WAV files to replay (resampled to 16 kHz)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16],
+                        help="concurrent callers; each value is one load level")
+    parser.add_argument("--turns", type=int, default=3, help="utterances per caller")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed (0 sends as fast as possible)")
+    parser.add_argument("--chunk-seconds", type=float, default=0.064)
+    parser.add_argument("--silence-seconds", type=float, default=1.0,
+                        help="silence after each file, enough for the server's endpointer to fire")
+    parser.add_argument("--stagger", type=float, default=0.05, help="delay between caller starts")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--slo-ms", type=float, default=None, help="p95 latency target")
+    parser.add_argument("--json", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    clips = [float32_to_pcm16(load_audio(path, RATE)) for path in args.files]
+    cores = os.cpu_count() or 1
+    levels = []
+    for sessions in args.sessions:
+        print(f"📞 {sessions} concurrent sessions...")
+        levels.append(run_level(sessions, clips, args))
+
+    print(f"\n{'sessions':>8}{'turns':>7}{'errors':>8}{'turns/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}"
+          f"{'speech p50':>12}")
+    for level in levels:
+        latency, speech = level["latency"], level["first_speech"]
+        cells = [f"{value:8.0f}ms" if value is not None else f"{'-':>10}"
+                 for value in (latency["p50_ms"], latency["p95_ms"], latency["p99_ms"])]
+        speech_cell = f"{speech['p50_ms']:10.0f}ms" if speech["p50_ms"] is not None else f"{'-':>12}"
+        print(f"{level['sessions']:>8}{level['turns']:>7}{level['errors']:>8}{level['turns_per_second']:>9.2f}"
+              + "".join(cells) + speech_cell)
+        for error in level["first_errors"]:
+            print(f"   ❌ {error}")
+
+    results = {"cpu_count": cores, "files": args.files, "turns": args.turns, "speed": args.speed, "levels": levels}
+    if args.slo_ms is not None:
+        within = [level["sessions"] for level in levels
+                  if not level["errors"] and level["latency"]["p95_ms"] is not None
+                  and level["latency"]["p95_ms"] <= args.slo_ms]
+        best = max(within) if within else 0
+        results["max_sessions_within_slo"] = best
+        results["sessions_per_core"] = best / cores
+        print(f"\n🎯 {best} sessions within p95 {args.slo_ms:.0f} ms ({best / cores:.2f} per core, {cores} cores)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📄 Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
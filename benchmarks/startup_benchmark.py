@@ -0,0 +1,127 @@
+"""
+Startup benchmark: measures cold import time per dependency and model-load
+time per component so cold-start regressions can be tracked.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--models whisper sentiment] [--json startup.json]
+
+Each import is timed in a fresh interpreter so shared dependencies (torch,
+numpy, ...) are not hidden by an earlier import in the same process.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Third-party modules imported somewhere in the system, then our own modules
+IMPORTS = [
+    "numpy",
+    "pyaudio",
+    "librosa",
+    "torch",
+    "whisper",
+    "transformers",
+    "pyAudioAnalysis.ShortTermFeatures",
+    "google.generativeai",
+    "elevenlabs",
+    "voice_emotion_detector",
+    "text_sentiment_checker",
+    "tone_switcher",
+    "integrated_system",
+]
+
+DEFAULT_MODELS = ["pyaudio", "whisper", "sentiment"]
+
+IMPORT_SNIPPET = (
+    "import time, sys; sys.path.insert(0, {root!r}); t = time.perf_counter(); "
+    "import {module}; print(time.perf_counter() - t)"
+)
+
+def time_import(module):
+    """Returns the cold import time of `module` in seconds, or None if it fails"""
+    code = IMPORT_SNIPPET.format(root=ROOT, module=module)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+def time_model_loads(models):
+    """Loads each model sequentially through the registry and returns load times in seconds"""
+    from model_registry import ModelRegistry
+    registry = ModelRegistry()
+    timings = {}
+    for key in models:
+        start = time.perf_counter()
+        try:
+            registry.acquire(key)
+            timings[key] = time.perf_counter() - start
+        except Exception as e:
+            print(f"⚠️ Could not load {key}: {str(e)}")
+            timings[key] = None
+    footprint = registry.memory_footprint()
+    for key in list(footprint["models"]):
+        registry.release(key)
+    return timings, footprint
+
+def time_parallel_load(models):
+    """Loads all models on background threads, like IntegratedSystem(background_load=True)"""
+    from concurrent.futures import ThreadPoolExecutor
+    from model_registry import ModelRegistry
+    registry = ModelRegistry()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(models)) as pool:
+        futures = [pool.submit(registry.acquire, key) for key in models]
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+    elapsed = time.perf_counter() - start
+    for key in models:
+        registry.release(key)
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and model-load times")
+    parser.add_argument("--models", nargs="*", default=DEFAULT_MODELS,
+                        help="registry keys to load (e.g. whisper:base sentiment speechbrain)")
+    parser.add_argument("--skip-imports", action="store_true", help="only time model loading")
+    parser.add_argument("--json", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    results = {"imports": {}, "models": {}}
+
+    if not args.skip_imports:
+        print("⏱️  Import times (fresh interpreter each)")
+        for module in IMPORTS:
+            seconds = time_import(module)
+            results["imports"][module] = seconds
+            shown = f"{seconds * 1000:8.1f} ms" if seconds is not None else "  import failed"
+            print(f"   {module:<36}{shown}")
+
+    if args.models:
+        print("\n⏱️  Model load times (sequential)")
+        timings, footprint = time_model_loads(args.models)
+        results["models"] = timings
+        for key, seconds in timings.items():
+            shown = f"{seconds:8.2f} s" if seconds is not None else "   failed"
+            size = footprint["models"].get(key, {}).get("bytes", 0) / 1e6
+            print(f"   {key:<36}{shown}  ({size:.1f} MB)")
+        results["memory"] = footprint
+
+        parallel = time_parallel_load(args.models)
+        results["parallel_load_seconds"] = parallel
+        print(f"\n   all models in parallel: {parallel:.2f} s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📄 Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
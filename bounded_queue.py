@@ -0,0 +1,114 @@
+"""
+Bounded queues for long-running producer/consumer paths.
+
+put() never blocks and never lets the queue grow past `maxsize`. What
+happens when it is full depends on the policy:
+
+    drop_oldest  evict the oldest item to make room (a recent history)
+    drop_newest  discard the incoming item (the backlog is worked in order)
+    keep_latest  every put replaces whatever is still pending (only the
+                 newest reading matters, so older ones are coalesced away);
+                 the queue holds one item and `maxsize` is ignored
+
+Evictions count into queue_dropped_total{queue} and coalesced items into
+queue_coalesced_total{queue}.
+"""
+import time
+import threading
+from collections import deque
+from queue import Empty
+from metrics import get_metrics
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+KEEP_LATEST = "keep_latest"
+
+POLICIES = (DROP_OLDEST, DROP_NEWEST, KEEP_LATEST)
+
+class BoundedQueue:
+    """Thread-safe FIFO with the queue.Queue get/put interface and a drop policy instead of blocking"""
+    def __init__(self, maxsize=16, policy=DROP_OLDEST, name="queue", metrics=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}; expected one of {', '.join(POLICIES)}")
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = 1 if policy == KEEP_LATEST else maxsize
+        self.policy = policy
+        self.name = name
+        self.metrics = metrics or get_metrics()
+
+        self.items = deque()
+        self.not_empty = threading.Condition()
+        self.dropped = 0
+        self.coalesced = 0
+
+    def put(self, item, block=True, timeout=None):
+        """Adds `item`, applying the drop policy when full. Returns False if the item itself was dropped."""
+        with self.not_empty:
+            if self.policy == KEEP_LATEST:
+                self._count_coalesced(len(self.items))
+                self.items.clear()
+            elif len(self.items) >= self.maxsize:
+                self._count_dropped(1)
+                if self.policy == DROP_NEWEST:
+                    return False
+                self.items.popleft()
+            self.items.append(item)
+            self.not_empty.notify()
+            return True
+
+    def put_nowait(self, item):
+        return self.put(item, block=False)
+
+    def get(self, block=True, timeout=None):
+        """Removes and returns the oldest item; raises queue.Empty like queue.Queue"""
+        with self.not_empty:
+            if not block:
+                if not self.items:
+                    raise Empty
+            else:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while not self.items:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise Empty
+                    self.not_empty.wait(remaining)
+            return self.items.popleft()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def get_latest(self):
+        """Removes everything pending and returns the newest item (None if empty); the rest count as coalesced"""
+        with self.not_empty:
+            if not self.items:
+                return None
+            latest = self.items.pop()
+            self._count_coalesced(len(self.items))
+            self.items.clear()
+            return latest
+
+    def drain(self):
+        """Removes and returns every pending item, oldest first"""
+        with self.not_empty:
+            items = list(self.items)
+            self.items.clear()
+            return items
+
+    def qsize(self):
+        return len(self.items)
+
+    def empty(self):
+        return not self.items
+
+    def full(self):
+        return len(self.items) >= self.maxsize
+
+    def _count_dropped(self, count):
+        self.dropped += count
+        self.metrics.inc("queue_dropped_total", count, queue=self.name)
+
+    def _count_coalesced(self, count):
+        if count:
+            self.coalesced += count
+            self.metrics.inc("queue_coalesced_total", count, queue=self.name)
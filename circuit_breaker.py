@@ -0,0 +1,249 @@
+"""
+Circuit breakers for the remote services (Gemini and ElevenLabs).
+
+While a service keeps failing, calls are rejected at once with
+CircuitOpenError instead of each turn waiting for the same error, and the
+caller falls back immediately. After `reset_timeout` seconds one probe
+call is let through (half-open). If it succeeds the circuit closes again,
+and if it fails the circuit stays open for another period.
+
+Breaker state is exported as circuit_state{service} (0 closed, 1 half-open,
+2 open), along with rejection and trip counters.
+"""
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit is open"""
+    def __init__(self, service, retry_in):
+        super().__init__(f"{service} circuit is open (next probe in {retry_in:.0f}s)")
+        self.service = service
+        self.retry_in = retry_in
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call takes longer than its deadline"""
+
+def call_with_deadline(fn, args, kwargs, deadline):
+    """
+    Calls fn(*args, **kwargs), giving up after `deadline` seconds. The call runs
+    on a daemon thread, so a client without its own timeout cannot hold up the turn.
+    """
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        return future.result(deadline)
+    except FutureTimeoutError:
+        if future.done():
+            raise
+        raise DeadlineExceeded(f"no answer within {deadline}s") from None
+
+_END = object()
+
+def iterate_with_deadline(iterable, deadline, read_ahead=4):
+    """
+    Yields from `iterable`, raising DeadlineExceeded if any item takes longer than `deadline` seconds.
+    One daemon thread reads the iterable into a small queue (at most `read_ahead`
+    items ahead, so a slow consumer still holds the producer back).
+    """
+    items = queue.Queue(maxsize=read_ahead)
+    stopped = threading.Event()
+
+    def put(entry):
+        """Queues `entry` unless the consumer has gone away. Returns False if it has."""
+        while not stopped.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    # Release the source (e.g. an HTTP response) from the thread iterating it
+                    close = getattr(iterator, "close", None)
+                    if close is not None:
+                        close()
+                    return
+        except BaseException as e:
+            put((_END, e))
+            return
+        put((_END, None))
+
+    threading.Thread(target=read, daemon=True).start()
+    try:
+        while True:
+            try:
+                item, error = items.get(timeout=deadline)
+            except queue.Empty:
+                raise DeadlineExceeded(f"no answer within {deadline}s") from None
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of the last `window` calls. The circuit opens when at
+    least `minimum_calls` have been made and `failure_rate` of them failed,
+    and stays open for `reset_timeout` seconds before a probe is allowed.
+
+    `permanent_error(error)` may name errors that retrying will not clear
+    (quota, plan limits) by returning a reason; one such failure opens the
+    circuit at once, for `permanent_open_for` seconds.
+    """
+    def __init__(self, service, failure_rate=0.5, minimum_calls=3, window=10, reset_timeout=30.0,
+                 half_open_calls=1, metrics=None, permanent_error=None, permanent_open_for=None):
+        self.service = service
+        self.failure_rate = failure_rate
+        self.minimum_calls = minimum_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.permanent_error = permanent_error
+        self.permanent_open_for = permanent_open_for
+
+        self.lock = threading.Lock()
+        self.outcomes = deque(maxlen=window)  # True for a failure
+        self._state = CLOSED
+        self.opened_at = None
+        self.open_for = reset_timeout
+        self.probes = 0  # Calls in flight while half-open
+
+        self.metrics = metrics or get_metrics()
+        self.metrics.register_callback("circuit_state", lambda: STATE_VALUES[self.state], service=service)
+
+    @property
+    def state(self):
+        with self.lock:
+            return self._current_state()
+
+    def _current_state(self):
+        """State, moving from open to half-open once the reset timeout has passed (caller holds the lock)"""
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.open_for:
+            self._state = HALF_OPEN
+            self.probes = 0
+            logger.info(f"🟡 {self.service} circuit half-open; probing")
+        return self._state
+
+    def retry_in(self):
+        """Seconds until the next probe (0 unless open)"""
+        with self.lock:
+            if self._current_state() != OPEN:
+                return 0.0
+            return max(0.0, self.open_for - (time.monotonic() - self.opened_at))
+
+    def allow(self):
+        """Reserves a call. Returns False if it must be rejected."""
+        with self.lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self.probes < self.half_open_calls:
+                self.probes += 1
+                return True
+        self.metrics.inc("circuit_rejections_total", service=self.service)
+        return False
+
+    def record_success(self):
+        with self.lock:
+            if self._state == HALF_OPEN:
+                self._close()
+            else:
+                self.outcomes.append(False)
+
+    def record_failure(self, error=None):
+        reason = self.permanent_error(error) if self.permanent_error and error is not None else None
+        if reason:
+            self.trip(reason, open_for=self.permanent_open_for)
+            return
+        with self.lock:
+            if self._state == HALF_OPEN:
+                self._open(self.reset_timeout, f"probe failed: {error}")
+                return
+            self.outcomes.append(True)
+            failures = sum(self.outcomes)
+            if (self._state == CLOSED and len(self.outcomes) >= self.minimum_calls
+                    and failures / len(self.outcomes) >= self.failure_rate):
+                self._open(self.reset_timeout, f"{failures} of the last {len(self.outcomes)} calls failed")
+
+    def trip(self, reason, open_for=None):
+        """Opens the circuit now, e.g. on an error that will not clear by retrying (quota, plan limits)"""
+        with self.lock:
+            self._open(open_for or self.reset_timeout, reason)
+
+    def _open(self, open_for, reason):
+        self._state = OPEN
+        self.opened_at = time.monotonic()
+        self.open_for = open_for
+        self.outcomes.clear()
+        self.metrics.inc("circuit_opened_total", service=self.service)
+        logger.warning(f"🔴 {self.service} circuit open for {open_for:.0f}s ({reason})")
+
+    def _close(self):
+        self._state = CLOSED
+        self.outcomes.clear()
+        self.probes = 0
+        logger.info(f"🟢 {self.service} circuit closed")
+
+    def call(self, fn, *args, deadline=None, **kwargs):
+        """Calls fn(*args, **kwargs) through the breaker, failing after `deadline` seconds if given"""
+        if not self.allow():
+            raise CircuitOpenError(self.service, self.retry_in())
+        try:
+            if deadline is not None:
+                result = call_with_deadline(fn, args, kwargs, deadline)
+            else:
+                result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def stream(self, fn, *args, deadline=None, **kwargs):
+        """
+        Yields from the iterable returned by fn(*args, **kwargs) through the breaker.
+        With `deadline`, each item must arrive within that many seconds.
+        A consumer that stops early counts as a success.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.service, self.retry_in())
+        try:
+            items = fn(*args, **kwargs)
+            if deadline is not None:
+                items = iterate_with_deadline(items, deadline)
+            for item in items:
+                yield item
+        except GeneratorExit:
+            self.record_success()
+            raise
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
@@ -0,0 +1,105 @@
+import threading
+from collections import deque
+
+DEFAULT_INSTRUCTIONS = "You are a helpful and empathetic AI assistant. Respond to the following message in 1 to 2 lines:\n\n"
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token), good enough for budgeting"""
+    return max(1, (len(text) + 3) // 4)
+
+class ConversationMemory:
+    """
+    Bounded conversation store for prompt assembly.
+
+    The most recent messages are kept verbatim, up to `max_turns` user/assistant
+    pairs and `max_tokens` estimated tokens. Older messages are rolled into a
+    short running summary that is capped at `summary_tokens`, so memory
+    and prompt size stay flat however long the process runs. Each message is
+    rendered once when it is added. The summary line grows by one note per
+    rolled-out message and is only rebuilt from the notes when the oldest are
+    dropped. Once the window is full a message rolls out on nearly every turn,
+    so the prefix (instructions plus summary) usually changes per turn; it is
+    cached only between summary changes.
+    """
+    def __init__(self, max_turns=3, max_tokens=300, summary_tokens=80, instructions=DEFAULT_INSTRUCTIONS,
+                 summary_words=12):
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.summary_words = summary_words
+        self.instructions = instructions
+
+        # (role, content, rendered line, tokens) for the verbatim window
+        self.messages = deque()
+        self.max_messages = 2 * max_turns
+        self.window_tokens = 0
+
+        # Clipped one-line notes on rolled-out messages, oldest first
+        self.summary = deque()
+        self.summary_token_count = 0
+        self.summary_line = ""  # The notes joined with "; "
+
+        self.lock = threading.Lock()
+        self._prefix = None
+
+    def add(self, role, content):
+        """Adds a message and rolls the oldest messages into the summary when over budget"""
+        speaker = "User" if role == "user" else "Assistant"
+        line = f"{speaker}: {content}\n"
+        tokens = estimate_tokens(line)
+        with self.lock:
+            self.messages.append((role, content, line, tokens))
+            self.window_tokens += tokens
+
+            # Always keep the newest message, even if it alone is over budget
+            while len(self.messages) > 1 and (len(self.messages) > self.max_messages
+                                              or self.window_tokens > self.max_tokens):
+                old_role, old_content, _, old_tokens = self.messages.popleft()
+                self.window_tokens -= old_tokens
+                self._summarize(old_role, old_content)
+
+    def _summarize(self, role, content):
+        """Folds a rolled-out message into the running summary (caller holds the lock)"""
+        words = content.split()
+        note = " ".join(words[:self.summary_words]) + ("..." if len(words) > self.summary_words else "")
+        note = f"{'user' if role == 'user' else 'you'}: {note}"
+        tokens = estimate_tokens(note)
+        self.summary.append((note, tokens))
+        self.summary_token_count += tokens
+        evicted = False
+        while len(self.summary) > 1 and self.summary_token_count > self.summary_tokens:
+            _, dropped = self.summary.popleft()
+            self.summary_token_count -= dropped
+            evicted = True
+        if evicted:
+            self.summary_line = "; ".join(note for note, _ in self.summary)
+        else:
+            self.summary_line = f"{self.summary_line}; {note}" if self.summary_line else note
+        self._prefix = None
+
+    def build_prompt(self):
+        """Returns the prompt for the next reply: the prefix plus the recent lines"""
+        with self.lock:
+            if self._prefix is None:
+                self._prefix = self.instructions
+                if self.summary_line:
+                    self._prefix += f"Earlier in this conversation ({self.summary_line})\n"
+            return self._prefix + "".join(line for _, _, line, _ in self.messages)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.messages)
+
+    def __iter__(self):
+        """Iterates over the verbatim window as {"role", "content"} dicts"""
+        with self.lock:
+            window = list(self.messages)
+        return iter([{"role": role, "content": content} for role, content, _, _ in window])
+
+    def clear(self):
+        with self.lock:
+            self.messages.clear()
+            self.summary.clear()
+            self.window_tokens = 0
+            self.summary_token_count = 0
+            self.summary_line = ""
+            self._prefix = None
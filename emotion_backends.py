@@ -0,0 +1,314 @@
+"""
+Voice emotion backends.
+
+Every backend has classify(audio, features=None, state=None) returning
+(emotion, confidence) for a 16 kHz float32 clip:
+
+    rules     energy / zero-crossing / spectral centroid thresholds on the
+              shared frame features; costs next to nothing
+    wav2vec2  the SpeechBrain IEMOCAP classifier, run on in-memory tensors
+              with classify_batch (no WAV file round trip)
+    cascade   rules on every window; wav2vec2 only when the rules are
+              unsure or their label changes. The wav2vec2 answer then stands
+              until the rules' label changes again. Its history lives in a
+              CascadeState that each stream passes in.
+
+The heavy model comes from the model registry ("speechbrain"), so it is
+loaded once and can be replaced with registry.register() to run offline.
+"""
+import time
+import queue
+import logging
+import threading
+import numpy as np
+from concurrent.futures import Future
+from model_registry import get_registry
+from voice_features import extract_features, summarize
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+RATE = 16000
+
+# IEMOCAP labels of the SpeechBrain model -> the emotions used across the system
+IEMOCAP_LABELS = {"neu": "neutral", "hap": "happy", "sad": "sad", "ang": "angry"}
+
+BACKENDS = ("rules", "wav2vec2", "cascade")
+
+def classify_features(energy, zero_crossing, spectral_centroid):
+    """
+    Simple rules-based emotion detection from mean frame features.
+    Returns a tuple of (emotion, confidence_score)
+    """
+    if energy > 0.01:  # High energy
+        if zero_crossing > 0.2:  # High zero crossing rate
+            return "angry", 0.7
+        return "happy", 0.6
+    # Low energy
+    if spectral_centroid < 1000:
+        return "sad", 0.6
+    return "neutral", 0.8
+
+class RuleBackend:
+    """The feature rules; uses the caller's features when it already has them"""
+    name = "rules"
+
+    def classify(self, audio, features=None, state=None):
+        if features is None:
+            features = summarize(extract_features(audio, RATE))
+        return classify_features(features["energy"], features["zero_crossing"], features["spectral_centroid"])
+
+    def close(self):
+        pass
+
+class Wav2Vec2Backend:
+    """
+    SpeechBrain's CustomEncoderWav2vec2Classifier on in-memory audio. Clips of a
+    batch are zero-padded to the longest one and passed with relative lengths,
+    so one forward pass covers the whole batch.
+    """
+    name = "wav2vec2"
+
+    def __init__(self, registry=None, source=None):
+        self.registry = registry or get_registry()
+        self.key = f"speechbrain:{source}" if source else "speechbrain"
+        self.classifier = None
+        self.lock = threading.Lock()
+
+    def _classifier(self):
+        with self.lock:
+            if self.classifier is None:
+                self.classifier = self.registry.acquire(self.key)
+            return self.classifier
+
+    def classify(self, audio, features=None, state=None):
+        return self.classify_batch([audio])[0]
+
+    def classify_batch(self, clips):
+        """Returns one (emotion, confidence) per clip"""
+        import torch
+
+        classifier = self._classifier()
+        clips = [np.asarray(clip, dtype=np.float32) for clip in clips]
+        longest = max(1, max(len(clip) for clip in clips))
+        wavs = np.zeros((len(clips), longest), dtype=np.float32)
+        for i, clip in enumerate(clips):
+            wavs[i, :len(clip)] = clip
+        wav_lens = torch.tensor([len(clip) / longest for clip in clips], dtype=torch.float32)
+
+        with torch.no_grad():
+            _, scores, _, labels = classifier.classify_batch(torch.from_numpy(wavs), wav_lens)
+
+        results = []
+        for score, label in zip(scores.tolist(), labels):
+            # The IEMOCAP head ends in a log-softmax, so the best score is a log probability
+            confidence = float(np.exp(score)) if score <= 0 else float(score)
+            results.append((IEMOCAP_LABELS.get(label, label), confidence))
+        return results
+
+    def close(self):
+        with self.lock:
+            if self.classifier is not None:
+                self.registry.release(self.key)
+                self.classifier = None
+
+class EmotionMicroBatcher:
+    """
+    Collects clips from many threads (e.g. every session of the server) and
+    classifies them together, as soon as `max_batch_size` clips are waiting or
+    the oldest has waited `max_wait_ms`.
+    """
+    def __init__(self, backend, max_batch_size=8, max_wait_ms=20):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.requests = queue.Queue()
+        self.running = False
+        self.thread = None
+        self.batches = 0
+        self.clips = 0
+
+    def start(self):
+        """Start the batching thread"""
+        if self.running:
+            return self
+        self.running = True
+        self.thread = threading.Thread(target=self._batch_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def submit(self, audio):
+        """Queue a clip. Returns a Future resolving to (emotion, confidence)."""
+        future = Future()
+        self.requests.put((audio, future))
+        return future
+
+    def classify(self, audio, timeout=None):
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(audio).result(timeout)
+
+    def _batch_loop(self):
+        """Thread that gathers clips into batches and classifies them"""
+        while self.running:
+            try:
+                first = self.requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if first is None:
+                break
+
+            # Wait for more clips until the batch is full or the deadline passes
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait_ms / 1000.0
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.running = False
+                    break
+                batch.append(item)
+
+            try:
+                results = self.backend.classify_batch([audio for audio, _ in batch])
+                self.batches += 1
+                self.clips += len(batch)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"Error in batched emotion classification: {e}")
+                get_metrics().inc("errors_total", component="voice_emotion")
+                for _, future in batch:
+                    future.set_exception(e)
+
+    def stop(self):
+        """Stop the batching thread; requests still queued fail instead of waiting forever"""
+        if not self.running:
+            return
+        self.running = False
+        self.requests.put(None)
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        error = RuntimeError("Emotion batcher stopped")
+        while True:
+            try:
+                item = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                _, future = item
+                future.set_exception(error)
+
+class CascadeState:
+    """Per-stream cascade state: one per microphone stream, conversation or server session"""
+    def __init__(self):
+        self.cheap_label = None
+        self.heavy_result = None
+        self.escalated_at = None
+        self.pending = None  # Escalation still running for a caller that does not wait
+
+class CascadeBackend:
+    """
+    Rules first, wav2vec2 when they are not sure. A window is escalated when
+    the rules' confidence is below `threshold` or their label differs from the
+    previous window's, at most once per `min_interval` seconds per stream.
+    If the heavy model fails, the rules' answer is used. Callers own the
+    CascadeState of each stream; the backend itself keeps none.
+    """
+    name = "cascade"
+
+    def __init__(self, cheap=None, heavy=None, threshold=0.65, min_interval=0.5, max_batch_size=8,
+                 max_wait_ms=20, registry=None, metrics=None):
+        self.cheap = cheap or RuleBackend()
+        self.heavy = heavy or Wav2Vec2Backend(registry)
+        self.threshold = threshold
+        self.min_interval = min_interval
+        self.batcher = EmotionMicroBatcher(self.heavy, max_batch_size, max_wait_ms).start()
+        self.metrics = metrics or get_metrics()
+        self.metrics.register_callback("batches_total", lambda: self.batcher.batches,
+                                       kind="counter", model="wav2vec2")
+        self.metrics.register_callback("batched_items_total", lambda: self.batcher.clips,
+                                       kind="counter", model="wav2vec2")
+
+    def classify(self, audio, features=None, state=None, wait=True):
+        if features is None and callable(audio):
+            audio = audio()
+        return self.decide(audio, self.cheap.classify(audio, features), state, wait)
+
+    def decide(self, audio, cheap_result, state=None, wait=True):
+        """
+        Returns the cascade's answer for `audio`, given the rules' (emotion, confidence) for it.
+        `audio` may be a function returning the clip, so a streaming caller only
+        assembles its window when the model actually runs.
+
+        With wait=False an escalation is only submitted: the rules' answer is
+        returned now, and the model's answer from a later call once it is ready.
+        """
+        if state is None:
+            raise ValueError("CascadeBackend needs the caller's CascadeState")
+        emotion, confidence = cheap_result
+        # The first window of a stream has nothing to change from, so it escalates only when unsure
+        changed = state.cheap_label is not None and emotion != state.cheap_label
+        state.cheap_label = emotion
+        if changed:
+            # An answer still on its way belongs to the previous segment
+            state.heavy_result = None
+            state.pending = None
+        elif state.pending is not None and state.pending.done():
+            return self._collect(state, cheap_result)
+        elif state.heavy_result is not None:
+            return state.heavy_result
+
+        if state.pending is not None or (confidence >= self.threshold and not changed):
+            self.metrics.inc("emotion_windows_total", tier="rules")
+            return cheap_result
+        now = time.monotonic()
+        if state.escalated_at is not None and now - state.escalated_at < self.min_interval:
+            self.metrics.inc("emotion_windows_total", tier="rules")
+            return cheap_result
+
+        state.escalated_at = now
+        state.pending = self._submit(audio() if callable(audio) else audio)
+        if not wait:
+            self.metrics.inc("emotion_windows_total", tier="rules")
+            return cheap_result
+        return self._collect(state, cheap_result)
+
+    def _submit(self, audio):
+        """Queues `audio` for the model; the escalation is timed until its answer arrives"""
+        start = time.perf_counter()
+        future = self.batcher.submit(audio)
+        future.add_done_callback(lambda _: self.metrics.observe(
+            "stage_seconds", time.perf_counter() - start, stage="emotion_escalation"))
+        return future
+
+    def _collect(self, state, cheap_result):
+        """Waits for the pending escalation and keeps its answer; the rules' answer if it failed"""
+        future, state.pending = state.pending, None
+        try:
+            state.heavy_result = future.result()
+        except Exception as e:
+            logger.warning(f"⚠️ wav2vec2 emotion model failed, using the rules: {e}")
+            self.metrics.inc("emotion_windows_total", tier="rules")
+            return cheap_result
+        self.metrics.inc("emotion_windows_total", tier="wav2vec2")
+        return state.heavy_result
+
+    def close(self):
+        self.batcher.stop()
+        self.heavy.close()
+
+def make_backend(name="rules", registry=None, **options):
+    """Builds the backend called `name` (one of BACKENDS)"""
+    if name == "rules":
+        return RuleBackend()
+    if name == "wav2vec2":
+        return Wav2Vec2Backend(registry, **options)
+    if name == "cascade":
+        return CascadeBackend(registry=registry, **options)
+    raise ValueError(f"Unknown emotion backend {name!r}; expected one of {', '.join(BACKENDS)}")
@@ -0,0 +1,207 @@
+"""
+Process-pool execution of the CPU-bound stages.
+
+Voice emotion features, Whisper and the DistilBERT pipeline run in a pool of
+long-lived worker processes. Each worker loads its models once, so the
+stages use every core instead of contending for the GIL with the capture,
+playback and tone switcher threads. Audio is not pickled: the caller copies
+each clip into a slot of one shared memory block and only the slot number
+crosses the process boundary.
+
+The proxies at the bottom stand in for VoiceEmotionDetector,
+WhisperTranscriber and TextSentimentChecker, so the rest of the system
+works unchanged (see IntegratedSystem's `inference_processes` option).
+"""
+import os
+import time
+import queue
+import logging
+import multiprocessing
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from voice_emotion_detector import VoiceEmotionDetector
+from emotion_backends import CascadeBackend, CascadeState
+from text_sentiment_checker import TextSentimentChecker
+from transcriber import WhisperTranscriber
+
+logger = logging.getLogger(__name__)
+
+RATE = 16000
+
+# Per-worker state, created once by _init_worker()
+_worker = {}
+
+def _init_worker(shm_name, slot_samples, whisper_model_size, whisper_options, threads):
+    """Attaches to the shared audio block and loads every model once per worker process"""
+    try:
+        import torch
+        torch.set_num_threads(threads)  # Workers share the cores instead of oversubscribing them
+    except ImportError:
+        pass
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker["shm"] = shm
+    _worker["slots"] = np.ndarray((len(shm.buf) // (4 * slot_samples), slot_samples), dtype=np.float32,
+                                  buffer=shm.buf)
+    _worker["detector"] = VoiceEmotionDetector()
+    _worker["checker"] = TextSentimentChecker()
+    _worker["transcriber"] = WhisperTranscriber(whisper_model_size, **whisper_options)
+
+def _clip(slot, length, audio):
+    """The clip handed over in `slot` (a view, no copy), or `audio` if it was sent directly"""
+    return _worker["slots"][slot, :length] if audio is None else audio
+
+def _ping(delay):
+    time.sleep(delay)  # Keeps ready workers busy so the next ping reaches one still loading
+    return os.getpid()
+
+def _detect_emotion(slot, length, audio=None):
+    return _worker["detector"].detect_emotion_from_array(_clip(slot, length, audio))
+
+def _transcribe(slot, length, language, partial, audio=None):
+    """Transcribes with the caller's session language. Returns (text, language)."""
+    transcriber = _worker["transcriber"]
+    transcriber.session_language = language or transcriber.pinned_language
+    text = transcriber.transcribe(_clip(slot, length, audio), partial=partial)
+    return text, transcriber.session_language
+
+def _sentiment(texts, batch_size):
+    """Raw pipeline output, so the caller's cache and score mapping apply unchanged"""
+    return _worker["checker"].sentiment_pipeline(texts, batch_size=batch_size)
+
+class InferenceWorkerPool:
+    """
+    Long-lived worker processes plus the shared memory block used to hand them
+    audio. The block holds `slots` clips of up to `slot_seconds`; a caller
+    waits for a free slot when all are in use. Longer clips are sent pickled.
+    """
+    def __init__(self, workers=None, whisper_model_size="tiny", whisper_options=None, slot_seconds=30,
+                 slots=None, threads_per_worker=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.slot_samples = int(slot_seconds * RATE)
+        slots = slots or 2 * self.workers
+
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * self.slot_samples * 4)
+        self.slots = np.ndarray((slots, self.slot_samples), dtype=np.float32, buffer=self.shm.buf)
+        self.free_slots = queue.Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+
+        # Spawned, not forked: the parent runs audio and decision threads that must not be copied mid-flight
+        threads = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.shm.name, self.slot_samples, whisper_model_size, whisper_options or {}, threads)
+        )
+        self.closed = False
+
+    def warm(self, timeout=300):
+        """Starts every worker and waits (up to `timeout` seconds) for their models to load"""
+        logger.info(f"⏳ Starting {self.workers} inference worker processes...")
+        pids = set()
+        deadline = time.monotonic() + timeout
+        while len(pids) < self.workers and time.monotonic() < deadline:
+            futures = [self.executor.submit(_ping, 0.05) for _ in range(self.workers)]
+            pids.update(future.result() for future in futures)
+        logger.info(f"✅ Inference workers ready ({len(pids)} processes)")
+        return self
+
+    def _call(self, fn, audio, *args):
+        """Runs fn(slot, length, *args) in a worker with `audio` in shared memory and waits for the result"""
+        audio = np.asarray(audio, dtype=np.float32)
+        if len(audio) > self.slot_samples:
+            return self.executor.submit(fn, 0, 0, *args, audio).result()
+
+        slot = self.free_slots.get()
+        try:
+            self.slots[slot, :len(audio)] = audio
+            return self.executor.submit(fn, slot, len(audio), *args).result()
+        finally:
+            self.free_slots.put(slot)
+
+    def detect_emotion(self, audio):
+        """Returns (emotion, confidence)"""
+        return self._call(_detect_emotion, audio)
+
+    def transcribe(self, audio, language=None, partial=False):
+        """Returns (text, language) with `language` pinned, or detected when None"""
+        return self._call(_transcribe, audio, language, partial)
+
+    def sentiment(self, texts, batch_size=None):
+        """Returns the sentiment pipeline's raw results for `texts`"""
+        return self.executor.submit(_sentiment, list(texts), batch_size).result()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.executor.shutdown(wait=True)
+        self.slots = None
+        self.shm.close()
+        self.shm.unlink()
+
+class ProcessVoiceEmotionDetector(VoiceEmotionDetector):
+    """
+    VoiceEmotionDetector whose feature rules run in the pool; streaming windows
+    stay local. A wav2vec2 model (alone or as the cascade's second tier) runs
+    in this process, so the workers do not each load a copy.
+    """
+    def __init__(self, pool, **kwargs):
+        super().__init__(**kwargs)
+        self.pool = pool
+
+    def detect_emotion_from_array(self, audio, sr=None, state=None):
+        if sr is not None and sr != self.RATE:
+            import librosa
+            audio = librosa.resample(audio, orig_sr=sr, target_sr=self.RATE)
+        if isinstance(self.backend, CascadeBackend):
+            return self.backend.decide(audio, self.pool.detect_emotion(audio), state or CascadeState())
+        if self.backend.name == "rules":
+            return self.pool.detect_emotion(audio)
+        return self.backend.classify(audio, state=state)
+
+class ProcessTranscriber(WhisperTranscriber):
+    """
+    WhisperTranscriber backed by the pool. The session language lives here, so
+    it stays pinned whichever worker decodes the next utterance.
+    """
+    def __init__(self, pool, language=None):
+        self.pool = pool
+        self.model = None
+        self.pinned_language = language
+        self.session_language = language
+
+    def transcribe(self, audio, partial=False, features=None, first_result=None):
+        text, language = self.pool.transcribe(audio, self.session_language, partial)
+        if self.session_language is None and language is not None:
+            self.pin_language(language)
+        return text
+
+    def close(self):
+        pass
+
+class ProcessSentimentChecker(TextSentimentChecker):
+    """TextSentimentChecker whose model runs in the pool; the LRU cache stays in this process"""
+    def __init__(self, pool, cache_size=512):
+        self.pool = pool
+        super().__init__(registry=_PoolRegistry(pool), cache_size=cache_size)
+
+    def cleanup(self):
+        pass
+
+class _PoolRegistry:
+    """Hands TextSentimentChecker the pool's sentiment call in place of a loaded pipeline"""
+    def __init__(self, pool):
+        self.pool = pool
+
+    def is_loaded(self, key):
+        return True
+
+    def acquire(self, key):
+        return self.pool.sentiment
+
+    def release(self, key):
+        pass
@@ -1,242 +1,553 @@
+import logging
 import os
 import time
+import queue
 import threading
-import whisper
 import pyaudio
 import wave
 import numpy as np
-import librosa
 import warnings
-import google.generativeai as genai
-from elevenlabs import generate, save, set_api_key, Voice, VoiceSettings
+from concurrent.futures import ThreadPoolExecutor, Future
 from voice_emotion_detector import VoiceEmotionDetector
+from emotion_backends import CascadeState
 from text_sentiment_checker import TextSentimentChecker
 from tone_switcher import ToneSwitcher
+from audio_utils import write_wav, write_pcm16_wav, load_audio
+from model_registry import get_registry
+from vad import VoiceActivityEndpointer
+from audio_playback import StreamingPlayer
+from remote_clients import ElevenLabsClient
+from text_streaming import SentenceSplitter
+from tts_cache import TTSCache
+from conversation_memory import ConversationMemory
+from transcriber import WhisperTranscriber
+from inference_workers import InferenceWorkerPool, ProcessVoiceEmotionDetector, ProcessTranscriber, ProcessSentimentChecker
+from metrics import get_metrics, MetricsServer, TurnTracer, setup_logging
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# whisper, librosa, transformers, google.generativeai and elevenlabs are
+# imported where they are first used so that importing this module stays cheap
 
 warnings.filterwarnings("ignore")
 
+# Fixed replies; frequent enough to be worth pre-warming in the TTS cache
+NO_SPEECH_REPLY = "I didn't catch that. Could you please repeat?"
+ERROR_REPLY = "I'm having trouble generating a response right now."
+
+# ElevenLabs errors that no retry will clear until the account's plan changes
+PLAN_LIMIT_ERRORS = ("Free Tier usage disabled", "Unusual activity detected")
+
+def elevenlabs_plan_limit(error):
+    """Returns a reason if `error` is an ElevenLabs free-tier/plan restriction, else None"""
+    message = str(error)
+    if any(text in message for text in PLAN_LIMIT_ERRORS):
+        return "free tier restriction"
+    return None
+
 class IntegratedSystem:
-    def __init__(self, gemini_api_key=None, elevenlabs_api_key=None):
+    # Voice synthesis settings
+    VOICE_ID = "21m00Tcm4TlvDq8ikWAM"  # Rachel voice (neutral female)
+    TTS_MODEL = "eleven_monolingual_v1"  # Best model for the emotion-suffix technique
+    TTS_OUTPUT_FORMAT = "pcm_16000"  # Raw PCM, so it can be streamed and cached as-is
+    VOICE_SETTINGS = {
+        "stability": 0.3,  # Lower stability for more expressiveness
+        "similarity_boost": 0.75,
+        "style": 0.7,  # Higher style for more character
+        "use_speaker_boost": True,
+    }
+    PLAN_LIMIT_BACKOFF = 600  # Seconds to skip ElevenLabs after a free-tier/plan restriction
+    
+    def __init__(self, gemini_api_key=None, elevenlabs_api_key=None, debug_audio=False, registry=None,
+                 background_load=False, use_vad=True, pipelined=True, elevenlabs_base_url=None,
+                 stream_tts=True, stream_llm=True, gemini_model=None, use_tts_cache=True,
+                 whisper_model_size="tiny", whisper_options=None, stream_transcription=False,
+                 metrics=None, metrics_port=None, trace_log=None, inference_processes=0,
+                 generate_timeout=10, synthesize_timeout=15, emotion_backend="rules"):
+        # Stage timings, error counts and queue depths; served on metrics_port if given
+        self.metrics = metrics or get_metrics()
+        self.metrics_server = MetricsServer(self.metrics, port=metrics_port).start() if metrics_port else None
+        self.tracer = TurnTracer(trace_log) if trace_log else None
+        
         # Set API keys
         self.gemini_api_key = gemini_api_key
         self.elevenlabs_api_key = elevenlabs_api_key
         
+        # Remote calls have deadlines, and a failing service is skipped until it recovers
+        self.generate_timeout = generate_timeout
+        self.synthesize_timeout = synthesize_timeout
+        self.gemini_breaker = CircuitBreaker("gemini", metrics=self.metrics)
+        # A plan restriction opens the ElevenLabs circuit at once, on every call path
+        self.elevenlabs_breaker = CircuitBreaker("elevenlabs", metrics=self.metrics,
+                                                 permanent_error=elevenlabs_plan_limit,
+                                                 permanent_open_for=self.PLAN_LIMIT_BACKOFF)
+        
         # Audio recording parameters
         self.RATE = 16000
         self.CHUNK = 1024
         self.CHANNELS = 1
         self.FORMAT = pyaudio.paInt16
-        self.RECORD_SECONDS = 5
+        self.RECORD_SECONDS = 5  # Fixed window used when VAD endpointing is off
         self.TEMP_WAV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "integrated_audio_temp.wav")
         self.RESPONSE_AUDIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_response.wav")
         
-        # Initialize PyAudio
-        self.audio = pyaudio.PyAudio()
+        # Captured audio stays in memory; TEMP_WAV is only written when debugging
+        self.debug_audio = debug_audio
         
-        # Load Whisper model for transcription
-        self.whisper_model = whisper.load_model("tiny")
+        # Heavy models and PyAudio are shared process-wide through the registry
+        self.registry = registry or get_registry()
+        self.audio = self.registry.acquire("pyaudio")
         
-        # Initialize components
-        self.voice_detector = VoiceEmotionDetector()
-        self.text_checker = TextSentimentChecker()
-        self.tone_switcher = ToneSwitcher()
+        # Persistent output stream; streamed TTS audio plays as it arrives
+        self.stream_tts = stream_tts
+        self.player = StreamingPlayer(self.audio)
+        self.metrics.register_callback("queue_depth", self.player.buffer.qsize, queue="playback")
+        self.elevenlabs_client = None
+        if self.elevenlabs_api_key:
+            self.elevenlabs_client = ElevenLabsClient(self.elevenlabs_api_key, base_url=elevenlabs_base_url,
+                                                      timeout=synthesize_timeout, output_format=self.TTS_OUTPUT_FORMAT)
         
-        # Start the tone switcher
-        self.tone_switcher.start()
+        # Synthesized phrases are reused instead of re-synthesized
+        self.tts_cache = TTSCache() if use_tts_cache else None
+        if self.tts_cache is not None:
+            self.metrics.register_callback("cache_hits_total", lambda: self.tts_cache.hits, kind="counter", cache="tts")
+            self.metrics.register_callback("cache_misses_total", lambda: self.tts_cache.misses, kind="counter", cache="tts")
         
-        # Initialize Gemini if API key is provided
-        if self.gemini_api_key:
-            genai.configure(api_key=self.gemini_api_key)
-            self.gemini_model = genai.GenerativeModel('gemini-2.0-flash')
-        else:
-            print("No Gemini API key provided. Response generation will be simulated.")
-            self.gemini_model = None
+        # One capture thread feeds both the utterance recorder and the emotion windows
+        self.capture = self.registry.acquire("microphone")
         
-        # Initialize ElevenLabs if API key is provided
-        if self.elevenlabs_api_key:
-            set_api_key(self.elevenlabs_api_key)
+        # End utterances when the speaker stops instead of after RECORD_SECONDS
+        self.use_vad = use_vad
+        self.endpointer = VoiceActivityEndpointer(rate=self.RATE, chunk=self.CHUNK)
+        # No utterance may start while our response plays, nor this long after it (echo)
+        self.ECHO_TAIL_SECONDS = 0.3
+        
+        # Whisper size and decoding options (see WhisperTranscriber); with streaming
+        # transcription, partial transcripts are decoded while the user speaks
+        self.whisper_model_size = whisper_model_size
+        self.whisper_options = whisper_options or {}
+        self.stream_transcription = stream_transcription
+        
+        # Worker threads for overlapping pipeline stages
+        self.pipelined = pipelined
+        self.executor = ThreadPoolExecutor(max_workers=3)
+        self.last_turn_timings = {}
+        
+        # Speak the response sentence by sentence while Gemini is still generating
+        self.stream_llm = stream_llm
+        
+        # With inference_processes, emotion features, Whisper and sentiment run in
+        # worker processes that load their own models (audio goes via shared memory)
+        self.inference_pool = None
+        if inference_processes:
+            self.inference_pool = InferenceWorkerPool(inference_processes, whisper_model_size, whisper_options)
+        
+        # The voice detector is light, so it is ready before the first recording
+        # (emotion_backend "wav2vec2" or "cascade" loads its model on first escalation)
+        if self.inference_pool is not None:
+            self.voice_detector = ProcessVoiceEmotionDetector(self.inference_pool, debug_audio=debug_audio,
+                                                              registry=self.registry, backend=emotion_backend)
         else:
-            print("No ElevenLabs API key provided. Voice synthesis will be simulated.")
+            self.voice_detector = VoiceEmotionDetector(debug_audio=debug_audio, registry=self.registry,
+                                                       backend=emotion_backend)
+        # Utterances keep their own cascade history, apart from the tone switcher's live stream
+        self.emotion_state = CascadeState()
+        
+        # Heavy components are filled in by _load_models()
+        self.whisper_model = None
+        self.transcriber = None
+        self.text_checker = None
+        self.tone_switcher = None
+        self.gemini_model = gemini_model  # Injected model (e.g. stub_servers.FakeStreamingGeminiModel) skips configuration
+        self.load_error = None
+        
+        # Set once every model is loaded (immediately unless background_load is used)
+        self.ready = threading.Event()
+        
+        # Conversation history: recent turns verbatim, older turns summarized
+        self.conversation_history = ConversationMemory()
         
-        # Conversation history
-        self.conversation_history = []
+        if background_load:
+            # Load models on background threads so recording can start right away
+            self._load_thread = threading.Thread(target=self._load_models, daemon=True)
+            self._load_thread.start()
+        else:
+            self._load_models()
     
-    def record_audio(self):
-        """Records audio for RECORD_SECONDS and saves to a temporary WAV file."""
+    def _load_models(self):
+        """Loads Whisper, the sentiment model and the remote clients in parallel, then sets `ready`."""
         try:
-            stream = self.audio.open(format=self.FORMAT, channels=self.CHANNELS, 
-                                    rate=self.RATE, input=True, 
-                                    frames_per_buffer=self.CHUNK)
-            
-            print(f"Recording for {self.RECORD_SECONDS} second(s)...")
-            frames = []
-            for _ in range(0, int(self.RATE / self.CHUNK * self.RECORD_SECONDS)):
-                data = stream.read(self.CHUNK, exception_on_overflow=False)
-                frames.append(data)
-            
-            stream.stop_stream()
-            stream.close()
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                if self.inference_pool is not None:
+                    # The workers load the models; only proxies live in this process
+                    transcriber_future = pool.submit(self._init_worker_proxies)
+                    checker_future = transcriber_future
+                else:
+                    transcriber_future = pool.submit(WhisperTranscriber, self.whisper_model_size, self.registry,
+                                                     **self.whisper_options)
+                    checker_future = pool.submit(TextSentimentChecker, self.registry)
+                gemini_future = pool.submit(self._init_gemini)
+                elevenlabs_future = pool.submit(self._init_elevenlabs)
+                
+                if self.inference_pool is not None:
+                    self.transcriber, self.text_checker = transcriber_future.result()
+                else:
+                    self.transcriber = transcriber_future.result()
+                    self.text_checker = checker_future.result()
+                self.whisper_model = self.transcriber.model
+                self.gemini_model = gemini_future.result()
+                elevenlabs_future.result()
             
-            with wave.open(self.TEMP_WAV, 'wb') as wf:
-                wf.setnchannels(self.CHANNELS)
-                wf.setsampwidth(self.audio.get_sample_size(self.FORMAT))
-                wf.setframerate(self.RATE)
-                wf.writeframes(b''.join(frames))
+            # The tone switcher shares our detector and checker
+            self.tone_switcher = ToneSwitcher(self.voice_detector, self.text_checker)
+            self.tone_switcher.start()
+            self._register_model_metrics()
             
-            return self.TEMP_WAV
+            self.registry.log_memory_footprint()
         except Exception as e:
-            print(f"Error in recording audio: {str(e)}")
+            self.load_error = e
+            logger.error(f"Error loading models: {str(e)}")
+            self.metrics.inc("errors_total", component="model_load")
+        finally:
+            self.ready.set()
+    
+    def _init_worker_proxies(self):
+        """Starts the inference workers and returns the transcriber and sentiment proxies"""
+        self.inference_pool.warm()
+        return (ProcessTranscriber(self.inference_pool, self.whisper_options.get("language")),
+                ProcessSentimentChecker(self.inference_pool))
+    
+    def _register_model_metrics(self):
+        """Exports the sentiment cache counters and the voice emotion queue depth"""
+        checker = self.text_checker
+        self.metrics.register_callback("cache_hits_total", lambda: checker.cache_hits, kind="counter", cache="sentiment")
+        self.metrics.register_callback("cache_misses_total", lambda: checker.cache_misses, kind="counter", cache="sentiment")
+        self.metrics.register_callback("queue_depth", self.tone_switcher.voice_emotion_queue.qsize,
+                                       queue="voice_emotion_queue")
+    
+    def _init_gemini(self):
+        """Configures Gemini if an API key is provided"""
+        if self.gemini_model is not None:
+            return self.gemini_model
+        if not self.gemini_api_key:
+            logger.info("No Gemini API key provided. Response generation will be simulated.")
             return None
+        import google.generativeai as genai
+        genai.configure(api_key=self.gemini_api_key)
+        return genai.GenerativeModel('gemini-2.0-flash')
+    
+    def _init_elevenlabs(self):
+        """Configures ElevenLabs if an API key is provided"""
+        if not self.elevenlabs_api_key:
+            logger.info("No ElevenLabs API key provided. Voice synthesis will be simulated.")
+            return
+        from elevenlabs import set_api_key
+        set_api_key(self.elevenlabs_api_key)
+    
+    def wait_until_ready(self, timeout=None):
+        """Blocks until background model loading finishes. Returns True if the models loaded."""
+        if not self.ready.is_set():
+            logger.info("⏳ Waiting for models to finish loading...")
+        self.ready.wait(timeout)
+        return self.ready.is_set() and self.load_error is None
     
-    def transcribe_audio(self, filename):
-        """Transcribes audio using Whisper"""
+    def record_audio(self):
+        """
+        Records the next utterance from the shared microphone capture. With VAD the
+        utterance ends as soon as the speaker stops; otherwise RECORD_SECONDS are recorded.
+        Returns a zero-copy float32 view into the capture ring buffer.
+        """
         try:
-            if not os.path.exists(filename):
-                print(f"Audio file not found: {filename}")
-                return ""
-                        
-            # Use a different approach for audio loading
-            audio, sr = librosa.load(filename, sr=16000)
-            
-            # Get the log mel spectrogram
-            mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio)).to(self.whisper_model.device)
+            if self.use_vad:
+                logger.info("🎙️ Listening... (start speaking)")
+                audio = self.endpointer.capture_utterance(self.capture, gate=self._own_playback)
+            else:
+                logger.info(f"Recording for {self.RECORD_SECONDS} second(s)...")
+                start = self.capture.position
+                num_samples = int(self.RATE * self.RECORD_SECONDS)
+                audio = self.capture.read(start, num_samples, timeout=self.RECORD_SECONDS + 2)
+            if audio is None:
+                logger.warning("Microphone capture is not delivering audio")
+                return None
             
-            # Detect the spoken language
-            _, probs = self.whisper_model.detect_language(mel)
+            if self.debug_audio:
+                write_wav(self.TEMP_WAV, audio, self.RATE, self.CHANNELS)
             
-            # Decode the audio
-            options = whisper.DecodingOptions(fp16=False)
-            result = whisper.decode(self.whisper_model, mel, options)
+            return audio
+        except Exception as e:
+            logger.error(f"Error in recording audio: {str(e)}")
+            self.metrics.inc("errors_total", component="record")
+            return None
+    
+    def record_and_transcribe(self, partial_interval=1.0):
+        """
+        Records the next utterance while transcribing it, printing partial transcripts
+        as the user speaks. Returns (audio, transcript), or (None, None) on failure.
+        """
+        try:
+            logger.info("🎙️ Listening... (start speaking)")
+            for text, is_final, audio in self.transcriber.stream(self.capture, self.endpointer, partial_interval,
+                                                                 gate=self._own_playback):
+                if is_final:
+                    if self.debug_audio:
+                        write_wav(self.TEMP_WAV, audio, self.RATE, self.CHANNELS)
+                    return audio, text
+                if text:
+                    logger.info(f"📝 ... {text}")
+            logger.warning("Microphone capture is not delivering audio")
+        except Exception as e:
+            logger.error(f"Error in streaming transcription: {str(e)}")
+            self.metrics.inc("errors_total", component="transcribe")
+        return None, None
+    
+    def capture_turn(self):
+        """
+        Captures the next utterance. Returns (audio, transcript); the transcript is
+        None unless streaming transcription produced it during recording.
+        """
+        # Streaming needs Whisper; until it has loaded, record without it
+        if self.stream_transcription and self.use_vad and self.ready.is_set() and self.transcriber:
+            return self.record_and_transcribe()
+        return self.record_audio(), None
+    
+    def _own_playback(self):
+        """
+        True while our response is playing (plus its echo tail). The next turn is
+        captured during playback, and without echo cancellation the microphone
+        hears the speakers, so no utterance may start then.
+        """
+        return self.player.is_playing(self.ECHO_TAIL_SECONDS)
+    
+    def _transcript_for(self, audio, transcript):
+        """Transcribes `audio` unless streaming transcription already did"""
+        return transcript if transcript is not None else self.transcribe_audio(audio)
+    
+    def transcribe_audio(self, audio):
+        """Transcribes audio using Whisper (accepts a float32 buffer at RATE or a file path)"""
+        try:
+            if isinstance(audio, str):
+                if not os.path.exists(audio):
+                    logger.warning(f"Audio file not found: {audio}")
+                    return ""
+                audio = load_audio(audio, self.RATE)
             
-            return result.text
+            # One encoder pass; the language is detected once per session
+            return self.transcriber.transcribe(audio)
         except Exception as e:
-            print(f"Error in transcription: {str(e)}")
+            logger.error(f"Error in transcription: {str(e)}")
+            self.metrics.inc("errors_total", component="transcribe")
             return ""
     
-    def generate_response(self, transcript):
-        """Generates a response using Gemini"""
+    def generate_response(self, transcript, stream=False):
+        """
+        Generates a response using Gemini. With stream=True a generator is returned
+        that yields complete sentences as soon as Gemini has produced them.
+        """
+        if stream:
+            return self._generate_response_stream(transcript)
+        
         if not transcript or transcript.strip() == "":
-            return "I didn't catch that. Could you please repeat?"
+            return NO_SPEECH_REPLY
         
         try:
             # Add user message to conversation history
-            self.conversation_history.append({"role": "user", "content": transcript})
+            self.conversation_history.add("user", transcript)
             
             if self.gemini_model:
-                # Create prompt with conversation history
-                prompt = "You are a helpful and empathetic AI assistant. Respond to the following message in 1 to 2 lines:\n\n"
-                
-                # Add last few conversation turns for context (limit to 5 turns)
-                for message in self.conversation_history[-5:]:
-                    role = "User" if message["role"] == "user" else "Assistant"
-                    prompt += f"{role}: {message['content']}\n"
-                
                 # Generate response
-                response = self.gemini_model.generate_content(prompt)
+                response = self.gemini_breaker.call(self.gemini_model.generate_content, self._build_prompt(),
+                                                    deadline=self.generate_timeout)
                 ai_response = response.text
             else:
                 # Simulate response if no API key
                 ai_response = f"This is a simulated response to: '{transcript}'"
             
             # Add AI response to conversation history
-            self.conversation_history.append({"role": "assistant", "content": ai_response})
+            self.conversation_history.add("assistant", ai_response)
             
             return ai_response
+        except CircuitOpenError as e:
+            logger.warning(f"⚡ {e}; using the fallback reply")
+            return ERROR_REPLY
         except Exception as e:
-            print(f"Error generating response: {str(e)}")
-            return "I'm having trouble generating a response right now."
+            logger.error(f"Error generating response: {str(e)}")
+            self.metrics.inc("errors_total", component="generate")
+            return ERROR_REPLY
+    
+    def _generate_response_stream(self, transcript):
+        """Generator behind generate_response(stream=True)"""
+        if not transcript or transcript.strip() == "":
+            yield NO_SPEECH_REPLY
+            return
+        
+        # Add user message to conversation history
+        self.conversation_history.add("user", transcript)
+        
+        pieces = []
+        splitter = SentenceSplitter()
+        try:
+            for piece in self._stream_gemini(self._build_prompt(), transcript):
+                pieces.append(piece)
+                for sentence in splitter.feed(piece):
+                    yield sentence
+            rest = splitter.flush()
+            if rest:
+                yield rest
+        except CircuitOpenError as e:
+            logger.warning(f"⚡ {e}; using the fallback reply")
+            yield ERROR_REPLY
+            return
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            self.metrics.inc("errors_total", component="generate")
+            if not pieces:
+                yield ERROR_REPLY
+                return
+        
+        # Add AI response to conversation history (what was produced before any error)
+        self.conversation_history.add("assistant", "".join(pieces).strip())
+    
+    def _stream_gemini(self, prompt, transcript):
+        """Yields pieces of Gemini's response text as they are generated"""
+        if self.gemini_model:
+            for chunk in self.gemini_breaker.stream(self.gemini_model.generate_content, prompt, stream=True,
+                                                    deadline=self.generate_timeout):
+                yield chunk.text
+        else:
+            # Simulate response if no API key
+            yield f"This is a simulated response to: '{transcript}'"
+    
+    def _build_prompt(self):
+        """Creates the Gemini prompt from the recent conversation history"""
+        return self.conversation_history.build_prompt()
+    
+    @staticmethod
+    def _format_tts_text(text, tone):
+        """Formats text with an emotion suffix, the format that works best with ElevenLabs"""
+        # Include the emotion directly in the text
+        if tone["style"] == "calm":
+            emotion_suffix = ", they said calmly and reassuringly."
+        elif tone["style"] == "cheerful":
+            emotion_suffix = ", they said with enthusiasm and excitement!"
+        else:  # neutral
+            emotion_suffix = ", they said in a neutral tone."
+        
+        # Adjust for rate in the emotion description
+        if tone["rate"] == "slow":
+            emotion_suffix = emotion_suffix.replace("said", "said slowly")
+        elif tone["rate"] == "fast":
+            emotion_suffix = emotion_suffix.replace("said", "said quickly")
+        
+        # Adjust for pitch in the emotion description
+        if tone["pitch"] == "high":
+            emotion_suffix = emotion_suffix.replace("said", "said with a higher pitch")
+        elif tone["pitch"] == "low":
+            emotion_suffix = emotion_suffix.replace("said", "said with a lower pitch")
+        
+        logger.debug(f"Using emotion suffix: {emotion_suffix}")
+        return f'"{text}"{emotion_suffix}'
+    
+    @property
+    def tts_sample_rate(self):
+        """Sample rate of TTS_OUTPUT_FORMAT (e.g. 16000 for pcm_16000)"""
+        return int(self.TTS_OUTPUT_FORMAT.split("_")[1])
+    
+    def _tts_cache_key(self, text, tone):
+        return TTSCache.make_key(text, tone, self.VOICE_ID, self.TTS_MODEL, self.TTS_OUTPUT_FORMAT)
+    
+    def _cached_speech(self, text, tone):
+        """Returns cached PCM (a memmap) for text in this tone, or None"""
+        if self.tts_cache is None:
+            return None
+        return self.tts_cache.get(self._tts_cache_key(text, tone))
+    
+    def _cache_while_streaming(self, text, tone, chunks):
+        """Passes chunks through and caches the audio once the stream has completed"""
+        received = []
+        for chunk in chunks:
+            received.append(chunk)
+            yield chunk
+        self.tts_cache.put(self._tts_cache_key(text, tone), b"".join(received))
     
     def synthesize_voice(self, text, tone):
         try:
+            # Cached phrases need no API call
+            cached = self._cached_speech(text, tone)
+            if cached is not None:
+                write_pcm16_wav(self.RESPONSE_AUDIO, cached, self.tts_sample_rate)
+                return True
+            
             if self.elevenlabs_api_key:
                 try:
-                    # Use a single voice ID (you can change this to your preferred voice)
-                    voice_id = "21m00Tcm4TlvDq8ikWAM"  # Rachel voice (neutral female)
-                    
-                    # Format text with emotion
-                    # Include the emotion directly in the text
-                    if tone["style"] == "calm":
-                        emotion_suffix = ", they said calmly and reassuringly."
-                    elif tone["style"] == "cheerful":
-                        emotion_suffix = ", they said with enthusiasm and excitement!"
-                    else:  # neutral
-                        emotion_suffix = ", they said in a neutral tone."
-                    
-                    # Adjust for rate in the emotion description
-                    if tone["rate"] == "slow":
-                        emotion_suffix = emotion_suffix.replace("said", "said slowly")
-                    elif tone["rate"] == "fast":
-                        emotion_suffix = emotion_suffix.replace("said", "said quickly")
-                    
-                    # Adjust for pitch in the emotion description
-                    if tone["pitch"] == "high":
-                        emotion_suffix = emotion_suffix.replace("said", "said with a higher pitch")
-                    elif tone["pitch"] == "low":
-                        emotion_suffix = emotion_suffix.replace("said", "said with a lower pitch")
-                    
-                    print(f"Using emotion suffix: {emotion_suffix}")
+                    from elevenlabs import generate, save, set_api_key, Voice, VoiceSettings
                     
                     # Create voice settings optimized for emotion-based handling
-                    voice_settings = VoiceSettings(
-                        stability=0.3,  # Lower stability for more expressiveness
-                        similarity_boost=0.75,
-                        style=0.7,  # Higher style for more character
-                        use_speaker_boost=True
-                    )
+                    voice_settings = VoiceSettings(**self.VOICE_SETTINGS)
                     
                     # Format text with emotion suffix
-                    # This is the format that works best with ElevenLabs
-                    modified_text = f'"{text}"{emotion_suffix}'
+                    modified_text = self._format_tts_text(text, tone)
                     
-                    # Set the API key explicitly before generating
-                    set_api_key(self.elevenlabs_api_key)
+                    def request():
+                        # Set the API key explicitly before generating
+                        set_api_key(self.elevenlabs_api_key)
+                        
+                        # Generate audio with emotion-based handling
+                        return generate(
+                            text=modified_text,
+                            voice=Voice(
+                                voice_id=self.VOICE_ID,
+                                settings=voice_settings
+                            ),
+                            model=self.TTS_MODEL
+                        )
                     
-                    # Generate audio with emotion-based handling
-                    audio = generate(
-                        text=modified_text,
-                        voice=Voice(
-                            voice_id=voice_id,
-                            settings=voice_settings
-                        ),
-                        model="eleven_monolingual_v1"  # Best model for this technique
-                    )
+                    audio = self.elevenlabs_breaker.call(request, deadline=self.synthesize_timeout)
                     
                     # Save audio file
                     save(audio, self.RESPONSE_AUDIO)
                     return True
                     
+                except CircuitOpenError as e:
+                    logger.warning(f"⚡ {e}; using simulated voice")
                 except Exception as e:
                     error_message = str(e)
-                    print(f"ElevenLabs API error: {error_message}")
+                    logger.error(f"ElevenLabs API error: {error_message}")
+                    self.metrics.inc("errors_total", component="synthesize")
                     
-                    # Check if this is a free tier restriction error
-                    if "Free Tier usage disabled" in error_message or "Unusual activity detected" in error_message:
-                        print("\n⚠️ ElevenLabs free tier restriction detected. Switching to simulated voice mode.")
-                        print("To use ElevenLabs voice synthesis, you may need to upgrade to a paid plan.")
-                        # Disable ElevenLabs for the rest of the session
-                        self.elevenlabs_disabled = True
+                    # A free tier restriction has already opened the circuit for PLAN_LIMIT_BACKOFF
+                    if elevenlabs_plan_limit(e):
+                        logger.warning("\n⚠️ ElevenLabs free tier restriction detected. Switching to simulated voice mode.")
+                        logger.info("To use ElevenLabs voice synthesis, you may need to upgrade to a paid plan.")
                     else:
-                        print("\n⚠️ Temporary error with ElevenLabs. Falling back to simulated voice for this response.")
+                        logger.warning("\n⚠️ Temporary error with ElevenLabs. Falling back to simulated voice for this response.")
             
             # Simulate voice synthesis (fallback or if API key not provided)
-            print(f"\n[Simulated Voice] Speaking with {tone['style']} tone, {tone['rate']} rate, {tone['pitch']} pitch:")
-            print(f"'{text}'")
+            logger.info(f"\n[Simulated Voice] Speaking with {tone['style']} tone, {tone['rate']} rate, {tone['pitch']} pitch:")
+            logger.info(f"'{text}'")
             return False
             
         except Exception as e:
-            print(f"Error in voice synthesis fallback: {str(e)}")
+            logger.error(f"Error in voice synthesis fallback: {str(e)}")
+            self.metrics.inc("errors_total", component="synthesize")
             return False
     
     def play_audio(self, filename):
         """Plays audio file"""
         if not os.path.exists(filename):
-            print(f"Audio file not found: {filename}")
+            logger.warning(f"Audio file not found: {filename}")
             return
         
         try:
             # Open the audio file
             wf = wave.open(filename, 'rb')
             
+            # 16-bit mono audio goes through the persistent output stream
+            if wf.getsampwidth() == 2 and wf.getnchannels() == 1:
+                self.player.play(self._wav_chunks(wf), rate=wf.getframerate())
+                wf.close()
+                return
+            
             # Create stream
             stream = self.audio.open(
                 format=self.audio.get_format_from_width(wf.getsampwidth()),
@@ -257,90 +568,290 @@ class IntegratedSystem:
             stream.stop_stream()
             stream.close()
         except Exception as e:
-            print(f"Error playing audio: {str(e)}")
-    
-    def process_interaction(self):
-        """Process a single interaction"""
-        # Record audio
-        audio_file = self.record_audio()
-        if not audio_file or not os.path.exists(audio_file):
-            print("❌ Failed to record audio")
-            return
+            logger.error(f"Error playing audio: {str(e)}")
+            self.metrics.inc("errors_total", component="play")
+    
+    def _wav_chunks(self, wf):
+        """Yields CHUNK-frame blocks from an open wave file"""
+        data = wf.readframes(self.CHUNK)
+        while len(data) > 0:
+            yield data
+            data = wf.readframes(self.CHUNK)
+    
+    def speak_streaming(self, text, tone, start_time=None):
+        """
+        Streams ElevenLabs audio straight into the output stream, so speech starts
+        with the first chunk. Time-to-first-audio is measured from `start_time`.
+        Returns True if audio was played.
+        """
+        # Cached phrases play straight from the memory-mapped file
+        cached = self._cached_speech(text, tone)
+        if cached is not None and self.player.play(TTSCache.chunks(cached), rate=self.tts_sample_rate,
+                                                   start_time=start_time):
+            logger.info(f"🔊 Time to first audio: {self.player.last_time_to_first_audio:.2f}s (cached)")
+            return True
         
-        # Detect voice emotion
-        Voice_emotion, Voice_confidence = self.voice_detector.detect_emotion_from_file(audio_file)
-        print(f"Voice Emotion: {Voice_emotion.upper()} (confidence: {Voice_confidence:.2f})")
+        if self.elevenlabs_client:
+            try:
+                chunks = self.elevenlabs_breaker.stream(self.elevenlabs_client.stream, self._format_tts_text(text, tone),
+                                                        self.VOICE_ID, self.TTS_MODEL, self.VOICE_SETTINGS,
+                                                        deadline=self.synthesize_timeout)
+                if self.tts_cache is not None:
+                    chunks = self._cache_while_streaming(text, tone, chunks)
+                played = self.player.play(chunks, rate=self.elevenlabs_client.sample_rate, start_time=start_time)
+                if played:
+                    logger.info(f"🔊 Time to first audio: {self.player.last_time_to_first_audio:.2f}s")
+                    return True
+            except CircuitOpenError as e:
+                logger.warning(f"⚡ {e}; using simulated voice")
+            except Exception as e:
+                logger.error(f"ElevenLabs API error: {str(e)}")
+                self.metrics.inc("errors_total", component="synthesize")
+                logger.error("\n⚠️ Error with ElevenLabs streaming. Falling back to simulated voice for this response.")
         
-        # Transcribe audio
-        transcript = self.transcribe_audio(audio_file).strip()
+        # Simulate voice synthesis (fallback or if API key not provided)
+        logger.info(f"\n[Simulated Voice] Speaking with {tone['style']} tone, {tone['rate']} rate, {tone['pitch']} pitch:")
+        logger.info(f"'{text}'")
+        return False
+    
+    def speak_sentences(self, sentences, tone, start_time=None):
+        """
+        Speaks sentences from the `sentences` iterator as they arrive. The iterator
+        is drained on a worker thread, so the next sentence is being generated while
+        the current one is spoken.
+        Returns (full_text, timings) with time-to-first-sentence and time-to-first-audio
+        measured from `start_time`.
+        """
+        start_time = start_time if start_time is not None else time.perf_counter()
+        pending = queue.Queue()
+        
+        def produce():
+            try:
+                for sentence in sentences:
+                    pending.put(sentence)
+            finally:
+                pending.put(None)
+        
+        producer = self.executor.submit(produce)
+        spoken = []
+        timings = {}
+        while True:
+            sentence = pending.get()
+            if sentence is None:
+                break
+            if not spoken:
+                timings["first_sentence"] = time.perf_counter() - start_time
+            spoken.append(sentence)
+            logger.info(f"💬 {sentence}")
+            
+            # Only the first sentence's latency counts against the utterance end
+            first_audio_at = self.player.last_first_audio_at
+            if self.stream_tts and self.elevenlabs_client:
+                voice_success = self.speak_streaming(sentence, tone, start_time if len(spoken) == 1 else None)
+            else:
+                voice_success = self.synthesize_voice(sentence, tone)
+                if voice_success:
+                    self.play_audio(self.RESPONSE_AUDIO)
+            if ("first_audio" not in timings and voice_success
+                    and self.player.last_first_audio_at != first_audio_at):
+                timings["first_audio"] = self.player.last_first_audio_at - start_time
+        
+        producer.result()
+        return " ".join(spoken), timings
+    
+    def process_interaction(self, audio=None):
+        """
+        Process a single interaction.
+        Voice emotion and transcription run concurrently, and when pipelining is on
+        the next utterance starts being captured while the response plays.
+        `audio` may be an already-captured utterance or a Future from capture_turn().
+        Returns a Future for the next utterance (or None) to pass to the next call.
+        """
+        timings = {}
+        turn_start = time.perf_counter()
+        
+        # Record audio (or collect the utterance captured during the previous playback)
+        transcript = None
+        if audio is None:
+            audio, transcript = self.capture_turn()
+        elif isinstance(audio, Future):
+            audio, transcript = audio.result()
+        utterance_end = time.perf_counter()
+        timings["record"] = utterance_end - turn_start
+        if audio is None or len(audio) == 0:
+            logger.error("❌ Failed to record audio")
+            return None
+        
+        # Transcription and sentiment need the background-loaded models
+        if not self.wait_until_ready():
+            logger.error("❌ Models failed to load")
+            return None
+        
+        # Voice emotion and transcription are independent, so run them side by side
+        analysis_start = time.perf_counter()
+        emotion_future = self.executor.submit(self._timed, self.voice_detector.detect_emotion_from_array, audio,
+                                              None, self.emotion_state)
+        transcript_future = self.executor.submit(self._timed, self._transcript_for, audio, transcript)
+        (Voice_emotion, Voice_confidence), timings["emotion"] = emotion_future.result()
+        transcript, timings["transcribe"] = transcript_future.result()
+        timings["analysis"] = time.perf_counter() - analysis_start
+        transcript = transcript.strip()
+        
+        logger.info(f"Voice Emotion: {Voice_emotion.upper()} (confidence: {Voice_confidence:.2f})")
         
         if not transcript:
-            print("⚠️ No speech detected or transcription failed")
-            return
+            logger.warning("⚠️ No speech detected or transcription failed")
+            return None
         
-        print(f"📝 Transcript: \"{transcript}\"")
+        logger.info(f"📝 Transcript: \"{transcript}\"")
         
         # Analyze text sentiment
-        sentiment_score, sentiment_label = self.text_checker.analyze_transcript(transcript)
+        (sentiment_score, sentiment_label), timings["sentiment"] = self._timed(
+            self.text_checker.analyze_transcript, transcript)
         
         if sentiment_score is not None:
-            print(f"Text Sentiment: {sentiment_label.upper()} (score: {sentiment_score:.2f})")
+            logger.info(f"Text Sentiment: {sentiment_label.upper()} (score: {sentiment_score:.2f})")
         else:
-            print("⚠️ Could not analyze text sentiment")
+            logger.warning("⚠️ Could not analyze text sentiment")
         
-        # Update tone switcher with both inputs
-        self.tone_switcher.update_transcript(transcript)
+        # Decide the tone for this reply from both inputs
+        current_tone = self.tone_switcher.decide_now(transcript, Voice_emotion, sentiment_label)
         
-        # Get current tone
-        current_tone = self.tone_switcher.get_current_tone()
+        # Start capturing the next turn while the response plays. With fixed
+        # windows the next window would mostly contain our own playback, so
+        # this only happens with VAD endpointing, which ignores onsets while
+        # the player is active (see _own_playback).
+        next_audio = None
+        
+        if self.stream_llm:
+            # Each sentence is spoken as soon as Gemini finishes it
+            logger.info(f"Selected tone: {current_tone['style']} (rate: {current_tone['rate']}, pitch: {current_tone['pitch']})")
+            if self.pipelined and self.use_vad:
+                next_audio = self.executor.submit(self.capture_turn)
+            sentences = self.generate_response(transcript, stream=True)
+            (response_text, speak_timings), timings["speak"] = self._timed(
+                self.speak_sentences, sentences, current_tone, utterance_end)
+            timings.update(speak_timings)
+            logger.info(f"AI Response: \"{response_text}\"")
+            
+            # Critical path: from the end of the user's utterance until the response starts
+            timings["critical_path"] = timings.get("first_audio", time.perf_counter() - utterance_end)
+            self._finish_turn(timings, voice_emotion=Voice_emotion, sentiment=sentiment_label, tone=current_tone)
+            return next_audio
         
         # Generate response
-        response_text = self.generate_response(transcript)
-        print(f"AI Response: \"{response_text}\"")
+        response_text, timings["generate"] = self._timed(self.generate_response, transcript)
+        logger.info(f"AI Response: \"{response_text}\"")
         
         # Generate SSML
         ssml = self.tone_switcher.generate_ssml(response_text)
         
-        print(f"Selected tone: {current_tone['style']} (rate: {current_tone['rate']}, pitch: {current_tone['pitch']})")
-        
-        # Synthesize voice
-        voice_success = self.synthesize_voice(response_text, current_tone)
+        logger.info(f"Selected tone: {current_tone['style']} (rate: {current_tone['rate']}, pitch: {current_tone['pitch']})")
         
-        # Play audio response if synthesis was successful
-        if voice_success:
-            self.play_audio(self.RESPONSE_AUDIO)
+        if self.stream_tts and self.elevenlabs_client:
+            # Synthesis and playback overlap; the response starts with the first chunk
+            if self.pipelined and self.use_vad:
+                next_audio = self.executor.submit(self.capture_turn)
+            voice_success, timings["speak"] = self._timed(self.speak_streaming, response_text, current_tone,
+                                                          utterance_end)
+            if voice_success:
+                timings["first_audio"] = self.player.last_time_to_first_audio
+            
+            # Critical path: from the end of the user's utterance until the response starts
+            timings["critical_path"] = timings.get("first_audio", time.perf_counter() - utterance_end)
+        else:
+            # Synthesize voice
+            voice_success, timings["synthesize"] = self._timed(self.synthesize_voice, response_text, current_tone)
+            
+            # Critical path: from the end of the user's utterance until the response starts
+            timings["critical_path"] = time.perf_counter() - utterance_end
+            
+            if self.pipelined and self.use_vad:
+                next_audio = self.executor.submit(self.capture_turn)
+            
+            # Play audio response if synthesis was successful
+            if voice_success:
+                _, timings["play"] = self._timed(self.play_audio, self.RESPONSE_AUDIO)
         
-        # Clean up
-        if os.path.exists(audio_file):
-            os.remove(audio_file)
+        self._finish_turn(timings, voice_emotion=Voice_emotion, sentiment=sentiment_label, tone=current_tone)
+        return next_audio
+    
+    def _timed(self, fn, *args):
+        """Calls fn(*args) and returns (result, elapsed_seconds)"""
+        start = time.perf_counter()
+        result = fn(*args)
+        return result, time.perf_counter() - start
+    
+    def _finish_turn(self, timings, **fields):
+        """Reports a completed turn: prints timings, feeds the metrics and appends to the trace log"""
+        self.last_turn_timings = timings
+        self._print_turn_timings(timings)
+        self.metrics.record_turn(timings)
+        if self.tracer is not None:
+            self.tracer.write(timings, **fields)
+    
+    def _print_turn_timings(self, timings):
+        """Prints the per-stage timings of the last turn"""
+        stages = ["emotion", "transcribe", "sentiment", "generate", "synthesize"]
+        serial = sum(timings.get(stage, 0) for stage in stages)
+        logger.info(f"⏱️ Critical path: {timings['critical_path']:.2f}s (stages run serially would take {serial:.2f}s) | " +
+              ", ".join(f"{stage}: {timings[stage]:.2f}s" for stage in stages + ["speak", "first_sentence", "first_audio", "play"]
+                        if stage in timings))
     
     def start(self):
         """Start the integrated system"""
-        print("Speak into the microphone when prompted.")
-        print("Press Ctrl+C to exit.")
+        logger.info("Speak into the microphone when prompted.")
+        logger.info("Press Ctrl+C to exit.")
         
         try:
+            next_audio = None
             while True:
-                print("\n----- New Interaction -----")
-                self.process_interaction()
-                print("\nReady for next interaction in 2 seconds...")
-                time.sleep(2)
+                logger.info("\n----- New Interaction -----")
+                next_audio = self.process_interaction(next_audio)
+                if not self.use_vad:
+                    logger.info("\nReady for next interaction in 2 seconds...")
+                    time.sleep(2)
         
         except KeyboardInterrupt:
-            print("\n\n✅ System stopped. Exiting...")
+            logger.info("\n\n✅ System stopped. Exiting...")
         finally:
             self.cleanup()
     
     def cleanup(self):
         """Clean up resources."""
-        self.audio.terminate()
-        self.tone_switcher.cleanup()
+        self.ready.wait()
+        self.executor.shutdown(wait=False)
+        self.player.close()
+        if self.tone_switcher:
+            self.tone_switcher.cleanup()
+        self.voice_detector.cleanup()
+        if self.text_checker:
+            self.text_checker.cleanup()
+        if self.transcriber is not None:
+            self.transcriber.close()
+        if self.inference_pool is not None:
+            self.inference_pool.close()
+        self.registry.release("microphone")
+        self.registry.release("pyaudio")
+        if self.tts_cache is not None:
+            logger.info(self.tts_cache.summary())
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
         if os.path.exists(self.TEMP_WAV):
             os.remove(self.TEMP_WAV)
         if os.path.exists(self.RESPONSE_AUDIO):
             os.remove(self.RESPONSE_AUDIO)
 
 if __name__ == "__main__":
+    import argparse
+    from emotion_backends import BACKENDS
+    
+    parser = argparse.ArgumentParser(description="Run the Feel-Aware system")
+    parser.add_argument("--emotion-backend", default=None, choices=BACKENDS,
+                        help="voice emotion classifier (cascade: rules, wav2vec2 only when unsure); "
+                             "defaults to $EMOTION_BACKEND or rules")
+    args = parser.parse_args()
+    
     # Load environment variables from .env file
     try:
         from dotenv import load_dotenv
@@ -352,5 +863,22 @@ if __name__ == "__main__":
     gemini_api_key = os.environ.get("GEMINI_API_KEY")
     elevenlabs_api_key = os.environ.get("ELEVENLABS_API_KEY")
     
-    system = IntegratedSystem(gemini_api_key, elevenlabs_api_key)
+    setup_logging()
+    
+    # Optional metrics endpoint and per-turn trace log
+    metrics_port = int(os.environ["METRICS_PORT"]) if os.environ.get("METRICS_PORT") else None
+    trace_log = os.environ.get("TRACE_LOG")
+    
+    # Run emotion, Whisper and sentiment in this many worker processes (0: threads in this process)
+    inference_processes = int(os.environ.get("INFERENCE_PROCESSES", "0"))
+    
+    # Voice emotion backend: rules, wav2vec2 or cascade
+    emotion_backend = args.emotion_backend or os.environ.get("EMOTION_BACKEND", "rules")
+    
+    # Models load in the background while the first utterance is recorded
+    system = IntegratedSystem(gemini_api_key, elevenlabs_api_key, background_load=True,
+                              metrics_port=metrics_port, trace_log=trace_log,
+                              inference_processes=inference_processes, emotion_backend=emotion_backend)
+    if system.metrics_server is not None:
+        print(f"📈 Metrics at {system.metrics_server.url}")
     system.start()
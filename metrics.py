@@ -0,0 +1,272 @@
+"""
+In-process metrics: stage timing histograms, counters and gauges, exposed
+over a local HTTP endpoint in Prometheus text format (/metrics) and as
+JSON (/metrics.json), plus an optional per-turn JSONL trace log.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "feelaware_"
+
+# Stage latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def setup_logging(level=None):
+    """
+    Plain-message logging for the command-line entry points. The level comes
+    from `level` or the LOG_LEVEL environment variable (default INFO).
+    """
+    level = level or os.environ.get("LOG_LEVEL", "INFO")
+    logging.basicConfig(level=level.upper() if isinstance(level, str) else level, format="%(message)s")
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+class Histogram:
+    """Cumulative bucket counts plus a window of recent values for quantiles"""
+    def __init__(self, buckets=DEFAULT_BUCKETS, recent=512):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=recent)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """Quantile over the recent window (None if empty)"""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms, keyed by name and labels"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}     # name -> {label key -> value}
+        self._gauges = {}       # name -> {label key -> value}
+        self._callbacks = {}    # name -> {label key -> (fn, kind)}
+        self._histograms = {}   # name -> {label key -> Histogram}
+        self._help = {}
+
+    def describe(self, name, text):
+        """Sets the HELP text shown for `name`"""
+        self._help[name] = text
+
+    def inc(self, name, amount=1, **labels):
+        """Adds to a counter"""
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def register_callback(self, name, fn, kind="gauge", **labels):
+        """
+        Registers a value read at export time, e.g. a queue depth or a counter
+        kept by another component (kind "gauge" or "counter").
+        """
+        with self._lock:
+            self._callbacks.setdefault(name, {})[_label_key(labels)] = (fn, kind)
+
+    def unregister_callback(self, name, **labels):
+        with self._lock:
+            self._callbacks.get(name, {}).pop(_label_key(labels), None)
+
+    def observe(self, name, value, **labels):
+        """Records a value (seconds, for timings) in a histogram"""
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        """Times the enclosed block into stage_seconds{stage=...}; errors also count into errors_total"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("errors_total", component=stage)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+    def _read_callbacks(self):
+        with self._lock:
+            callbacks = {name: dict(series) for name, series in self._callbacks.items()}
+        values = {}
+        for name, series in callbacks.items():
+            for key, (fn, kind) in series.items():
+                try:
+                    values.setdefault(name, (kind, {}))[1][key] = float(fn())
+                except Exception:
+                    continue  # The component has gone away
+        return values
+
+    def snapshot(self):
+        """Everything as a JSON-serializable dict"""
+        callbacks = self._read_callbacks()
+        with self._lock:
+            result = {"counters": {}, "gauges": {}, "histograms": {}}
+            for name, series in self._counters.items():
+                for key, value in series.items():
+                    result["counters"][name + _format_labels(key)] = value
+            for name, series in self._gauges.items():
+                for key, value in series.items():
+                    result["gauges"][name + _format_labels(key)] = value
+            for name, series in self._histograms.items():
+                for key, hist in series.items():
+                    result["histograms"][name + _format_labels(key)] = {
+                        "count": hist.count,
+                        "sum": hist.sum,
+                        "p50": hist.quantile(0.5),
+                        "p95": hist.quantile(0.95),
+                        "p99": hist.quantile(0.99),
+                        "max": max(hist.recent) if hist.recent else None,
+                    }
+        for name, (kind, series) in callbacks.items():
+            section = result["counters"] if kind == "counter" else result["gauges"]
+            for key, value in series.items():
+                section[name + _format_labels(key)] = value
+        return result
+
+    def render_prometheus(self):
+        """Everything in the Prometheus text exposition format"""
+        callbacks = self._read_callbacks()
+        lines = []
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f"# HELP {PREFIX}{name} {self._help[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                header(name, "counter")
+                for key, value in series.items():
+                    lines.append(f"{PREFIX}{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._gauges.items()):
+                header(name, "gauge")
+                for key, value in series.items():
+                    lines.append(f"{PREFIX}{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                header(name, "histogram")
+                for key, hist in series.items():
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, {'le': bound})} {cumulative}")
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, {'le': '+Inf'})} {hist.count}")
+                    lines.append(f"{PREFIX}{name}_sum{_format_labels(key)} {hist.sum}")
+                    lines.append(f"{PREFIX}{name}_count{_format_labels(key)} {hist.count}")
+        for name, (kind, series) in sorted(callbacks.items()):
+            header(name, kind)
+            for key, value in series.items():
+                lines.append(f"{PREFIX}{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def record_turn(self, timings):
+        """Records one turn's stage timings (seconds) and counts the turn"""
+        self.inc("turns_total")
+        for stage, seconds in timings.items():
+            if isinstance(seconds, (int, float)):
+                self.observe("stage_seconds", seconds, stage=stage)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    metrics = None
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would flood the console
+
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body = json.dumps(self.metrics.snapshot(), indent=2).encode("utf-8")
+            content_type = "application/json"
+        elif self.path.startswith("/metrics"):
+            body = self.metrics.render_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class MetricsServer:
+    """Serves /metrics (Prometheus text) and /metrics.json on a background thread"""
+    def __init__(self, metrics=None, host="127.0.0.1", port=9464):
+        handler = type("Handler", (_MetricsHandler,), {"metrics": metrics or get_metrics()})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class TurnTracer:
+    """Appends one JSON line per turn (timestamp, stage timings and any extra fields)"""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, timings, **fields):
+        record = {"time": time.time(), "timings": timings, **fields}
+        line = json.dumps(record, default=str) + "\n"
+        with self.lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+# Process-wide default, shared like the model registry
+_default_metrics = Metrics()
+_default_metrics.describe("stage_seconds", "Time spent in each pipeline stage")
+_default_metrics.describe("errors_total", "Errors by component")
+_default_metrics.describe("turns_total", "Completed conversation turns")
+_default_metrics.describe("queue_dropped_total", "Items dropped from a full bounded queue")
+_default_metrics.describe("queue_coalesced_total", "Stale items replaced by a newer one before being read")
+_default_metrics.describe("circuit_state", "Remote service circuit: 0 closed, 1 half-open, 2 open")
+_default_metrics.describe("circuit_rejections_total", "Calls rejected while a circuit was open")
+_default_metrics.describe("circuit_opened_total", "Times a circuit opened")
+_default_metrics.describe("emotion_windows_total", "Cascade emotion windows answered by the rules or by a wav2vec2 escalation")
+
+def get_metrics():
+    """Returns the process-wide Metrics"""
+    return _default_metrics
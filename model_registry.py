@@ -0,0 +1,214 @@
+import logging
+import os
+import sys
+import time
+import threading
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    """
+    Process-wide, thread-safe registry of heavy models and shared resources.
+    Each entry is loaded lazily on first acquire(), shared by every component
+    that asks for it, and unloaded when its reference count drops to zero.
+
+    Keys may carry a variant after a colon (e.g. "whisper:base"); the variant
+    is passed to the loader so different model sizes are cached separately.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaders = {}       # name -> (loader, unloader)
+        self._entries = {}       # key -> {"value", "refcount", "load_seconds"}
+        self._key_locks = {}     # key -> lock held while that key is loading
+
+        # Default loaders for the models used across the system
+        self.register("whisper", _load_whisper)
+        self.register("sentiment", _load_sentiment)
+        self.register("speechbrain", _load_speechbrain)
+        self.register("pyaudio", _load_pyaudio, _unload_pyaudio)
+        self.register("microphone", self._load_microphone, self._unload_microphone)
+
+    def register(self, name, loader, unloader=None):
+        """Register (or replace) the loader used for `name`"""
+        with self._lock:
+            self._loaders[name] = (loader, unloader)
+
+    def _key_lock(self, key):
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def acquire(self, key):
+        """
+        Returns the shared instance for `key`, loading it on first use.
+        Every acquire() must be balanced by a release().
+        """
+        name, _, variant = key.partition(":")
+
+        # Loading happens under a per-key lock so different models can load in parallel
+        with self._key_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry["refcount"] += 1
+                    return entry["value"]
+                if name not in self._loaders:
+                    raise KeyError(f"No loader registered for '{name}'")
+                loader, _ = self._loaders[name]
+
+            start = time.perf_counter()
+            value = loader(variant or None)
+            load_seconds = time.perf_counter() - start
+
+            with self._lock:
+                self._entries[key] = {"value": value, "refcount": 1, "load_seconds": load_seconds}
+            return value
+
+    def release(self, key):
+        """Drops one reference to `key`, unloading it when nobody uses it any more"""
+        name = key.partition(":")[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry["refcount"] -= 1
+            if entry["refcount"] > 0:
+                return
+            del self._entries[key]
+            _, unloader = self._loaders.get(name, (None, None))
+
+        if unloader is not None:
+            try:
+                unloader(entry["value"])
+            except Exception as e:
+                logger.error(f"Error unloading {key}: {str(e)}")
+
+    def _load_microphone(self, variant):
+        """The shared capture thread uses the shared PyAudio instance"""
+        from audio_capture import MicrophoneCapture
+        capture = MicrophoneCapture(self.acquire("pyaudio"))
+        try:
+            capture.start()
+        except Exception:
+            self.release("pyaudio")
+            raise
+        return capture
+
+    def _unload_microphone(self, capture):
+        capture.stop()
+        self.release("pyaudio")
+
+    def is_loaded(self, key):
+        """Returns True if `key` is currently loaded"""
+        with self._lock:
+            return key in self._entries
+
+    def memory_footprint(self):
+        """
+        Reports the memory held by loaded entries.
+        Returns a dict with per-entry bytes, refcounts, load times and the process RSS.
+        """
+        with self._lock:
+            entries = dict(self._entries)
+
+        models = {}
+        for key, entry in entries.items():
+            models[key] = {
+                "bytes": _estimate_bytes(entry["value"]),
+                "refcount": entry["refcount"],
+                "load_seconds": entry["load_seconds"],
+            }
+
+        return {
+            "models": models,
+            "total_bytes": sum(m["bytes"] for m in models.values()),
+            "process_rss_bytes": _process_rss_bytes(),
+        }
+
+    def log_memory_footprint(self, level=logging.INFO):
+        """Logs a one-line-per-model summary of memory_footprint()"""
+        if not logger.isEnabledFor(level):
+            return
+        footprint = self.memory_footprint()
+        logger.log(level, "📦 Shared models:")
+        for key, info in footprint["models"].items():
+            logger.log(level, f"   {key}: {info['bytes'] / 1e6:.1f} MB "
+                              f"(refs: {info['refcount']}, loaded in {info['load_seconds']:.2f}s)")
+        rss = footprint["process_rss_bytes"]
+        if rss:
+            logger.log(level, f"   process RSS: {rss / 1e6:.1f} MB")
+
+# Default loaders
+
+def _load_whisper(variant):
+    import whisper
+    return whisper.load_model(variant or "tiny")
+
+def _load_sentiment(variant):
+    from transformers import pipeline
+    # Force use of PyTorch to avoid TensorFlow/Keras issues
+    return pipeline(
+        "sentiment-analysis",
+        model=variant or "distilbert-base-uncased-finetuned-sst-2-english",
+        framework="pt"
+    )
+
+def _load_speechbrain(variant):
+    from speechbrain.inference.interfaces import foreign_class
+    return foreign_class(
+        source=variant or "speechbrain/emotion-recognition-wav2vec2-IEMOCAP",
+        pymodule_file="custom_interface.py",
+        classname="CustomEncoderWav2vec2Classifier"
+    )
+
+def _load_pyaudio(variant):
+    import pyaudio
+    return pyaudio.PyAudio()
+
+def _unload_pyaudio(audio):
+    audio.terminate()
+
+# Memory accounting helpers
+
+def _module_bytes(module):
+    """Bytes held by the parameters and buffers of a torch module"""
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+def _estimate_bytes(value):
+    # torch.nn.Module (e.g. Whisper)
+    if hasattr(value, "parameters") and hasattr(value, "buffers"):
+        return _module_bytes(value)
+    # transformers pipeline
+    model = getattr(value, "model", None)
+    if model is not None and hasattr(model, "parameters"):
+        return _module_bytes(model)
+    # speechbrain interfaces keep their modules in `mods`
+    mods = getattr(value, "mods", None)
+    if mods is not None and hasattr(mods, "parameters"):
+        return _module_bytes(mods)
+    return sys.getsizeof(value)
+
+def _process_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        # Peak RSS; reported in kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+_default_registry = ModelRegistry()
+
+def get_registry():
+    """Returns the process-wide model registry"""
+    return _default_registry
@@ -0,0 +1,105 @@
+import json
+import urllib.parse
+import urllib.request
+import urllib.error
+
+# Default endpoints; point these at stub_servers.py to run offline
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+ELEVENLABS_BASE_URL = "https://api.elevenlabs.io"
+
+class RemoteServiceError(Exception):
+    """Raised when a remote API call fails or returns an error status"""
+    def __init__(self, service, message, status=None):
+        super().__init__(f"{service}: {message}")
+        self.service = service
+        self.status = status
+
+def _post(service, url, body, headers, timeout):
+    """POSTs JSON and returns the open response (caller reads/streams it)"""
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json", **headers},
+        method="POST"
+    )
+    try:
+        return urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        detail = e.read().decode("utf-8", "replace")
+        raise RemoteServiceError(service, f"HTTP {e.code}: {detail}", e.code) from e
+    except (urllib.error.URLError, OSError) as e:
+        raise RemoteServiceError(service, str(e)) from e
+
+class GeminiClient:
+    """Minimal Gemini REST client (generateContent) with a per-request timeout"""
+    def __init__(self, api_key, model="gemini-2.0-flash", base_url=None, timeout=10):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = (base_url or GEMINI_BASE_URL).rstrip("/")
+        self.timeout = timeout
+
+    def _url(self, method, **params):
+        query = urllib.parse.urlencode({"key": self.api_key, **params})
+        return f"{self.base_url}/v1beta/models/{self.model}:{method}?{query}"
+
+    def generate(self, prompt, timeout=None):
+        """Returns the full response text for `prompt`"""
+        body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        with _post("gemini", self._url("generateContent"), body, {}, timeout or self.timeout) as response:
+            payload = json.loads(response.read().decode("utf-8"))
+        return _candidate_text(payload)
+
+    def stream_generate(self, prompt, timeout=None):
+        """Yields pieces of the response text as Gemini streams them (server-sent events)"""
+        body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        url = self._url("streamGenerateContent", alt="sse")
+        with _post("gemini", url, body, {}, timeout or self.timeout) as response:
+            for line in response:
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                text = _candidate_text(json.loads(line[len("data:"):]))
+                if text:
+                    yield text
+
+def _candidate_text(payload):
+    """Joins the text parts of the first candidate in a Gemini response"""
+    try:
+        parts = payload["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError) as e:
+        raise RemoteServiceError("gemini", f"Unexpected response: {payload}") from e
+    return "".join(part.get("text", "") for part in parts)
+
+class ElevenLabsClient:
+    """Minimal ElevenLabs text-to-speech REST client returning raw 16-bit PCM"""
+    def __init__(self, api_key, base_url=None, timeout=15, output_format="pcm_16000"):
+        self.api_key = api_key
+        self.base_url = (base_url or ELEVENLABS_BASE_URL).rstrip("/")
+        self.timeout = timeout
+        self.output_format = output_format
+
+    @property
+    def sample_rate(self):
+        """Sample rate of the PCM output format (e.g. 16000 for pcm_16000)"""
+        return int(self.output_format.split("_")[1])
+
+    def _request(self, text, voice_id, model_id, voice_settings, stream, timeout):
+        path = f"/v1/text-to-speech/{voice_id}" + ("/stream" if stream else "")
+        query = urllib.parse.urlencode({"output_format": self.output_format})
+        body = {"text": text, "model_id": model_id, "voice_settings": voice_settings}
+        return _post("elevenlabs", f"{self.base_url}{path}?{query}", body,
+                     {"xi-api-key": self.api_key}, timeout or self.timeout)
+
+    def synthesize(self, text, voice_id, model_id, voice_settings, timeout=None):
+        """Returns the complete synthesized audio as PCM bytes"""
+        with self._request(text, voice_id, model_id, voice_settings, False, timeout) as response:
+            return response.read()
+
+    def stream(self, text, voice_id, model_id, voice_settings, chunk_size=4096, timeout=None):
+        """Yields PCM chunks from the streaming endpoint as they arrive"""
+        with self._request(text, voice_id, model_id, voice_settings, True, timeout) as response:
+            while True:
+                chunk = response.read1(chunk_size) if hasattr(response, "read1") else response.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
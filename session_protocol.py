@@ -0,0 +1,69 @@
+"""
+Framing for the multi-session server (session_server.py).
+
+Every message is one frame: a 1-byte kind, a 4-byte big-endian payload
+length, then the payload.
+
+Client to server:
+    HELLO  JSON {"session": optional id, "rate": sample rate of the audio}
+    AUDIO  16-bit mono PCM, any chunk size
+    END    no payload; flush any speech in progress and close the session
+    SYNC   no payload; answered once every utterance endpointed before it
+           has been answered
+
+Server to client:
+    READY   JSON {"session": id}
+    RESULT  JSON for one turn: transcript, voice emotion, sentiment, tone,
+            reply and stage timings
+    SPEECH  16-bit mono PCM of the spoken reply (one or more frames, then an
+            empty SPEECH frame)
+    ERROR   JSON {"error": message}
+    SYNC    JSON {"turns": turns answered so far}, after the RESULT (and
+            SPEECH) frames of every utterance sent before the client's SYNC
+"""
+import json
+import struct
+
+HELLO = b"H"
+AUDIO = b"A"
+END = b"E"
+SYNC = b"Y"
+READY = b"K"
+RESULT = b"R"
+SPEECH = b"S"
+ERROR = b"X"
+
+HEADER = struct.Struct(">cI")
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+class ProtocolError(Exception):
+    """Raised on a malformed frame"""
+
+def send_frame(sock, kind, payload=b""):
+    """Sends one frame (bytes payload)"""
+    sock.sendall(HEADER.pack(kind, len(payload)) + bytes(payload))
+
+def send_json(sock, kind, value):
+    send_frame(sock, kind, json.dumps(value).encode("utf-8"))
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data.extend(chunk)
+    return bytes(data)
+
+def recv_frame(sock):
+    """Returns (kind, payload), or (None, None) when the peer has closed the connection"""
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None, None
+    kind, length = HEADER.unpack(header)
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"frame of {length} bytes exceeds the {MAX_PAYLOAD} byte limit")
+    payload = _recv_exact(sock, length) if length else b""
+    if payload is None:
+        return None, None
+    return kind, payload
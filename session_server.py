@@ -0,0 +1,516 @@
+"""
+Multi-session server: many concurrent callers on one shared set of models.
+
+Clients stream 16 kHz PCM over TCP (framing in session_protocol.py). Each
+session gets its own endpointer, tone state, conversation history and
+Whisper language, while Whisper, the sentiment model and the voice emotion
+detector are loaded once. Transcription and sentiment requests from all
+sessions are micro-batched, so concurrent turns share forward passes (as
+are wav2vec2 emotion escalations with --emotion-backend cascade).
+
+    python session_server.py --port 8765 --stub
+    python benchmarks/session_load.py recordings/*.wav --sessions 1 4 16
+
+--stub answers with the local Gemini/ElevenLabs stand-ins from stub_servers.py.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+import socketserver
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import session_protocol as protocol
+from audio_utils import pcm16_to_float32
+from vad import VoiceActivityEndpointer
+from voice_emotion_detector import VoiceEmotionDetector
+from emotion_backends import make_backend, CascadeState
+from text_sentiment_checker import TextSentimentChecker, SentimentMicroBatcher
+from tone_switcher import ToneSwitcher
+from transcriber import WhisperTranscriber, WhisperMicroBatcher
+from conversation_memory import ConversationMemory
+from integrated_system import IntegratedSystem, NO_SPEECH_REPLY, ERROR_REPLY, elevenlabs_plan_limit
+from remote_clients import GeminiClient, ElevenLabsClient
+from tts_cache import TTSCache
+from model_registry import get_registry
+from metrics import get_metrics, MetricsServer, setup_logging
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+RATE = 16000
+SPEECH_FRAME_BYTES = 32768
+
+def _timed(fn, *args):
+    """Calls fn(*args) and returns (result, elapsed_seconds)"""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+class Session:
+    """
+    One caller's state. Audio is endpointed as it arrives; only the current
+    utterance (plus a short pre-roll while silent) is buffered.
+    """
+    def __init__(self, session_id, sock, server):
+        self.id = session_id
+        self.sock = sock
+        self.endpointer = VoiceActivityEndpointer(rate=RATE)
+        self.transcriber = WhisperTranscriber(server.whisper_model_size, server.registry, **server.whisper_options)
+        self.memory = ConversationMemory()
+        self.emotion_state = CascadeState()
+
+        # Tone state only: the shared server decides, this switcher is never started
+        self.switcher = ToneSwitcher(server.voice_detector, server.text_checker)
+
+        # Chunks fed to the endpointer since sample offset `buffer_start`
+        self.chunks = []
+        self.buffer_start = 0
+        self.pending = np.zeros(0, dtype=np.float32)  # Remainder shorter than one chunk
+        chunk = self.endpointer.CHUNK
+        pre_roll_chunks = -(-int(self.endpointer.pre_roll_seconds * RATE) // chunk)
+        self.keep_chunks = self.endpointer.start_chunks + pre_roll_chunks + 1
+
+        # Turns run one at a time, in order
+        self.turns = deque()
+        self.busy = False
+        self.idle = threading.Condition()
+        self.send_lock = threading.Lock()
+        self.turn_count = 0
+
+    def feed(self, samples):
+        """Endpoints newly received float32 samples. Returns the utterances they completed."""
+        if len(self.pending):
+            samples = np.concatenate([self.pending, samples])
+        chunk = self.endpointer.CHUNK
+        usable = len(samples) - len(samples) % chunk
+
+        utterances = []
+        for start in range(0, usable, chunk):
+            piece = samples[start:start + chunk]
+            self.chunks.append(piece)
+            event = self.endpointer.process_chunk(piece)
+            if event == "speech_end":
+                utterances.append(self._take_utterance())
+            elif not self.endpointer.in_speech and len(self.chunks) > self.keep_chunks:
+                # Silence: keep just enough for the pre-roll of the next onset
+                dropped = len(self.chunks) - self.keep_chunks
+                del self.chunks[:dropped]
+                self.buffer_start += dropped * chunk
+        self.pending = samples[usable:].copy()
+        return utterances
+
+    def flush(self):
+        """Returns the utterance in progress, if any (the caller hung up mid-sentence)"""
+        if not self.endpointer.in_speech:
+            return None
+        return self._take_utterance()
+
+    def _take_utterance(self):
+        audio = np.concatenate(self.chunks)
+        start = max(0, self.endpointer.speech_start - self.buffer_start)
+        utterance = audio[start:self.endpointer.speech_end - self.buffer_start]
+        self.endpointer.reset()
+        self.chunks = []
+        self.buffer_start = 0
+        return utterance
+
+    def send(self, kind, payload=b""):
+        """Sends a frame; returns False if the caller has gone away"""
+        try:
+            with self.send_lock:
+                protocol.send_frame(self.sock, kind, payload)
+            return True
+        except OSError:
+            return False
+
+    def send_json(self, kind, value):
+        return self.send(kind, json.dumps(value).encode("utf-8"))
+
+    def wait_idle(self, timeout=None):
+        """Waits until every queued turn has been answered"""
+        with self.idle:
+            return self.idle.wait_for(lambda: not self.busy and not self.turns, timeout)
+
+    def close(self):
+        self.transcriber.close()
+
+class _SessionHandler(socketserver.BaseRequestHandler):
+    session_server = None
+
+    def handle(self):
+        self.session_server.serve_connection(self.request)
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class SessionServer:
+    """
+    Hosts many concurrent sessions on one set of models. Each connection is
+    read on its own thread; turns run on a shared worker pool and reach the
+    models through the Whisper and sentiment micro-batchers.
+    """
+    def __init__(self, host="127.0.0.1", port=8765, registry=None, whisper_model_size="tiny",
+                 whisper_options=None, gemini_client=None, elevenlabs_client=None, use_tts_cache=True,
+                 workers=None, max_batch_size=8, max_wait_ms=20, metrics=None, emotion_backend="rules",
+                 analysis_timeout=60):
+        self.registry = registry or get_registry()
+        self.metrics = metrics or get_metrics()
+        self.whisper_model_size = whisper_model_size
+        self.whisper_options = whisper_options or {}
+        self.gemini_client = gemini_client
+        self.elevenlabs_client = elevenlabs_client
+        self.tts_cache = TTSCache() if use_tts_cache and elevenlabs_client else None
+        # Seconds a turn waits for the batched models before it fails with an ERROR frame
+        self.analysis_timeout = analysis_timeout
+
+        # A failing service is skipped for every session until it recovers
+        self.gemini_breaker = CircuitBreaker("gemini", metrics=self.metrics)
+        self.elevenlabs_breaker = CircuitBreaker("elevenlabs", metrics=self.metrics,
+                                                 permanent_error=elevenlabs_plan_limit,
+                                                 permanent_open_for=IntegratedSystem.PLAN_LIMIT_BACKOFF)
+
+        # One copy of every model, shared by all sessions
+        logger.info("⏳ Loading shared models...")
+        self.whisper_key = f"whisper:{whisper_model_size}"
+        self.registry.acquire(self.whisper_key)  # Stays loaded between sessions
+        if emotion_backend == "cascade":
+            backend = make_backend(emotion_backend, self.registry, max_batch_size=max_batch_size,
+                                   max_wait_ms=max_wait_ms, metrics=self.metrics)
+        else:
+            backend = make_backend(emotion_backend, self.registry)
+        self.voice_detector = VoiceEmotionDetector(registry=self.registry, backend=backend)
+        self.text_checker = TextSentimentChecker(registry=self.registry)
+        self.sentiment_batcher = SentimentMicroBatcher(self.text_checker, max_batch_size, max_wait_ms).start()
+        self.whisper_batcher = WhisperMicroBatcher(max_batch_size, max_wait_ms).start()
+
+        self.executor = ThreadPoolExecutor(max_workers=workers or min(32, 4 * (os.cpu_count() or 1)))
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+
+        handler = type("Handler", (_SessionHandler,), {"session_server": self})
+        self.server = _TCPServer((host, port), handler)
+        self.thread = None
+
+        self.metrics.register_callback("sessions_active", lambda: len(self.sessions))
+        self.metrics.register_callback("batches_total", lambda: self.whisper_batcher.batches,
+                                       kind="counter", model="whisper")
+        self.metrics.register_callback("batched_items_total", lambda: self.whisper_batcher.clips,
+                                       kind="counter", model="whisper")
+        self.metrics.register_callback("cache_hits_total", lambda: self.text_checker.cache_hits,
+                                       kind="counter", cache="sentiment")
+        self.metrics.register_callback("cache_misses_total", lambda: self.text_checker.cache_misses,
+                                       kind="counter", cache="sentiment")
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def start(self):
+        """Serves on a background thread"""
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        host, port = self.address
+        logger.info(f"🟢 Session server listening on {host}:{port}")
+        return self
+
+    def serve_forever(self):
+        host, port = self.address
+        logger.info(f"🟢 Session server listening on {host}:{port}")
+        self.server.serve_forever()
+
+    # Connections
+
+    def serve_connection(self, sock):
+        """Runs one connection: HELLO, then audio until END or disconnect"""
+        session = None
+        try:
+            kind, payload = protocol.recv_frame(sock)
+            if kind != protocol.HELLO:
+                return
+            hello = json.loads(payload or b"{}")
+            if not isinstance(hello, dict):
+                raise ValueError("HELLO must be a JSON object")
+            if not isinstance(hello.get("session", ""), str):
+                raise ValueError("session must be a string")
+            if hello.get("rate", RATE) != RATE:
+                protocol.send_json(sock, protocol.ERROR, {"error": f"only {RATE} Hz audio is supported"})
+                return
+
+            session = self._open_session(sock, hello.get("session"))
+            if session is None:
+                protocol.send_json(sock, protocol.ERROR, {"error": "session is already connected"})
+                return
+            session.send_json(protocol.READY, {"session": session.id})
+            while True:
+                kind, payload = protocol.recv_frame(sock)
+                if kind is None:
+                    break
+                if kind == protocol.AUDIO:
+                    if len(payload) % 2:
+                        # Dropped whole, so the following frames stay sample-aligned
+                        session.send_json(protocol.ERROR, {"error": "AUDIO payload must be whole 16-bit samples"})
+                        continue
+                    for utterance in session.feed(pcm16_to_float32(payload)):
+                        self._submit_turn(session, utterance)
+                elif kind == protocol.SYNC:
+                    # Answered in turn order, after every utterance endpointed so far
+                    self._submit_turn(session, None)
+                elif kind == protocol.END:
+                    utterance = session.flush()
+                    if utterance is not None:
+                        self._submit_turn(session, utterance)
+                    session.wait_idle()
+                    break
+                else:
+                    session.send_json(protocol.ERROR, {"error": f"unexpected frame {kind!r}"})
+        except (ValueError, protocol.ProtocolError) as e:
+            # Includes json.JSONDecodeError and undecodable UTF-8 in HELLO
+            logger.warning(f"⚠️ Malformed request from {session.id if session else 'a new client'}: {e}")
+            self.metrics.inc("errors_total", component="protocol")
+            error = {"error": f"malformed request: {e}"}
+            if session is not None:
+                session.send_json(protocol.ERROR, error)  # Under the session's send lock
+            else:
+                try:
+                    protocol.send_json(sock, protocol.ERROR, error)
+                except OSError:
+                    pass
+        except OSError as e:
+            if session is not None:
+                logger.warning(f"⚠️ Session {session.id} dropped: {e}")
+        finally:
+            if session is not None:
+                self._close_session(session)
+
+    def _open_session(self, sock, session_id=None):
+        session_id = session_id or uuid.uuid4().hex[:12]
+        with self.sessions_lock:
+            if session_id in self.sessions:
+                return None
+            # Placeholder so a second connection with the same id is refused while this one loads
+            self.sessions[session_id] = None
+        try:
+            session = Session(session_id, sock, self)
+        except Exception:
+            with self.sessions_lock:
+                del self.sessions[session_id]
+            raise
+        with self.sessions_lock:
+            self.sessions[session_id] = session
+            active = len(self.sessions)
+        logger.info(f"🔌 Session {session_id} opened ({active} active)")
+        return session
+
+    def _close_session(self, session):
+        # Turns still queued are answered on a closed socket and dropped
+        session.wait_idle(timeout=30)
+        session.close()
+        with self.sessions_lock:
+            self.sessions.pop(session.id, None)
+            active = len(self.sessions)
+        logger.info(f"👋 Session {session.id} closed after {session.turn_count} turns ({active} active)")
+
+    # Turns
+
+    def _submit_turn(self, session, utterance):
+        """
+        Queues a turn; each session's turns run one after another on the worker pool.
+        An utterance of None queues the answer to a SYNC frame.
+        """
+        with session.idle:
+            session.turns.append((utterance, time.perf_counter()))
+            if session.busy:
+                return
+            session.busy = True
+        self.executor.submit(self._drain_turns, session)
+
+    def _drain_turns(self, session):
+        while True:
+            with session.idle:
+                if not session.turns:
+                    session.busy = False
+                    session.idle.notify_all()
+                    return
+                utterance, utterance_end = session.turns.popleft()
+            if utterance is None:
+                session.send_json(protocol.SYNC, {"turns": session.turn_count})
+                continue
+            self._run_turn(session, utterance, utterance_end)
+
+    def _run_turn(self, session, audio, utterance_end):
+        """Analyzes one utterance, replies and (with ElevenLabs configured) speaks the reply"""
+        timings = {}
+        try:
+            (emotion, confidence), timings["emotion"] = _timed(self.voice_detector.detect_emotion_from_array, audio,
+                                                               None, session.emotion_state)
+            transcript, timings["transcribe"] = _timed(self.whisper_batcher.transcribe, session.transcriber, audio,
+                                                       self.analysis_timeout)
+
+            score, label = 0.0, "neutral"
+            if transcript:
+                (score, label), timings["sentiment"] = _timed(self.sentiment_batcher.analyze, transcript,
+                                                              self.analysis_timeout)
+
+            # The same decision the live loop makes, on this session's state
+            tone = session.switcher.decide_now(transcript, emotion, label)
+
+            reply, timings["generate"] = _timed(self._reply, session, transcript)
+            timings["critical_path"] = time.perf_counter() - utterance_end
+
+            session.turn_count += 1
+            session.send_json(protocol.RESULT, {
+                "session": session.id,
+                "turn": session.turn_count,
+                "transcript": transcript,
+                "language": session.transcriber.session_language,
+                "voice_emotion": emotion,
+                "voice_confidence": float(confidence),
+                "sentiment_score": float(score),
+                "sentiment_label": label,
+                "tone": tone,
+                "reply": reply,
+                "speech": self.elevenlabs_client is not None,
+                "timings": timings,
+            })
+            if self.elevenlabs_client is not None:
+                _, timings["speak"] = _timed(self._speak, session, reply, tone)
+            self.metrics.record_turn(timings)
+        except FutureTimeoutError:
+            logger.warning(f"⚠️ Session {session.id}: no analysis within {self.analysis_timeout}s")
+            self.metrics.inc("errors_total", component="session")
+            session.send_json(protocol.ERROR, {"error": f"analysis timed out after {self.analysis_timeout}s"})
+        except Exception as e:
+            logger.error(f"Error in session {session.id}: {e}")
+            self.metrics.inc("errors_total", component="session")
+            session.send_json(protocol.ERROR, {"error": str(e)})
+
+    def _reply(self, session, transcript):
+        """Generates the reply from this session's own conversation history"""
+        if not transcript or transcript.strip() == "":
+            return NO_SPEECH_REPLY
+        session.memory.add("user", transcript)
+        try:
+            if self.gemini_client:
+                reply = self.gemini_breaker.call(self.gemini_client.generate, session.memory.build_prompt()).strip()
+            else:
+                # Simulate response if no API key
+                reply = f"This is a simulated response to: '{transcript}'"
+        except CircuitOpenError:
+            return ERROR_REPLY
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            self.metrics.inc("errors_total", component="generate")
+            return ERROR_REPLY
+        session.memory.add("assistant", reply)
+        return reply
+
+    def _speak(self, session, text, tone):
+        """Sends the reply as PCM frames, from the TTS cache when possible, then an empty frame"""
+        key = TTSCache.make_key(text, tone, IntegratedSystem.VOICE_ID, IntegratedSystem.TTS_MODEL,
+                                self.elevenlabs_client.output_format)
+        pcm = self.tts_cache.get(key) if self.tts_cache is not None else None
+        try:
+            if pcm is None:
+                pcm = self.elevenlabs_breaker.call(self.elevenlabs_client.synthesize,
+                                                   IntegratedSystem._format_tts_text(text, tone),
+                                                   IntegratedSystem.VOICE_ID, IntegratedSystem.TTS_MODEL,
+                                                   IntegratedSystem.VOICE_SETTINGS)
+                if self.tts_cache is not None:
+                    self.tts_cache.put(key, pcm)
+            data = memoryview(pcm).cast("B")
+            for start in range(0, len(data), SPEECH_FRAME_BYTES):
+                if not session.send(protocol.SPEECH, data[start:start + SPEECH_FRAME_BYTES]):
+                    return
+        except CircuitOpenError:
+            pass  # Text-only reply while ElevenLabs is down
+        except Exception as e:
+            logger.error(f"Error synthesizing voice: {e}")
+            self.metrics.inc("errors_total", component="synthesize")
+        session.send(protocol.SPEECH)
+
+    def stop(self):
+        """Stops accepting connections and releases the shared models"""
+        self.server.shutdown()
+        self.server.server_close()
+        self.whisper_batcher.stop()
+        self.sentiment_batcher.stop()
+        self.executor.shutdown(wait=False)
+        self.voice_detector.cleanup()
+        self.voice_detector.backend.close()
+        self.text_checker.cleanup()
+        self.registry.release(self.whisper_key)
+        logger.info("🛑 Session server stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many concurrent sessions on one set of models")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="turn worker threads")
+    parser.add_argument("--whisper-model", default="tiny")
+    parser.add_argument("--language", default=None, help="skip language detection, e.g. en")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=20, help="how long a batch waits to fill")
+    parser.add_argument("--emotion-backend", default="rules", choices=["rules", "wav2vec2", "cascade"],
+                        help="voice emotion classifier (cascade: rules, wav2vec2 only when unsure)")
+    parser.add_argument("--analysis-timeout", type=float, default=60,
+                        help="seconds a turn waits for the batched models")
+    parser.add_argument("--no-speech", action="store_true", help="send text results only")
+    parser.add_argument("--stub", action="store_true",
+                        help="use local Gemini/ElevenLabs stub servers instead of the real APIs")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve /metrics and /metrics.json on this port")
+    args = parser.parse_args()
+    setup_logging()
+
+    # Load environment variables from .env file
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        print("⚠️ dotenv package not found. Using environment variables directly.")
+
+    gemini_api_key = os.environ.get("GEMINI_API_KEY")
+    elevenlabs_api_key = os.environ.get("ELEVENLABS_API_KEY")
+    gemini_base_url = None
+    elevenlabs_base_url = None
+    if args.stub:
+        from stub_servers import StubGeminiServer, StubElevenLabsServer
+        gemini_stub = StubGeminiServer().start()
+        elevenlabs_stub = StubElevenLabsServer().start()
+        gemini_api_key, gemini_base_url = "stub", gemini_stub.url
+        elevenlabs_api_key, elevenlabs_base_url = "stub", elevenlabs_stub.url
+        print(f"🧪 Using stub servers: {gemini_base_url}, {elevenlabs_base_url}")
+
+    gemini_client = GeminiClient(gemini_api_key, base_url=gemini_base_url) if gemini_api_key else None
+    elevenlabs_client = None
+    if elevenlabs_api_key and not args.no_speech:
+        elevenlabs_client = ElevenLabsClient(elevenlabs_api_key, base_url=elevenlabs_base_url,
+                                             output_format=IntegratedSystem.TTS_OUTPUT_FORMAT)
+
+    metrics_server = MetricsServer(port=args.metrics_port).start() if args.metrics_port else None
+    if metrics_server is not None:
+        print(f"📈 Metrics at {metrics_server.url}")
+
+    server = SessionServer(args.host, args.port, whisper_model_size=args.whisper_model,
+                           whisper_options={"language": args.language}, gemini_client=gemini_client,
+                           elevenlabs_client=elevenlabs_client, workers=args.workers,
+                           max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+                           emotion_backend=args.emotion_backend, analysis_timeout=args.analysis_timeout)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nExiting...")
+    finally:
+        server.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Local stand-ins for the Gemini and ElevenLabs HTTP APIs so the system can be
+exercised offline. Point GeminiClient/ElevenLabsClient (or
+AsyncIntegratedSystem's base URLs) at `server.url`.
+
+Run both stubs from the command line:
+    python stub_servers.py [--latency 0.2]
+"""
+import json
+import time
+import threading
+import argparse
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _StubServer:
+    """Runs a ThreadingHTTPServer on a background thread"""
+    handler_class = None
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, fail=False):
+        # Simulated behaviour, adjustable while running
+        self.latency = latency
+        self.fail = fail
+        self.requests = 0
+
+        handler = type("Handler", (self.handler_class,), {"stub": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class _StubHandler(BaseHTTPRequestHandler):
+    stub = None
+
+    def log_message(self, format, *args):
+        pass  # Keep test output quiet
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _begin(self):
+        """Common request bookkeeping; returns False if a failure was sent"""
+        self.stub.requests += 1
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+        if self.stub.fail:
+            self._send(500, b'{"error": "stub failure"}', "application/json")
+            return False
+        return True
+
+class _GeminiHandler(_StubHandler):
+    def do_POST(self):
+        body = self._read_json()
+        if not self._begin():
+            return
+        prompt = body["contents"][-1]["parts"][0]["text"]
+        text = self.stub.reply(prompt)
+        if ":streamGenerateContent" not in self.path:
+            self._send(200, json.dumps(_gemini_payload(text)).encode("utf-8"), "application/json")
+            return
+
+        # Stream the reply a few words at a time as server-sent events
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for piece in _word_chunks(text, self.stub.words_per_chunk):
+            self.wfile.write(f"data: {json.dumps(_gemini_payload(piece))}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if self.stub.chunk_delay:
+                time.sleep(self.stub.chunk_delay)
+        self.close_connection = True
+
+def _gemini_payload(text):
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+def _word_chunks(text, words_per_chunk):
+    """Splits text into pieces of a few words, keeping the whitespace"""
+    words = text.split(" ")
+    for start in range(0, len(words), words_per_chunk):
+        piece = " ".join(words[start:start + words_per_chunk])
+        yield piece if start + words_per_chunk >= len(words) else piece + " "
+
+class StubGeminiServer(_StubServer):
+    """Answers generateContent with a short canned reply to the last user line"""
+    handler_class = _GeminiHandler
+
+    # Streaming endpoint behaviour
+    words_per_chunk = 3
+    chunk_delay = 0.05
+
+    def reply(self, prompt):
+        return _canned_reply(prompt)
+
+def _canned_reply(prompt):
+    user_lines = [line for line in prompt.splitlines() if line.startswith("User: ")]
+    last = user_lines[-1][len("User: "):] if user_lines else prompt[-40:]
+    return f"I hear you. You said: {last}. Tell me more about how that feels."
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeStreamingGeminiModel:
+    """
+    In-process stand-in for google.generativeai.GenerativeModel. Pass it as
+    IntegratedSystem(gemini_model=...) to exercise streamed generation offline.
+    """
+    def __init__(self, reply=None, words_per_chunk=3, chunk_delay=0.05):
+        self.reply = reply or _canned_reply
+        self.words_per_chunk = words_per_chunk
+        self.chunk_delay = chunk_delay
+
+    def generate_content(self, prompt, stream=False):
+        text = self.reply(prompt)
+        if not stream:
+            return _FakeResponse(text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        for piece in _word_chunks(text, self.words_per_chunk):
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield _FakeResponse(piece)
+
+class _ElevenLabsHandler(_StubHandler):
+    def do_POST(self):
+        body = self._read_json()
+        if not self._begin():
+            return
+        rate = int(self.path.split("output_format=pcm_")[-1].split("&")[0]) if "pcm_" in self.path else 16000
+        pcm = self.stub.render(body.get("text", ""), rate)
+        if "/stream" not in self.path:
+            self._send(200, pcm, "audio/pcm")
+            return
+
+        # Stream the audio in chunks, like the real /stream endpoint
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/pcm")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunk_size = self.stub.stream_chunk_bytes
+        for start in range(0, len(pcm), chunk_size):
+            self.wfile.write(pcm[start:start + chunk_size])
+            self.wfile.flush()
+            if self.stub.chunk_delay:
+                time.sleep(self.stub.chunk_delay)
+        self.close_connection = True
+
+class StubElevenLabsServer(_StubServer):
+    """Returns a quiet tone as 16-bit PCM, ~60 ms of audio per character"""
+    handler_class = _ElevenLabsHandler
+
+    # Streaming endpoint behaviour: chunk size and the delay between chunks
+    stream_chunk_bytes = 4096
+    chunk_delay = 0.02
+
+    def render(self, text, rate):
+        seconds = min(10.0, 0.06 * max(1, len(text)))
+        t = np.arange(int(seconds * rate)) / rate
+        tone = 0.1 * np.sin(2 * np.pi * 220 * t)
+        return (tone * 32767).astype(np.int16).tobytes()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local Gemini/ElevenLabs stub servers")
+    parser.add_argument("--gemini-port", type=int, default=8701)
+    parser.add_argument("--elevenlabs-port", type=int, default=8702)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+
+    gemini = StubGeminiServer(port=args.gemini_port, latency=args.latency).start()
+    elevenlabs = StubElevenLabsServer(port=args.elevenlabs_port, latency=args.latency).start()
+    print(f"🧪 Gemini stub:     {gemini.url}")
+    print(f"🧪 ElevenLabs stub: {elevenlabs.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        gemini.stop()
+        elevenlabs.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Offline tests for the voice emotion backends. The wav2vec2 model is never
+downloaded: a fake classifier is registered in the model registry under
+"speechbrain" (those tests need torch for the tensors), and the cascade's
+decision logic is also checked against a plain fake heavy backend.
+"""
+import time
+import importlib.util
+import numpy as np
+import pytest
+from model_registry import ModelRegistry
+from metrics import Metrics
+from emotion_backends import (make_backend, RuleBackend, Wav2Vec2Backend, CascadeBackend, CascadeState,
+                              classify_features)
+
+requires_torch = pytest.mark.skipif(importlib.util.find_spec("torch") is None, reason="torch is not installed")
+
+# Mean frame features the rules map to each answer
+SAD = {"energy": 0.0, "zero_crossing": 0.05, "spectral_centroid": 500}         # sad, 0.6 (unsure)
+NEUTRAL = {"energy": 0.0, "zero_crossing": 0.05, "spectral_centroid": 2000}    # neutral, 0.8
+ANGRY = {"energy": 0.1, "zero_crossing": 0.3, "spectral_centroid": 3000}       # angry, 0.7
+
+CLIP = np.zeros(1600, dtype=np.float32)
+
+class FakeClassifier:
+    """Stands in for CustomEncoderWav2vec2Classifier; always answers `label`"""
+    def __init__(self, label="hap", probability=0.9):
+        self.label = label
+        self.probability = probability
+        self.batches = []
+
+    def classify_batch(self, wavs, wav_lens):
+        import torch
+        self.batches.append((tuple(wavs.shape), wav_lens.tolist()))
+        scores = torch.full((wavs.shape[0],), float(np.log(self.probability)))
+        return None, scores, None, [self.label] * wavs.shape[0]
+
+class FakeHeavy:
+    """A heavy backend without torch, for the cascade's decision logic"""
+    name = "wav2vec2"
+
+    def __init__(self, result=("happy", 0.9), delay=0.0):
+        self.result = result
+        self.delay = delay
+        self.clips = []
+
+    def classify_batch(self, clips):
+        time.sleep(self.delay)
+        self.clips.extend(clips)
+        return [self.result] * len(clips)
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def fake_classifier():
+    return FakeClassifier()
+
+@pytest.fixture
+def registry(fake_classifier):
+    registry = ModelRegistry()
+    registry.register("speechbrain", lambda variant: fake_classifier)
+    return registry
+
+@pytest.fixture
+def cascade():
+    backend = CascadeBackend(heavy=FakeHeavy(), min_interval=0.0, max_wait_ms=1, metrics=Metrics())
+    yield backend
+    backend.close()
+
+def test_rules_match_the_feature_thresholds():
+    assert RuleBackend().classify(None, SAD) == classify_features(0.0, 0.05, 500) == ("sad", 0.6)
+    assert RuleBackend().classify(None, NEUTRAL) == ("neutral", 0.8)
+    assert RuleBackend().classify(None, ANGRY) == ("angry", 0.7)
+
+def test_confident_rules_are_not_escalated(cascade):
+    state = CascadeState()
+    assert cascade.classify(CLIP, NEUTRAL, state) == ("neutral", 0.8)
+    assert cascade.classify(CLIP, NEUTRAL, state) == ("neutral", 0.8)
+    assert cascade.heavy.clips == []
+
+def test_unsure_rules_escalate(cascade):
+    assert cascade.classify(CLIP, SAD, CascadeState()) == ("happy", 0.9)
+    assert len(cascade.heavy.clips) == 1
+
+def test_label_change_escalates_even_when_confident(cascade):
+    state = CascadeState()
+    cascade.classify(CLIP, NEUTRAL, state)
+    assert cascade.classify(CLIP, ANGRY, state) == ("happy", 0.9)
+    assert len(cascade.heavy.clips) == 1
+
+def test_model_answer_is_reused_until_the_rules_change(cascade):
+    state = CascadeState()
+    for _ in range(5):
+        assert cascade.classify(CLIP, SAD, state) == ("happy", 0.9)
+    assert len(cascade.heavy.clips) == 1
+
+    # A new segment drops the cached answer and escalates again
+    cascade.classify(CLIP, ANGRY, state)
+    assert len(cascade.heavy.clips) == 2
+
+def test_escalations_are_rate_limited_per_stream():
+    backend = CascadeBackend(heavy=FakeHeavy(), min_interval=60.0, max_wait_ms=1, metrics=Metrics())
+    try:
+        state = CascadeState()
+        backend.classify(CLIP, SAD, state)
+        # Flickering labels inside the interval keep the rules' answers
+        assert backend.classify(CLIP, ANGRY, state) == ("angry", 0.7)
+        assert backend.classify(CLIP, SAD, state) == ("sad", 0.6)
+        assert len(backend.heavy.clips) == 1
+
+        # Another stream has its own history
+        assert backend.classify(CLIP, SAD, CascadeState()) == ("happy", 0.9)
+    finally:
+        backend.close()
+
+def test_streams_without_waiting_pick_up_the_answer_later():
+    backend = CascadeBackend(heavy=FakeHeavy(delay=0.05), min_interval=0.0, max_wait_ms=1, metrics=Metrics())
+    try:
+        state = CascadeState()
+        windows = []
+        window = lambda: windows.append(1) or CLIP
+        assert backend.classify(window, SAD, state, wait=False) == ("sad", 0.6)
+        assert backend.classify(window, SAD, state, wait=False) == ("sad", 0.6)
+        state.pending.result(timeout=5)
+        assert backend.classify(window, SAD, state, wait=False) == ("happy", 0.9)
+        assert len(windows) == 1  # The window was built only for the escalation
+    finally:
+        backend.close()
+
+def test_cascade_needs_a_state(cascade):
+    with pytest.raises(ValueError):
+        cascade.classify(CLIP, SAD)
+
+def test_make_backend_rules():
+    backend = make_backend("rules")
+    assert isinstance(backend, RuleBackend)
+    emotion, confidence = backend.classify(CLIP)
+    assert emotion in ("happy", "neutral", "sad", "angry") and 0 < confidence <= 1
+
+def test_make_backend_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        make_backend("svm")
+
+@requires_torch
+def test_make_backend_wav2vec2_pads_a_batch(registry, fake_classifier):
+    backend = make_backend("wav2vec2", registry)
+    assert isinstance(backend, Wav2Vec2Backend)
+    results = backend.classify_batch([np.zeros(1000, np.float32), np.zeros(500, np.float32)])
+    assert [emotion for emotion, _ in results] == ["happy", "happy"]
+    assert results[0][1] == pytest.approx(0.9)
+    assert fake_classifier.batches == [((2, 1000), [1.0, 0.5])]
+
+    backend.close()
+    assert not registry.is_loaded("speechbrain")
+
+@requires_torch
+def test_make_backend_cascade_escalates_through_the_registry(registry, fake_classifier):
+    backend = make_backend("cascade", registry, max_wait_ms=1, metrics=Metrics())
+    assert isinstance(backend, CascadeBackend)
+    try:
+        state = CascadeState()
+        assert backend.classify(CLIP, NEUTRAL, state) == ("neutral", 0.8)
+        assert not registry.is_loaded("speechbrain")  # Loaded on the first escalation only
+
+        emotion, confidence = backend.classify(CLIP, SAD, state)
+        assert emotion == "happy" and confidence == pytest.approx(0.9)
+        assert len(fake_classifier.batches) == 1
+    finally:
+        backend.close()
+    assert not registry.is_loaded("speechbrain")
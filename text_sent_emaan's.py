@@ -3,9 +3,7 @@ from transformers import pipeline
 # Force use of PyTorch to avoid TensorFlow/Keras issues
 sentiment_pipeline = pipeline("sentiment-analysis", model="distilbert-base-uncased-finetuned-sst-2-english", framework="pt")
 
-def get_sentiment_score(text):
-    result = sentiment_pipeline(text)[0]
-    label = result['label']
+def label_to_score(label):
     if label == "POSITIVE":
         return 1
     elif label == "NEGATIVE":
@@ -13,6 +11,14 @@ def get_sentiment_score(text):
     else:
         return 0
 
+def get_sentiment_score(text):
+    return get_sentiment_scores([text])[0]
+
+def get_sentiment_scores(texts, batch_size=32):
+    # One padded forward pass per batch instead of one per string
+    results = sentiment_pipeline(list(texts), batch_size=batch_size)
+    return [label_to_score(result['label']) for result in results]
+
 # Example usage
 live_transcripts = [
     "I'm really disappointed.",
@@ -22,6 +28,5 @@ live_transcripts = [
     "I'm very happy with the result!"
 ]
 
-for text in live_transcripts:
-    score = get_sentiment_score(text)
+for text, score in zip(live_transcripts, get_sentiment_scores(live_transcripts)):
     print(f"Text: \"{text}\" → Sentiment Score: {score}")
@@ -1,18 +1,30 @@
+import logging
+import re
 import time
-from transformers import pipeline
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from model_registry import get_registry
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
 
 class TextSentimentChecker:
-    def __init__(self):
-        # Force use of PyTorch to avoid TensorFlow/Keras issues
-        print("⏳ Loading sentiment analysis model...")
-        self.sentiment_pipeline = pipeline(
-            "sentiment-analysis", 
-            model="distilbert-base-uncased-finetuned-sst-2-english", 
-            framework="pt"
-        )
-        self.last_check_time = 0
-        self.check_interval = 2  # Check sentiment every 2 seconds
-        print("📝 Text Sentiment Checker initialized")
+    def __init__(self, registry=None, cache_size=512):
+        # The DistilBERT pipeline is shared through the model registry
+        self.registry = registry or get_registry()
+        if not self.registry.is_loaded("sentiment"):
+            logger.info("⏳ Loading sentiment analysis model...")
+        self.sentiment_pipeline = self.registry.acquire("sentiment")
+        
+        # Bounded LRU cache of normalized text -> score
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        logger.info("📝 Text Sentiment Checker initialized")
     
     def get_sentiment_score(self, text):
         """
@@ -21,14 +33,71 @@ class TextSentimentChecker:
         0: Neutral
         +1: Very positive
         """
-        if not text or text.strip() == "":
-            return 0  # Neutral for empty text
-            
-        result = self.sentiment_pipeline(text)[0]
+        return self.get_sentiment_scores([text])[0]
+    
+    def get_sentiment_scores(self, texts, batch_size=None):
+        """
+        Scores a list of texts in one padded forward pass (or one pass per batch_size).
+        Returns a list of scores from -1 to +1, in the same order as `texts`.
+        """
+        scores = [0] * len(texts)  # Neutral for empty text
+        
+        # Serve what we can from the cache; only misses go through the model
+        missing = {}
+        with self.cache_lock:
+            for i, text in enumerate(texts):
+                key = self.normalize_text(text)
+                if not key:
+                    continue
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    scores[i] = self.cache[key]
+                    self.cache_hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+                    self.cache_misses += 1
+        if not missing:
+            return scores
+        
+        # Score the first original text of each distinct missing key
+        keys = list(missing)
+        results = self.sentiment_pipeline([texts[missing[key][0]] for key in keys],
+                                          batch_size=batch_size or len(keys))
+        with self.cache_lock:
+            for key, result in zip(keys, results):
+                score = self._result_to_score(result)
+                for i in missing[key]:
+                    scores[i] = score
+                self.cache[key] = score
+                self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return scores
+    
+    @staticmethod
+    def normalize_text(text):
+        """Cache key for a transcript: lowercased with whitespace collapsed"""
+        if not text:
+            return ""
+        return re.sub(r"\s+", " ", text).strip().lower()
+    
+    def cache_stats(self):
+        """Returns cache hit/miss counters and the current size"""
+        with self.cache_lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "size": len(self.cache),
+                "max_size": self.cache_size,
+                "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            }
+    
+    def _result_to_score(self, result):
+        """Convert a pipeline result to the -1 to +1 scale with confidence weighting"""
         label = result['label']
         score = result['score']  # Confidence score
         
-        # Convert to -1 to +1 scale with confidence weighting
         if label == "POSITIVE":
             return score  # 0.5 to 1.0 range
         elif label == "NEGATIVE":
@@ -36,40 +105,131 @@ class TextSentimentChecker:
         else:
             return 0
     
-    def should_check_sentiment(self):
-        """Returns True if enough time has passed since the last check."""
-        current_time = time.time()
-        if current_time - self.last_check_time >= self.check_interval:
-            self.last_check_time = current_time
-            return True
-        return False
+    def score_to_label(self, score):
+        """Convert a -1 to +1 score to a sentiment label"""
+        if score >= 0.7:
+            return "very_positive"
+        elif score >= 0.3:
+            return "positive"
+        elif score <= -0.7:
+            return "very_negative"
+        elif score <= -0.3:
+            return "negative"
+        return "neutral"
     
     def analyze_transcript(self, transcript):
         """
-        Analyzes the transcript if it's time to check sentiment.
+        Analyzes the transcript (repeated text is served from the cache).
         Returns a tuple of (sentiment_score, sentiment_label)
         """
-        if not self.should_check_sentiment():
-            return None, None
-            
         score = self.get_sentiment_score(transcript)
-        
-        # Convert score to label
-        if score >= 0.7:
-            label = "very_positive"
-        elif score >= 0.3:
-            label = "positive"
-        elif score <= -0.7:
-            label = "very_negative"
-        elif score <= -0.3:
-            label = "negative"
-        else:
-            label = "neutral"
+        return score, self.score_to_label(score)
+    
+    def analyze_transcripts(self, transcripts, batch_size=None):
+        """
+        Batch version of analyze_transcript.
+        Returns a list of (sentiment_score, sentiment_label) tuples.
+        """
+        scores = self.get_sentiment_scores(transcripts, batch_size)
+        return [(score, self.score_to_label(score)) for score in scores]
+    
+    def cleanup(self):
+        """Release the shared sentiment model"""
+        self.registry.release("sentiment")
+
+class SentimentMicroBatcher:
+    """
+    Collects sentiment requests from many threads and scores them together.
+    A batch is run as soon as `max_batch_size` texts are waiting or the oldest
+    has waited `max_wait_ms`, as one padded forward pass through the checker.
+    """
+    def __init__(self, checker, max_batch_size=16, max_wait_ms=10):
+        self.checker = checker
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.requests = queue.Queue()
+        self.running = False
+        self.thread = None
+    
+    def start(self):
+        """Start the batching thread"""
+        if self.running:
+            return self
+        self.running = True
+        self.thread = threading.Thread(target=self._batch_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+    
+    def submit(self, text):
+        """Queue a text for scoring. Returns a Future resolving to (score, label)."""
+        future = Future()
+        self.requests.put((text, future))
+        return future
+    
+    def analyze(self, text, timeout=None):
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(text).result(timeout)
+    
+    def _batch_loop(self):
+        """Thread that gathers requests into batches and scores them"""
+        while self.running:
+            try:
+                first = self.requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if first is None:
+                break
             
-        return score, label
+            # Wait for more requests until the batch is full or the deadline passes
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait_ms / 1000.0
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.running = False
+                    break
+                batch.append(item)
+            
+            texts = [text for text, _ in batch]
+            try:
+                results = self.checker.analyze_transcripts(texts)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"Error in batched sentiment analysis: {e}")
+                get_metrics().inc("errors_total", component="sentiment")
+                for _, future in batch:
+                    future.set_exception(e)
+    
+    def stop(self):
+        """Stop the batching thread; requests still queued fail instead of waiting forever"""
+        if not self.running:
+            return
+        self.running = False
+        self.requests.put(None)
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        error = RuntimeError("Sentiment batcher stopped")
+        while True:
+            try:
+                item = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                _, future = item
+                future.set_exception(error)
 
 # Example usage
 if __name__ == "__main__":
+    from metrics import setup_logging
+    setup_logging()
     checker = TextSentimentChecker()
     
     # Example transcripts to analyze
@@ -81,8 +241,7 @@ if __name__ == "__main__":
         "I'm so grateful for your help today."
     ]
     
-    for transcript in test_transcripts:
-        score, label = checker.analyze_transcript(transcript)
+    # Score all transcripts in one batch
+    for transcript, (score, label) in zip(test_transcripts, checker.analyze_transcripts(test_transcripts)):
         print(f"Text: \"{transcript}\"")
         print(f"Sentiment Score: {score:.2f}, Label: {label}\n")
-        time.sleep(0.5)  # Just for demonstration
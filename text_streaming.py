@@ -0,0 +1,57 @@
+import re
+
+# Sentence end: terminal punctuation, optional closing quotes/brackets, then whitespace
+_BOUNDARY = re.compile(r'[.!?]+["\')\]]*\s+')
+
+# Words whose trailing period does not end a sentence
+_ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "approx", "no"}
+
+class SentenceSplitter:
+    """
+    Incrementally splits streamed text into complete sentences.
+    feed() returns the sentences completed by the new text; flush() returns
+    whatever is left once the stream ends.
+    """
+    def __init__(self, min_chars=12):
+        # Very short fragments ("Hi.") are merged into the next sentence
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        """Adds streamed text and returns a list of newly completed sentences"""
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in _BOUNDARY.finditer(self.buffer):
+            end = match.end()
+            candidate = self.buffer[start:end].strip()
+            if self._is_abbreviation(self.buffer[start:match.start() + 1]) or len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = end
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Returns the remaining text (if any) and resets the splitter"""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return rest
+
+    def _is_abbreviation(self, text):
+        words = text.split()
+        if not words:
+            return False
+        last = words[-1].rstrip(".").lower()
+        # Abbreviations and single initials ("J.") are not sentence ends
+        return last in _ABBREVIATIONS or (len(last) == 1 and last.isalpha() and words[-1].endswith("."))
+
+def split_sentences(chunks, min_chars=12):
+    """Generator turning an iterable of text chunks into complete sentences"""
+    splitter = SentenceSplitter(min_chars)
+    for chunk in chunks:
+        for sentence in splitter.feed(chunk):
+            yield sentence
+    rest = splitter.flush()
+    if rest:
+        yield rest
@@ -1,50 +1,77 @@
+import logging
 import time
 import threading
-import queue
 import os
 from voice_emotion_detector import VoiceEmotionDetector
 from text_sentiment_checker import TextSentimentChecker
+from metrics import get_metrics
+from bounded_queue import BoundedQueue, KEEP_LATEST
+
+logger = logging.getLogger(__name__)
+
+# Mapping of emotions/sentiments to TTS styles (module level so tools such as
+# the TTS cache pre-warmer can enumerate tones without starting a switcher)
+TONE_MAPPING = {
+    # Voice emotion based mappings
+    "angry": {"style": "calm", "rate": "slow", "pitch": "low"},
+    "sad": {"style": "gentle", "rate": "medium", "pitch": "medium"},
+    "happy": {"style": "cheerful", "rate": "medium", "pitch": "high"},
+    "neutral": {"style": "neutral", "rate": "medium", "pitch": "medium"},
+    
+    # Text sentiment based mappings
+    "very_negative": {"style": "calm", "rate": "slow", "pitch": "low"},
+    "negative": {"style": "gentle", "rate": "medium-slow", "pitch": "medium-low"},
+    "positive": {"style": "friendly", "rate": "medium", "pitch": "medium-high"},
+    "very_positive": {"style": "cheerful", "rate": "medium-fast", "pitch": "high"},
+}
 
 class ToneSwitcher:
-    def __init__(self):
-        # Initialize components
-        self.voice_detector = VoiceEmotionDetector()
-        self.text_checker = TextSentimentChecker()
+    def __init__(self, voice_detector=None, text_checker=None, emotion_queue_policy=KEEP_LATEST,
+                 emotion_queue_size=None):
+        # Reuse the caller's components when given, otherwise create our own
+        self._owns_voice_detector = voice_detector is None
+        self._owns_text_checker = text_checker is None
+        self.voice_detector = voice_detector or VoiceEmotionDetector()
+        self.text_checker = text_checker or TextSentimentChecker()
         
-        # Queues for communication between threads
-        self.transcript_queue = queue.Queue()
-        self.voice_emotion_queue = queue.Queue()
-        self.tone_queue = queue.Queue()
+        # Voice emotions reach the decision thread through a bounded queue; only the
+        # newest matters. Tone changes go to subscribers (see subscribe()).
+        # emotion_queue_size only applies to the drop policies (keep_latest holds one item; default 8).
+        self.voice_emotion_queue = BoundedQueue(emotion_queue_size or 8, emotion_queue_policy,
+                                                name="voice_emotion_queue")
         
         # Current state
-        self.current_tone = "neutral"
         self.current_voice_emotion = "neutral"
         self.current_text_sentiment = "neutral"
         self.current_transcript = ""
+        self.scored_transcript = ""  # Last transcript whose sentiment was scored
+        self.running = False
+        self.stopped = threading.Event()  # Ends the voice emotion stream on cleanup
+        
+        # The decision thread waits on this until an input changes
+        self.state_changed = threading.Condition()
+        self._inputs_changed = False
+        self.subscribers = []
+        
+        # Decisions run one at a time, from the decision thread or decide_now()
+        self.decision_lock = threading.Lock()
         
         # Weights for decision making
         self.voice_emotion_weight = 0.7  # Voice emotion has higher priority
         self.text_sentiment_weight = 0.3
         
         # Mapping of emotions/sentiments to TTS styles
-        self.tone_mapping = {
-            # Voice emotion based mappings
-            "angry": {"style": "calm", "rate": "slow", "pitch": "low"},
-            "sad": {"style": "gentle", "rate": "medium", "pitch": "medium"},
-            "happy": {"style": "cheerful", "rate": "medium", "pitch": "high"},
-            "neutral": {"style": "neutral", "rate": "medium", "pitch": "medium"},
-            
-            # Text sentiment based mappings
-            "very_negative": {"style": "calm", "rate": "slow", "pitch": "low"},
-            "negative": {"style": "gentle", "rate": "medium-slow", "pitch": "medium-low"},
-            "positive": {"style": "friendly", "rate": "medium", "pitch": "medium-high"},
-            "very_positive": {"style": "cheerful", "rate": "medium-fast", "pitch": "high"},
-        }
+        self.tone_mapping = dict(TONE_MAPPING)
         
-        print("🎭 Tone Switcher initialized")
+        self.current_tone = self.tone_mapping["neutral"]
+        
+        logger.info("🎭 Tone Switcher initialized")
     
     def start(self):
         """Start all the processing threads"""
+        self.running = True
+        self.stopped.clear()
+        
         # Start voice emotion detection thread
         self.voice_thread = threading.Thread(target=self._voice_emotion_loop)
         self.voice_thread.daemon = True
@@ -55,50 +82,112 @@ class ToneSwitcher:
         self.tone_thread.daemon = True
         self.tone_thread.start()
         
-        print("🟢 Tone Switcher running - press Ctrl+C to stop")
+        logger.info("🟢 Tone Switcher running - press Ctrl+C to stop")
     
     def _voice_emotion_loop(self):
-        """Thread that continuously detects voice emotion"""
-        while True:
+        """Thread that continuously tracks voice emotion over a sliding window"""
+        while self.running:
             try:
-                emotion, confidence = self.voice_detector.detect_emotion()
-                self.voice_emotion_queue.put((emotion, confidence))
-                time.sleep(0.1)  # Small delay to prevent CPU overuse
+                # The window updates every audio chunk; only changes are queued
+                last_emotion = None
+                for emotion, confidence in self.voice_detector.stream_emotions(stop=self.stopped):
+                    if emotion != last_emotion:
+                        self.update_voice_emotion(emotion, confidence)
+                        last_emotion = emotion
+                self.stopped.wait(1)  # Capture stopped; retry unless we are shutting down
             except Exception as e:
-                print(f"Error in voice emotion detection: {e}")
-                time.sleep(1)  # Longer delay on error
+                logger.error(f"Error in voice emotion detection: {e}")
+                get_metrics().inc("errors_total", component="voice_emotion")
+                self.stopped.wait(1)  # Longer delay on error
     
     def _tone_decision_loop(self):
-        """Thread that makes tone decisions based on inputs"""
-        while True:
+        """Thread that re-decides the tone as soon as a new input arrives (no polling)"""
+        while self.running:
             try:
-                # Process voice emotion
-                try:
-                    emotion, confidence = self.voice_emotion_queue.get(block=False)
-                    self.current_voice_emotion = emotion
-                    print(f"Voice emotion: {emotion} (confidence: {confidence:.2f})")
-                except queue.Empty:
-                    pass
-                
-                # Process text sentiment if we have a transcript
-                if self.current_transcript:
-                    score, label = self.text_checker.analyze_transcript(self.current_transcript)
-                    if score is not None and label is not None:
-                        self.current_text_sentiment = label
-                        print(f"Text sentiment: {label} (score: {score:.2f})")
-                
-                # Make tone decision
-                new_tone = self._decide_tone()
-                if new_tone != self.current_tone:
-                    self.current_tone = new_tone
-                    self.tone_queue.put(new_tone)
-                    print(f"🔄 Tone switched to: {new_tone['style']} (rate: {new_tone['rate']}, pitch: {new_tone['pitch']})")
+                # Sleep until an input changes
+                with self.state_changed:
+                    self.state_changed.wait_for(lambda: self._inputs_changed or not self.running)
+                    self._inputs_changed = False
+                if not self.running:
+                    break
                 
-                time.sleep(0.5)  # Check for tone changes every 0.5 seconds
+                # Timed into stage_seconds; failures count into errors_total
+                with get_metrics().span("tone_decision"), self.decision_lock:
+                    self._decide_and_publish()
             except Exception as e:
-                print(f"Error in tone decision: {e}")
+                logger.error(f"Error in tone decision: {e}")
                 time.sleep(1)
     
+    def _decide_and_publish(self, voice_emotion=None, text_sentiment=None):
+        """
+        Applies pending inputs, re-decides the tone and notifies subscribers on a change.
+        A given voice emotion / text sentiment replaces the pending reading (caller holds decision_lock).
+        Returns the current tone.
+        """
+        # Only the latest voice emotion matters; older readings are stale
+        latest = self.voice_emotion_queue.get_latest()
+        if latest is not None:
+            emotion, confidence = latest
+            self.current_voice_emotion = emotion
+            logger.info(f"Voice emotion: {emotion} (confidence: {confidence:.2f})")
+        if voice_emotion is not None:
+            self.current_voice_emotion = voice_emotion
+        
+        # Score text sentiment only when the transcript changed and the caller has no score
+        transcript = self.current_transcript
+        if text_sentiment is not None:
+            self.scored_transcript = transcript
+            self.current_text_sentiment = text_sentiment
+        elif transcript and transcript != self.scored_transcript:
+            self.scored_transcript = transcript
+            score, label = self.text_checker.analyze_transcript(transcript)
+            if score is not None and label is not None:
+                self.current_text_sentiment = label
+                logger.info(f"Text sentiment: {label} (score: {score:.2f})")
+        
+        # Make tone decision
+        new_tone = self._decide_tone()
+        if new_tone == self.current_tone:
+            return new_tone
+        self.current_tone = new_tone
+        logger.info(f"🔄 Tone switched to: {new_tone['style']} (rate: {new_tone['rate']}, pitch: {new_tone['pitch']})")
+        
+        # Subscribers are notified synchronously, in the order they subscribed
+        for callback in list(self.subscribers):
+            try:
+                callback(new_tone)
+            except Exception as e:
+                logger.error(f"Error in tone subscriber: {e}")
+                get_metrics().inc("errors_total", component="tone_subscriber")
+        return new_tone
+    
+    def decide_now(self, transcript=None, voice_emotion=None, text_sentiment=None):
+        """
+        Decides the tone on the calling thread and returns it, so a reply is spoken
+        with the tone of its own transcript rather than the previous one.
+        Inputs the caller already has (this utterance's voice emotion, the transcript's
+        sentiment label) are used as given; subscribers are notified on a change.
+        """
+        with get_metrics().span("tone_decision"), self.decision_lock:
+            if transcript is not None:
+                self.current_transcript = transcript
+            return self._decide_and_publish(voice_emotion, text_sentiment)
+    
+    def _notify_inputs_changed(self):
+        """Wake the decision thread"""
+        with self.state_changed:
+            self._inputs_changed = True
+            self.state_changed.notify()
+    
+    def subscribe(self, callback):
+        """Register callback(tone) to be called whenever the tone changes"""
+        self.subscribers.append(callback)
+    
+    def unsubscribe(self, callback):
+        """Remove a callback registered with subscribe()"""
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+    
     def _decide_tone(self):
         """
         Decide which tone to use based on voice emotion and text sentiment
@@ -127,9 +216,21 @@ class ToneSwitcher:
         else:
             return self.tone_mapping["neutral"]
     
+    def update_audio(self, audio, sr=None):
+        """Detect voice emotion from a float32 audio buffer and queue the result"""
+        emotion, confidence = self.voice_detector.detect_emotion_from_array(audio, sr)
+        self.update_voice_emotion(emotion, confidence)
+        return emotion, confidence
+    
+    def update_voice_emotion(self, emotion, confidence):
+        """Queue a voice emotion reading and trigger an immediate tone decision"""
+        self.voice_emotion_queue.put((emotion, confidence))
+        self._notify_inputs_changed()
+    
     def update_transcript(self, transcript):
-        """Update the current transcript"""
+        """Update the current transcript and trigger an immediate tone decision"""
         self.current_transcript = transcript
+        self._notify_inputs_changed()
     
     def get_current_tone(self):
         """Get the current tone settings"""
@@ -157,14 +258,25 @@ class ToneSwitcher:
     
     def cleanup(self):
         """Clean up resources"""
-        self.voice_detector.cleanup()
-        print("🛑 Tone Switcher stopped")
+        self.running = False
+        self.stopped.set()
+        with self.state_changed:
+            self.state_changed.notify_all()
+        if self._owns_voice_detector:
+            self.voice_detector.cleanup()
+        if self._owns_text_checker:
+            self.text_checker.cleanup()
+        logger.info("🛑 Tone Switcher stopped")
 
 # Example usage with SSML output for TTS
 if __name__ == "__main__":
     import whisper
     import pyaudio
-    import wave
+    import numpy as np
+    from audio_utils import pcm16_to_float32
+    from metrics import setup_logging
+    
+    setup_logging()
     
     # Setup for audio recording
     RATE = 16000
@@ -172,7 +284,6 @@ if __name__ == "__main__":
     CHANNELS = 1
     FORMAT = pyaudio.paInt16
     RECORD_SECONDS = 2
-    TEMP_WAV = "temp_audio.wav"
     
     # Load Whisper model for transcription
     print("⏳ Loading Whisper model...")
@@ -182,31 +293,27 @@ if __name__ == "__main__":
     tone_switcher = ToneSwitcher()
     tone_switcher.start()
     
-    def record_audio(filename):
-        """Records audio and saves to a WAV file"""
+    def record_audio():
+        """Records audio and returns it as a float32 NumPy buffer"""
         audio = pyaudio.PyAudio()
         stream = audio.open(format=FORMAT, channels=CHANNELS, rate=RATE,
                             input=True, frames_per_buffer=CHUNK)
         
         print("🎙️ Listening...")
-        frames = []
-        for _ in range(0, int(RATE / CHUNK * RECORD_SECONDS)):
+        num_chunks = int(RATE / CHUNK * RECORD_SECONDS)
+        samples = np.empty(num_chunks * CHUNK, dtype=np.float32)
+        for i in range(num_chunks):
             data = stream.read(CHUNK)
-            frames.append(data)
+            pcm16_to_float32(data, out=samples[i * CHUNK:(i + 1) * CHUNK])
         
         stream.stop_stream()
         stream.close()
         audio.terminate()
-
-        with wave.open(filename, 'wb') as wf:
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(audio.get_sample_size(FORMAT))
-            wf.setframerate(RATE)
-            wf.writeframes(b''.join(frames))
+        return samples
     
-    def transcribe_audio(filename):
+    def transcribe_audio(samples):
         """Transcribes audio using Whisper"""
-        result = whisper_model.transcribe(filename)
+        result = whisper_model.transcribe(samples, fp16=False)
         return result["text"]
     
     try:
@@ -215,8 +322,8 @@ if __name__ == "__main__":
         
         while True:
             # Record and transcribe audio
-            record_audio(TEMP_WAV)
-            transcript = transcribe_audio(TEMP_WAV).strip()
+            samples = record_audio()
+            transcript = transcribe_audio(samples).strip()
             
             if not transcript:
                 print("⚠️  No speech detected.\n")
@@ -240,5 +347,3 @@ if __name__ == "__main__":
         print("\nStopping Feel-Aware Tone Switcher")
     finally:
         tone_switcher.cleanup()
-        if os.path.exists(TEMP_WAV):
-            os.remove(TEMP_WAV)
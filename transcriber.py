@@ -0,0 +1,325 @@
+import logging
+import time
+import queue
+import threading
+import numpy as np
+from concurrent.futures import Future
+from model_registry import get_registry
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Same fallback schedule as whisper.transcribe()
+DEFAULT_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+class WhisperTranscriber:
+    """
+    Whisper transcription with per-session language pinning.
+
+    Each clip is run through the encoder once. Language detection and every
+    decoding attempt (beam search first, then sampling at rising temperatures
+    when the output looks degenerate) reuse the same audio features. The
+    language is detected on the first utterance and pinned for the rest of the
+    session, unless `language` is given up front.
+
+    stream() follows the microphone with a VoiceActivityEndpointer and yields
+    partial transcripts while the user is still speaking, then a final one.
+    """
+    def __init__(self, model_size="tiny", registry=None, language=None, beam_size=5, best_of=5,
+                 temperatures=DEFAULT_TEMPERATURES, compression_ratio_threshold=2.4,
+                 logprob_threshold=-1.0, no_speech_threshold=0.6, fp16=False):
+        self.registry = registry or get_registry()
+        self.model_key = f"whisper:{model_size}"
+        self.model = self.registry.acquire(self.model_key)
+
+        # Decoding options
+        self.beam_size = beam_size
+        self.best_of = best_of
+        self.temperatures = tuple(temperatures)
+        self.compression_ratio_threshold = compression_ratio_threshold
+        self.logprob_threshold = logprob_threshold
+        self.no_speech_threshold = no_speech_threshold
+        self.fp16 = fp16
+
+        # English-only models never need detection
+        self.pinned_language = language
+        if language is None and not self.model.is_multilingual:
+            self.pinned_language = "en"
+        self.session_language = self.pinned_language
+
+    def reset_session(self):
+        """Forgets the detected language (a language given up front stays pinned)"""
+        self.session_language = self.pinned_language
+
+    def encode(self, audio):
+        """Runs the encoder once on a float32 clip at 16 kHz (padded/trimmed to Whisper's 30 s window)"""
+        return self.encode_batch([audio])
+
+    def encode_batch(self, clips):
+        """Encodes several clips in one forward pass. Returns features with one row per clip."""
+        import whisper
+        import torch
+
+        mels = [whisper.log_mel_spectrogram(whisper.pad_or_trim(np.asarray(audio, dtype=np.float32)),
+                                            self.model.dims.n_mels) for audio in clips]
+        mel = torch.stack(mels).to(self.model.device)
+        if self.fp16:
+            mel = mel.half()
+        with torch.no_grad():
+            return self.model.embed_audio(mel)
+
+    def _language(self, features):
+        """The session language, detected from `features` the first time"""
+        if self.session_language is None:
+            import whisper
+            _, probs = whisper.detect_language(self.model, features)
+            self.pin_language(max(probs[0], key=probs[0].get))
+        return self.session_language
+
+    def pin_language(self, language):
+        """Pins the language detected for this session"""
+        self.session_language = language
+        logger.info(f"🌐 Detected language: {language} (pinned for this session)")
+
+    def decoding_options(self, temperature, partial=False):
+        """DecodingOptions for one attempt in the session language"""
+        import whisper
+        return whisper.DecodingOptions(
+            language=self.session_language,
+            temperature=temperature,
+            beam_size=self.beam_size if temperature == 0 and not partial else None,
+            best_of=self.best_of if temperature > 0 else None,
+            fp16=self.fp16
+        )
+
+    def transcribe(self, audio, partial=False, features=None, first_result=None):
+        """
+        Transcribes a clip and returns the text ("" for silence).
+        Partial transcripts use a single greedy pass, with no beam search and no fallback.
+        `features` are the clip's encoder output when it was already encoded in a batch,
+        and `first_result` its decoding at the first temperature if that was batched too.
+        """
+        import whisper
+
+        if not partial and len(audio) > whisper.audio.N_SAMPLES:
+            return self._transcribe_long(audio)
+
+        if features is None:
+            features = self.encode(audio)
+        self._language(features)
+        temperatures = self.temperatures[:1] if partial else self.temperatures
+
+        result = None
+        for temperature in temperatures:
+            if first_result is not None:
+                result, first_result = first_result, None
+            else:
+                result = whisper.decode(self.model, features, self.decoding_options(temperature, partial))[0]
+
+            # Likely silence: skip it rather than hallucinate
+            if (result.no_speech_prob > self.no_speech_threshold
+                    and result.avg_logprob < self.logprob_threshold):
+                return ""
+
+            # Retry at the next temperature only if the output looks degenerate
+            if (result.compression_ratio <= self.compression_ratio_threshold
+                    and result.avg_logprob >= self.logprob_threshold):
+                break
+
+        return result.text.strip()
+
+    def _transcribe_long(self, audio):
+        """Recordings over 30 s go through Whisper's own seek loop with the same options"""
+        result = self.model.transcribe(
+            np.asarray(audio, dtype=np.float32),
+            language=self.session_language,
+            temperature=self.temperatures,
+            beam_size=self.beam_size,
+            best_of=self.best_of,
+            compression_ratio_threshold=self.compression_ratio_threshold,
+            logprob_threshold=self.logprob_threshold,
+            no_speech_threshold=self.no_speech_threshold,
+            fp16=self.fp16,
+            verbose=None
+        )
+        if self.session_language is None:
+            self.pin_language(result["language"])
+        return result["text"].strip()
+
+    def stream(self, capture, endpointer, partial_interval=1.0, max_wait_seconds=None, gate=None):
+        """
+        Transcribes the next utterance on a MicrophoneCapture while it is spoken.
+        Yields (text, is_final, audio) roughly every `partial_interval` seconds of
+        speech, and once more with is_final=True when the speaker stops. `audio` is
+        the utterance so far, a zero-copy view into the capture. `gate` is passed
+        to the endpointer (see VoiceActivityEndpointer.follow_utterance).
+        """
+        step = int(partial_interval * endpointer.RATE)
+        decoded = 0
+        for event, utterance in endpointer.follow_utterance(capture, max_wait_seconds, gate):
+            if event == "speech_end":
+                yield self.transcribe(utterance), True, utterance
+                return
+            if len(utterance) - decoded >= step:
+                decoded = len(utterance)
+                yield self.transcribe(utterance, partial=True), False, utterance
+
+    def close(self):
+        """Releases the model back to the registry"""
+        if self.model is not None:
+            self.registry.release(self.model_key)
+            self.model = None
+
+class WhisperMicroBatcher:
+    """
+    Collects transcription requests from many sessions and runs Whisper over
+    them together. A batch is run as soon as `max_batch_size` clips are
+    waiting or the oldest has waited `max_wait_ms`. The encoder, language
+    detection for new sessions and the first decoding pass each run once per
+    batch; clips are decoded together when their sessions share a language
+    and decoding options, so each session keeps its own pinned language. Only
+    clips whose first pass looks degenerate fall back to per-clip decoding at
+    higher temperatures.
+    """
+    def __init__(self, max_batch_size=8, max_wait_ms=20):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.requests = queue.Queue()
+        self.running = False
+        self.thread = None
+        self.batches = 0
+        self.clips = 0
+
+    def start(self):
+        """Start the batching thread"""
+        if self.running:
+            return self
+        self.running = True
+        self.thread = threading.Thread(target=self._batch_loop)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def submit(self, transcriber, audio):
+        """Queue a clip for `transcriber`. Returns a Future resolving to the text."""
+        future = Future()
+        self.requests.put((transcriber, audio, future))
+        return future
+
+    def transcribe(self, transcriber, audio, timeout=None):
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(transcriber, audio).result(timeout)
+
+    def _batch_loop(self):
+        """Thread that gathers requests into batches and transcribes them"""
+        while self.running:
+            try:
+                first = self.requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if first is None:
+                break
+
+            # Wait for more requests until the batch is full or the deadline passes
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait_ms / 1000.0
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.running = False
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        """Encodes and first-pass decodes the clips of each shared model together, then finishes each clip"""
+        import whisper
+
+        self.batches += 1
+        self.clips += len(batch)
+
+        # Clips over 30 s go through Whisper's own seek loop instead
+        groups = {}
+        for item in batch:
+            transcriber, audio, _ = item
+            key = id(transcriber.model) if len(audio) <= whisper.audio.N_SAMPLES else None
+            groups.setdefault(key, []).append(item)
+
+        for key, items in groups.items():
+            try:
+                features = None
+                if key is not None:
+                    features = items[0][0].encode_batch([audio for _, audio, _ in items])
+            except Exception as e:
+                logger.error(f"Error in batched transcription: {e}")
+                get_metrics().inc("errors_total", component="transcribe")
+                for _, _, future in items:
+                    future.set_exception(e)
+                continue
+
+            first_results = [None] * len(items)
+            if features is not None:
+                try:
+                    first_results = self._first_pass(items, features)
+                except Exception as e:
+                    logger.warning(f"⚠️ Batched decoding failed, decoding clip by clip: {e}")
+
+            for i, (transcriber, audio, future) in enumerate(items):
+                try:
+                    clip_features = features[i:i + 1] if features is not None else None
+                    future.set_result(transcriber.transcribe(audio, features=clip_features,
+                                                             first_result=first_results[i]))
+                except Exception as e:
+                    logger.error(f"Error in batched transcription: {e}")
+                    get_metrics().inc("errors_total", component="transcribe")
+                    future.set_exception(e)
+
+    def _first_pass(self, items, features):
+        """
+        Detects the language of sessions that have none yet, then decodes every
+        clip at its first temperature, one batched decode per language and
+        option set. Returns one DecodingResult per item.
+        """
+        import whisper
+
+        model = items[0][0].model
+        undetected = [i for i, (transcriber, _, _) in enumerate(items) if transcriber.session_language is None]
+        if undetected:
+            _, probs = whisper.detect_language(model, features[undetected])
+            for i, clip_probs in zip(undetected, probs):
+                items[i][0].pin_language(max(clip_probs, key=clip_probs.get))
+
+        # DecodingOptions is a frozen dataclass, so equal options group together
+        groups = {}
+        for i, (transcriber, _, _) in enumerate(items):
+            groups.setdefault(transcriber.decoding_options(transcriber.temperatures[0]), []).append(i)
+
+        results = [None] * len(items)
+        for options, indices in groups.items():
+            for i, result in zip(indices, whisper.decode(model, features[indices], options)):
+                results[i] = result
+        return results
+
+    def stop(self):
+        """Stop the batching thread; requests still queued fail instead of waiting forever"""
+        if not self.running:
+            return
+        self.running = False
+        self.requests.put(None)
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        error = RuntimeError("Whisper batcher stopped")
+        while True:
+            try:
+                item = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                _, _, future = item
+                future.set_exception(error)
@@ -0,0 +1,246 @@
+"""
+Content-addressed cache of synthesized speech.
+
+Each entry is raw 16-bit PCM stored under the SHA-256 of (text, tone
+style/rate/pitch, voice, model, output format). The directory is capped in
+size and the least recently used entries are evicted first. Hits are
+memory-mapped, so playback reads straight from the page cache without copying.
+
+Fill the cache for known phrases (fallback replies and anything in a phrases
+file, in every tone) from the command line:
+    python tts_cache.py --prewarm [--phrases phrases.txt]
+    python tts_cache.py --stats
+"""
+import os
+import json
+import hashlib
+import threading
+import argparse
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache")
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+class TTSCache:
+    """Size-capped on-disk LRU of synthesized PCM, safe to share between threads"""
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+        # key -> size in bytes, least recently used first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_served = 0
+
+        self._scan()
+
+    def _scan(self):
+        """Rebuilds the LRU order from file modification times, so it survives restarts"""
+        found = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pcm"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            found.append((stat.st_mtime, name[:-len(".pcm")], stat.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def make_key(text, tone, voice_id, model_id, output_format):
+        """Content address for one synthesized phrase"""
+        identity = [text, tone["style"], tone["rate"], tone["pitch"], voice_id, model_id, output_format]
+        return hashlib.sha256(json.dumps(identity).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pcm")
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def get(self, key):
+        """Returns the cached PCM as a read-only int16 memmap, or None on a miss"""
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+        path = self._path(key)
+        try:
+            os.utime(path)  # Keeps the recency order across restarts
+            pcm = np.memmap(path, dtype=np.int16, mode="r")
+        except (OSError, ValueError):
+            # The file was removed or truncated outside the cache
+            with self.lock:
+                self.total_bytes -= self.entries.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+
+        self.bytes_served += pcm.nbytes
+        return pcm
+
+    def put(self, key, pcm):
+        """Stores PCM bytes under `key`, evicting old entries past max_bytes. Returns True if stored."""
+        data = bytes(pcm)
+        if not data or len(data) > self.max_bytes:
+            return False
+
+        # Write then rename, so readers never map a partial file
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self.total_bytes += len(data)
+            evicted = []
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                self.evictions += 1
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+        return True
+
+    @staticmethod
+    def chunks(pcm, chunk_bytes=4096):
+        """Yields zero-copy byte views of a cached entry for StreamingPlayer.play()"""
+        view = memoryview(pcm).cast("B")
+        for start in range(0, len(view), chunk_bytes):
+            yield view[start:start + chunk_bytes]
+
+    def stats(self):
+        """Returns hit/miss counts, hit rate and size as a dict"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes_served": self.bytes_served,
+            }
+
+    def summary(self):
+        """One line describing stats()"""
+        stats = self.stats()
+        return (f"🗃️ TTS cache: {stats['entries']} entries, {stats['bytes'] / 2**20:.1f}/{stats['max_bytes'] / 2**20:.0f} MB, "
+                f"hit rate {stats['hit_rate']:.0%} ({stats['hits']} hits, {stats['misses']} misses), "
+                f"{stats['evictions']} evictions")
+
+    def print_stats(self):
+        print(self.summary())
+
+    def clear(self):
+        """Removes every entry"""
+        with self.lock:
+            keys = list(self.entries)
+            self.entries.clear()
+            self.total_bytes = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+def prewarm(cache, client, phrases, tones, voice_id, model_id, voice_settings, format_text):
+    """
+    Synthesizes every phrase in every tone that is not cached yet.
+    `format_text(text, tone)` builds the text actually sent to ElevenLabs.
+    Returns the number of entries added.
+    """
+    added = 0
+    for phrase in phrases:
+        for tone in tones:
+            key = TTSCache.make_key(phrase, tone, voice_id, model_id, client.output_format)
+            if key in cache:
+                continue
+            try:
+                pcm = client.synthesize(format_text(phrase, tone), voice_id, model_id, voice_settings)
+            except Exception as e:
+                print(f"ElevenLabs API error for '{phrase}': {str(e)}")
+                continue
+            if cache.put(key, pcm):
+                added += 1
+                print(f"✅ Cached ({tone['style']}, {tone['rate']}, {tone['pitch']}): '{phrase}'")
+    return added
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the synthesized speech cache")
+    parser.add_argument("--prewarm", action="store_true", help="synthesize known phrases in every tone")
+    parser.add_argument("--phrases", help="file with one extra phrase per line")
+    parser.add_argument("--stats", action="store_true", help="print cache size and entry count")
+    parser.add_argument("--clear", action="store_true", help="remove every cached entry")
+    parser.add_argument("--dir", default=DEFAULT_CACHE_DIR, help="cache directory")
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024))
+    parser.add_argument("--elevenlabs-base-url", help="e.g. a stub_servers.py URL")
+    args = parser.parse_args()
+
+    cache = TTSCache(args.dir, int(args.max_mb * 1024 * 1024))
+    if args.clear:
+        cache.clear()
+        print("🧹 TTS cache cleared")
+
+    if args.prewarm:
+        # Load environment variables from .env file
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+        except ImportError:
+            print("⚠️ dotenv package not found. Using environment variables directly.")
+
+        from integrated_system import IntegratedSystem, NO_SPEECH_REPLY, ERROR_REPLY
+        from tone_switcher import TONE_MAPPING
+        from remote_clients import ElevenLabsClient
+
+        api_key = os.environ.get("ELEVENLABS_API_KEY") or ("stub" if args.elevenlabs_base_url else None)
+        if not api_key:
+            print("❌ ELEVENLABS_API_KEY is required to pre-warm the cache")
+            return
+        client = ElevenLabsClient(api_key, base_url=args.elevenlabs_base_url,
+                                  output_format=IntegratedSystem.TTS_OUTPUT_FORMAT)
+
+        phrases = [NO_SPEECH_REPLY, ERROR_REPLY]
+        if args.phrases:
+            with open(args.phrases, encoding="utf-8") as f:
+                phrases += [line.strip() for line in f if line.strip()]
+
+        # Each distinct tone once, in a stable order
+        tones = list({json.dumps(tone, sort_keys=True): tone for tone in TONE_MAPPING.values()}.values())
+
+        added = prewarm(cache, client, phrases, tones, IntegratedSystem.VOICE_ID, IntegratedSystem.TTS_MODEL,
+                        IntegratedSystem.VOICE_SETTINGS, IntegratedSystem._format_tts_text)
+        print(f"🔥 Pre-warmed {added} new entries ({len(phrases)} phrases x {len(tones)} tones)")
+
+    if args.stats or args.prewarm:
+        cache.print_stats()
+
+if __name__ == "__main__":
+    main()
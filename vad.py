@@ -0,0 +1,149 @@
+import logging
+from audio_utils import rms, zero_crossing_rate
+
+logger = logging.getLogger(__name__)
+
+class VoiceActivityEndpointer:
+    """
+    Streaming voice-activity endpointer built on the same RMS energy and
+    zero-crossing features the voice emotion detector uses.
+
+    Feed it one chunk at a time with process_chunk(). Speech starts after
+    `start_chunks` consecutive voiced chunks and ends once `hangover_seconds`
+    of silence follow it. `pre_roll_seconds` of audio before the onset is
+    kept so soft word beginnings are not clipped.
+    """
+    def __init__(self, rate=16000, chunk=1024, energy_threshold=0.01, max_zcr=0.35,
+                 noise_multiplier=3.0, start_chunks=2, hangover_seconds=0.6,
+                 pre_roll_seconds=0.3, max_utterance_seconds=15):
+        self.RATE = rate
+        self.CHUNK = chunk
+
+        # Speech detection thresholds
+        self.energy_threshold = energy_threshold  # Minimum RMS for speech
+        self.max_zcr = max_zcr                    # Hiss/noise has a very high ZCR
+        self.noise_multiplier = noise_multiplier  # Speech must be this much above the noise floor
+
+        # Endpointing settings
+        self.start_chunks = start_chunks
+        self.hangover_seconds = hangover_seconds
+        self.pre_roll_seconds = pre_roll_seconds
+        self.max_utterance_seconds = max_utterance_seconds
+
+        self.noise_floor = None
+        self.reset()
+
+    def reset(self):
+        """Prepare for a new utterance (the learned noise floor is kept)"""
+        self.samples_seen = 0
+        self.in_speech = False
+        self.speech_start = None   # Sample offset of the onset, including pre-roll
+        self.speech_end = None     # Sample offset just past the last voiced chunk
+        self._voiced_run = 0
+        self._silent_samples = 0
+
+    def is_speech(self, chunk):
+        """Classifies a single chunk as speech or not, updating the noise floor on silence"""
+        energy = rms(chunk)
+        threshold = self.energy_threshold
+        if self.noise_floor is not None:
+            threshold = max(threshold, self.noise_floor * self.noise_multiplier)
+
+        voiced = energy >= threshold and zero_crossing_rate(chunk) <= self.max_zcr
+
+        if not voiced:
+            # Track the background level with a slow moving average
+            if self.noise_floor is None:
+                self.noise_floor = energy
+            else:
+                self.noise_floor = 0.95 * self.noise_floor + 0.05 * energy
+        return voiced
+
+    def process_chunk(self, chunk):
+        """
+        Processes the next chunk of audio.
+        Returns "speech_start", "speech_end" or None.
+        """
+        chunk_start = self.samples_seen
+        self.samples_seen += len(chunk)
+        voiced = self.is_speech(chunk)
+
+        if not self.in_speech:
+            self._voiced_run = self._voiced_run + 1 if voiced else 0
+            if self._voiced_run >= self.start_chunks:
+                self.in_speech = True
+                self._silent_samples = 0
+                onset = chunk_start - (self.start_chunks - 1) * len(chunk)
+                self.speech_start = onset - int(self.pre_roll_seconds * self.RATE)
+                self.speech_end = self.samples_seen
+                return "speech_start"
+            return None
+
+        if voiced:
+            self._silent_samples = 0
+            self.speech_end = self.samples_seen
+        else:
+            self._silent_samples += len(chunk)
+
+        too_long = self.samples_seen - self.speech_start >= self.max_utterance_seconds * self.RATE
+        if self._silent_samples >= self.hangover_seconds * self.RATE or too_long:
+            self.in_speech = False
+            if too_long:
+                self.speech_end = self.samples_seen
+            return "speech_end"
+        return None
+
+    def follow_utterance(self, capture, max_wait_seconds=None, gate=None):
+        """
+        Follows a MicrophoneCapture chunk by chunk. Once speech has started,
+        yields (event, utterance) after every chunk, where `utterance` is the
+        speech so far (pre-roll included) as a zero-copy view. The last item
+        carries event "speech_end". Stops early if no speech starts within
+        `max_wait_seconds` or the capture stops.
+
+        `gate` is an optional function that returns True while no speech may
+        start, e.g. while our own voice is playing through the speakers.
+        """
+        self.reset()
+        base = capture.position
+        position = base
+
+        while True:
+            samples = capture.read(position, self.CHUNK, timeout=1.0)
+            if samples is None:
+                if not capture.running:
+                    return
+                continue
+            position += self.CHUNK
+
+            if gate is not None and not self.in_speech and gate():
+                # Playback picked up by the microphone must not become the next utterance,
+                # nor raise the noise floor
+                self.samples_seen += len(samples)
+                self._voiced_run = 0
+                event = None
+            else:
+                event = self.process_chunk(samples)
+            if event == "speech_start":
+                logger.info("🗣️ Speech detected...")
+
+            if self.speech_start is not None:
+                # Pre-roll may reach back before `base`, as long as the ring still holds it
+                start = max(base + self.speech_start, position - capture.capacity, 0)
+                end = base + self.speech_end
+                yield event, capture.read(start, end - start)
+                if event == "speech_end":
+                    return
+            elif max_wait_seconds is not None and (position - base) / self.RATE >= max_wait_seconds:
+                return
+
+    def capture_utterance(self, capture, max_wait_seconds=None, gate=None):
+        """
+        Waits for speech on a MicrophoneCapture and returns the utterance
+        (pre-roll included) as a zero-copy view as soon as the speaker stops.
+        Returns None if no speech starts within `max_wait_seconds`.
+        """
+        for event, utterance in self.follow_utterance(capture, max_wait_seconds, gate):
+            if event == "speech_end":
+                return utterance
+        return None
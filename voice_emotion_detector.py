@@ -1,16 +1,21 @@
+import logging
 import os
 import numpy as np
 import pyaudio
 import wave
 import time
-import librosa
-from pyAudioAnalysis import audioBasicIO
-from pyAudioAnalysis import ShortTermFeatures
+from audio_utils import write_wav, load_audio
+from model_registry import get_registry
+from voice_features import extract_features, summarize, StreamingFeatures
+from emotion_backends import make_backend, classify_features, CascadeState
 import warnings
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
 warnings.filterwarnings("ignore")
 
 class VoiceEmotionDetector:
-    def __init__(self):
+    def __init__(self, debug_audio=False, registry=None, extract_pitch=False, backend="rules"):
         # Audio recording parameters
         self.RATE = 16000
         self.CHUNK = 1024
@@ -19,36 +24,57 @@ class VoiceEmotionDetector:
         self.RECORD_SECONDS = 1  # Analyze 1-second chunks
         # Use absolute path for temporary file
         self.TEMP_WAV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion_audio_temp.wav")
+        # Only write captured audio to TEMP_WAV when debugging
+        self.debug_audio = debug_audio
+        
+        # The shared microphone capture comes from the model registry on first use
+        self.registry = registry or get_registry()
+        self.capture = None
+        self._capture_position = None
+        
+        # Pitch estimation is opt-in; the rules below do not use it
+        self.extract_pitch = extract_pitch
+        self.last_features = None
+        
+        # Classifier for the features: "rules", "wav2vec2", "cascade" or a backend object
+        self.owns_backend = isinstance(backend, str)
+        self.backend = make_backend(backend, self.registry) if self.owns_backend else backend
         
-        # Initialize PyAudio
-        self.audio = pyaudio.PyAudio()
+        # Sliding-window state for the streaming mode; raw audio is kept only for model backends,
+        # in a ring written at stream_position
+        self.stream_features = None
+        self.stream_audio = None
+        self.stream_position = 0
+        self.stream_state = None
         
         # Emotions to detect
         self.emotions = ["happy", "neutral", "sad", "angry"]
         
-        print("🎭 Voice Emotion Detector initialized")
+        logger.info("🎭 Voice Emotion Detector initialized")
     
     def record_audio(self):
-        """Records audio for RECORD_SECONDS and saves to a temporary WAV file."""
-        stream = self.audio.open(format=self.FORMAT, channels=self.CHANNELS, 
-                                rate=self.RATE, input=True, 
-                                frames_per_buffer=self.CHUNK)
+        """
+        Returns the next RECORD_SECONDS of audio from the shared microphone capture
+        as a zero-copy float32 view. Consecutive calls return back-to-back windows.
+        """
+        if self.capture is None:
+            self.capture = self.registry.acquire("microphone")
         
-        frames = []
-        for _ in range(0, int(self.RATE / self.CHUNK * self.RECORD_SECONDS)):
-            data = stream.read(self.CHUNK)
-            frames.append(data)
+        # Start from "now" the first time, or if we fell more than a ring behind
+        num_samples = int(self.RATE * self.RECORD_SECONDS)
+        position = self.capture.position
+        if self._capture_position is None or position - self._capture_position > self.capture.capacity:
+            self._capture_position = position
         
-        stream.stop_stream()
-        stream.close()
+        audio = self.capture.read(self._capture_position, num_samples, timeout=self.RECORD_SECONDS + 2)
+        if audio is None:
+            raise RuntimeError("Microphone capture is not delivering audio")
+        self._capture_position += num_samples
         
-        with wave.open(self.TEMP_WAV, 'wb') as wf:
-            wf.setnchannels(self.CHANNELS)
-            wf.setsampwidth(self.audio.get_sample_size(self.FORMAT))
-            wf.setframerate(self.RATE)
-            wf.writeframes(b''.join(frames))
+        if self.debug_audio:
+            write_wav(self.TEMP_WAV, audio, self.RATE, self.CHANNELS)
         
-        return self.TEMP_WAV
+        return audio
     
     def detect_emotion(self):
         """
@@ -57,19 +83,14 @@ class VoiceEmotionDetector:
         """
         try:
             # Record audio
-            audio_file = self.record_audio()
+            audio = self.record_audio()
             
-            # Analyze the audio file
-            emotion, confidence = self.detect_emotion_from_file(audio_file)
-            
-            # Clean up
-            if os.path.exists(audio_file):
-                os.remove(audio_file)
-                
-            return emotion, confidence
+            # Analyze the audio buffer
+            return self.detect_emotion_from_array(audio)
             
         except Exception as e:
-            print(f"Error in voice emotion detection: {str(e)}")
+            logger.error(f"Error in voice emotion detection: {str(e)}")
+            get_metrics().inc("errors_total", component="voice_emotion")
             return "neutral", 0.5
     
     def detect_emotion_from_file(self, audio_file):
@@ -78,53 +99,129 @@ class VoiceEmotionDetector:
         Returns a tuple of (emotion, confidence_score)
         """
         try:
-            # Load audio using librosa
-            audio, sr = librosa.load(audio_file, sr=self.RATE)
-            
-            # Extract features
-            f0, voiced_flag, voiced_probs = librosa.pyin(audio, fmin=librosa.note_to_hz('C2'), fmax=librosa.note_to_hz('C7'))
+            audio = load_audio(audio_file, self.RATE)
+        except Exception as e:
+            return "neutral", 0.5
+        return self.detect_emotion_from_array(audio)
+    
+    def detect_emotion_from_array(self, audio, sr=None, state=None):
+        """
+        Detects emotion from a float32 audio buffer.
+        The buffer is resampled only if `sr` differs from RATE.
+        `state` is the caller's CascadeState, carrying the cascade backend's history
+        between its calls; without one the call is classified on its own.
+        Returns a tuple of (emotion, confidence_score)
+        """
+        try:
+            if sr is not None and sr != self.RATE:
+                import librosa
+                audio = librosa.resample(audio, orig_sr=sr, target_sr=self.RATE)
             
-            # Calculate basic features
-            energy = np.mean(librosa.feature.rms(y=audio))
-            zero_crossing = np.mean(librosa.feature.zero_crossing_rate(y=audio))
-            spectral_centroid = np.mean(librosa.feature.spectral_centroid(y=audio, sr=sr))
+            # All frame features come from one shared framing/STFT pass
+            features = summarize(extract_features(audio, self.RATE, pitch=self.extract_pitch))
+            self.last_features = features
             
-            # Simple rules-based emotion detection
-            if energy > 0.01:  # High energy
-                if zero_crossing > 0.2:  # High zero crossing rate
-                    emotion = "angry"
-                    confidence = 0.7
-                else:
-                    emotion = "happy"
-                    confidence = 0.6
-            else:  # Low energy
-                if spectral_centroid < 1000:
-                    emotion = "sad"
-                    confidence = 0.6
-                else:
-                    emotion = "neutral"
-                    confidence = 0.8
-                    
-            return emotion, confidence
+            return self.backend.classify(audio, features, state or CascadeState())
             
         except Exception as e:
             return "neutral", 0.5
     
+    def start_stream(self, window_seconds=1.0):
+        """Resets the streaming mode with a sliding window of `window_seconds`"""
+        self.stream_features = StreamingFeatures(self.RATE, window_seconds)
+        self.stream_state = CascadeState()
+        if self.backend.name != "rules":
+            self.stream_audio = np.zeros(int(window_seconds * self.RATE), dtype=np.float32)
+            self.stream_position = 0
+    
+    def process_chunk(self, chunk):
+        """
+        Streaming mode: adds one chunk (e.g. CHUNK samples) to the sliding window
+        and returns the updated (emotion, confidence_score). Cost is O(chunk).
+        """
+        if self.stream_features is None:
+            self.start_stream()
+        self.stream_features.push(chunk)
+        features = self.stream_features.summary()
+        self.last_features = features
+        if self.stream_audio is None:
+            return self.backend.classify(None, features, self.stream_state)
+        
+        # Model backends see the same window the features cover; it is only
+        # made contiguous when a model runs on it. The cascade does not hold up
+        # the hop loop: its model answers on a later chunk.
+        self._push_stream_audio(chunk)
+        if self.backend.name == "cascade":
+            return self.backend.classify(self._stream_window, features, self.stream_state, wait=False)
+        return self.backend.classify(self._stream_window(), features, self.stream_state)
+    
+    def _push_stream_audio(self, chunk):
+        """Writes `chunk` into the audio ring, overwriting the oldest samples. Cost is O(chunk)."""
+        ring = self.stream_audio
+        chunk = np.asarray(chunk, dtype=np.float32)[-len(ring):]
+        start = self.stream_position % len(ring)
+        head = min(len(chunk), len(ring) - start)
+        ring[start:start + head] = chunk[:head]
+        ring[:len(chunk) - head] = chunk[head:]
+        self.stream_position += len(chunk)
+    
+    def _stream_window(self):
+        """The ring's contents oldest first, as one contiguous copy"""
+        start = self.stream_position % len(self.stream_audio)
+        return np.concatenate((self.stream_audio[start:], self.stream_audio[:start]))
+    
+    def stream_emotions(self, window_seconds=1.0, stop=None):
+        """
+        Generator over the shared microphone capture yielding an updated
+        (emotion, confidence_score) for every CHUNK of audio as it arrives.
+        Ends when the capture stops or the `stop` threading.Event is set.
+        """
+        if self.capture is None:
+            self.capture = self.registry.acquire("microphone")
+        self.start_stream(window_seconds)
+        
+        # Our own reference: cleanup() may clear self.capture while we are still reading
+        capture = self.capture
+        position = capture.position
+        while capture.running and not (stop is not None and stop.is_set()):
+            # Skip ahead if we fell more than a ring behind
+            if capture.position - position > capture.capacity:
+                position = capture.position
+            chunk = capture.read(position, self.CHUNK, timeout=1.0)
+            if chunk is None:
+                continue
+            position += self.CHUNK
+            yield self.process_chunk(chunk)
+    
+    def classify_features(self, energy, zero_crossing, spectral_centroid):
+        """
+        Simple rules-based emotion detection from mean frame features.
+        Returns a tuple of (emotion, confidence_score)
+        """
+        return classify_features(energy, zero_crossing, spectral_centroid)
+    
     def cleanup(self):
         """Clean up resources."""
-        self.audio.terminate()
+        if self.capture is not None:
+            self.registry.release("microphone")
+            self.capture = None
+        if self.owns_backend:
+            self.backend.close()
         if os.path.exists(self.TEMP_WAV):
             os.remove(self.TEMP_WAV)
 
 # Example usage
 if __name__ == "__main__":
+    from metrics import setup_logging
+    setup_logging()
     detector = VoiceEmotionDetector()
     try:
         print("🎙️ Listening for emotions... (Press Ctrl+C to stop)")
-        while True:
-            emotion, confidence = detector.detect_emotion()
-            print(f"Detected emotion: {emotion} (confidence: {confidence:.2f})")
-            time.sleep(0.1)
+        last_emotion = None
+        for emotion, confidence in detector.stream_emotions():
+            if emotion != last_emotion:
+                print(f"Detected emotion: {emotion} (confidence: {confidence:.2f})")
+                last_emotion = emotion
     except KeyboardInterrupt:
         print("\nStopping emotion detection")
     finally:
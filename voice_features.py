@@ -0,0 +1,213 @@
+from collections import deque
+import numpy as np
+
+# Same framing as the librosa defaults the detector used before
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+
+_windows = {}
+
+def _hann(length):
+    """Periodic Hann window (matches librosa's STFT window), cached per length"""
+    if length not in _windows:
+        _windows[length] = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(length) / length)).astype(np.float32)
+    return _windows[length]
+
+def frame_signal(audio, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    """
+    Centers and frames the signal once.
+    Returns (padded, frames) where frames is a zero-copy (n_frames, frame_length) view of padded.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    pad = frame_length // 2
+    padded = np.pad(audio, pad, mode="constant")
+    n_frames = 1 + (len(padded) - frame_length) // hop_length
+    frames = np.lib.stride_tricks.as_strided(
+        padded,
+        shape=(n_frames, frame_length),
+        strides=(padded.strides[0] * hop_length, padded.strides[0]),
+        writeable=False
+    )
+    return padded, frames
+
+def _frame_sums(values, n_frames, frame_length, hop_length):
+    """Per-frame sums of `values` from one cumulative sum (O(N) instead of O(N * frame/hop))"""
+    cumulative = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    starts = np.arange(n_frames) * hop_length
+    return cumulative[starts + frame_length] - cumulative[starts]
+
+def extract_features(audio, sr, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, pitch=False,
+                     fmin=65.0, fmax=2093.0):
+    """
+    Computes all frame features from a single framing/STFT pass.
+    Returns a dict of per-frame arrays: "rms", "zcr", "centroid" and,
+    when `pitch` is True, "f0" (NaN on unvoiced frames).
+    """
+    padded, frames = frame_signal(audio, frame_length, hop_length)
+    n_frames = len(frames)
+
+    # RMS energy and zero-crossing rate from running sums over the padded signal
+    energy = _frame_sums(np.square(padded, dtype=np.float32), n_frames, frame_length, hop_length)
+    rms = np.sqrt(energy / frame_length)
+
+    signs = np.signbit(padded)
+    crossings = np.empty(len(padded), dtype=np.float32)
+    crossings[0] = 0
+    np.not_equal(signs[1:], signs[:-1], out=crossings[1:], casting="unsafe")
+    zcr = _frame_sums(crossings, n_frames, frame_length, hop_length) / frame_length
+
+    # Spectral centroid from one windowed real FFT of the shared frames
+    magnitude = np.abs(np.fft.rfft(frames * _hann(frame_length), axis=1))
+    freqs = np.fft.rfftfreq(frame_length, 1.0 / sr)
+    total = magnitude.sum(axis=1)
+    centroid = np.divide(magnitude @ freqs, total, out=np.zeros(n_frames), where=total > 1e-10)
+
+    features = {"rms": rms, "zcr": zcr, "centroid": centroid}
+
+    if pitch:
+        voiced = (rms > 0.01) & (zcr < 0.3)
+        f0 = np.full(n_frames, np.nan)
+        if np.any(voiced):
+            f0[voiced] = estimate_pitch(frames[voiced], sr, fmin, fmax)
+        features["f0"] = f0
+
+    return features
+
+def estimate_pitch(frames, sr, fmin=65.0, fmax=2093.0, threshold=0.1):
+    """
+    YIN pitch estimate for a batch of frames (run on voiced frames only).
+    Returns f0 in Hz per frame, NaN where no period is found.
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    frame_length = frames.shape[1]
+    tau_min = max(1, int(sr / fmax))
+    tau_max = min(int(sr / fmin), frame_length // 2)
+    width = frame_length - tau_max
+
+    # Difference function d(tau) = E0 + E_tau - 2 r(tau), with r(tau) from an FFT cross-correlation
+    n_fft = 1 << int(np.ceil(np.log2(frame_length + width)))
+    spectrum = np.fft.rfft(frames, n_fft, axis=1)
+    head = np.fft.rfft(frames[:, :width], n_fft, axis=1)
+    corr = np.fft.irfft(spectrum * np.conj(head), n_fft, axis=1)[:, :tau_max + 1]
+
+    squares = np.concatenate((np.zeros((len(frames), 1)), np.cumsum(frames ** 2, axis=1)), axis=1)
+    taus = np.arange(tau_max + 1)
+    energy_0 = squares[:, width:width + 1]
+    energy_tau = squares[:, taus + width] - squares[:, taus]
+    diff = energy_0 + energy_tau - 2 * corr
+    diff[:, 0] = 0
+
+    # Cumulative mean normalized difference
+    cumulative = np.cumsum(diff[:, 1:], axis=1)
+    cmnd = np.ones_like(diff)
+    cmnd[:, 1:] = diff[:, 1:] * taus[1:] / np.maximum(cumulative, 1e-12)
+
+    search = cmnd[:, tau_min:]
+    below = search < threshold
+    first = np.where(below.any(axis=1), below.argmax(axis=1), search.argmin(axis=1))
+
+    # Walk down to the local minimum after the first dip below the threshold
+    tau = first + tau_min
+    for i in range(len(tau)):
+        while tau[i] + 1 <= tau_max and cmnd[i, tau[i] + 1] < cmnd[i, tau[i]]:
+            tau[i] += 1
+
+    # Parabolic interpolation around the minimum for sub-sample accuracy
+    rows = np.arange(len(tau))
+    left = cmnd[rows, np.maximum(tau - 1, 1)]
+    centre = cmnd[rows, tau]
+    right = cmnd[rows, np.minimum(tau + 1, tau_max)]
+    curvature = left - 2 * centre + right
+    shift = np.divide(0.5 * (left - right), curvature, out=np.zeros(len(tau)), where=np.abs(curvature) > 1e-12)
+    period = tau + np.clip(shift, -0.5, 0.5)
+
+    f0 = sr / period
+    f0[centre > 0.5] = np.nan  # Too aperiodic to be voiced
+    return f0
+
+def summarize(features):
+    """Mean of each per-frame feature (NaN-aware for f0)"""
+    summary = {
+        "energy": float(np.mean(features["rms"])),
+        "zero_crossing": float(np.mean(features["zcr"])),
+        "spectral_centroid": float(np.mean(features["centroid"])),
+    }
+    if "f0" in features:
+        f0 = features["f0"]
+        summary["pitch"] = float(np.nanmean(f0)) if np.any(~np.isnan(f0)) else None
+    return summary
+
+def frame_features(frames, sr):
+    """
+    Features of a small batch of already-framed audio, one row per frame:
+    columns are (rms, zcr, centroid). Used by the streaming window.
+    """
+    frames = np.asarray(frames, dtype=np.float32)
+    frame_length = frames.shape[1]
+    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_length
+    magnitude = np.abs(np.fft.rfft(frames * _hann(frame_length), axis=1))
+    freqs = np.fft.rfftfreq(frame_length, 1.0 / sr)
+    total = magnitude.sum(axis=1)
+    centroid = np.divide(magnitude @ freqs, total, out=np.zeros(len(frames)), where=total > 1e-10)
+    return np.column_stack((rms, zcr, centroid))
+
+class StreamingFeatures:
+    """
+    Sliding-window frame features updated incrementally as audio arrives.
+
+    Each push() frames only the new samples (plus one frame of history) and
+    keeps running sums of rms/zcr/centroid over the last `window_seconds`,
+    so the cost per update is O(hop), independent of the window length.
+    """
+    def __init__(self, sr, window_seconds=1.0, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+        self.sr = sr
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.max_frames = max(1, int(window_seconds * sr / hop_length))
+        self.reset()
+
+    def reset(self):
+        # Zero history plays the role of the centre padding in extract_features()
+        self._history = np.zeros(self.frame_length, dtype=np.float32)
+        self._since_frame = 0
+        self._frames = deque()
+        self._sums = np.zeros(3)
+
+    @property
+    def num_frames(self):
+        return len(self._frames)
+
+    def push(self, chunk):
+        """Adds new samples. Returns the number of frames that completed."""
+        chunk = np.asarray(chunk, dtype=np.float32)
+        data = np.concatenate((self._history, chunk))
+        offset = len(self._history)
+
+        # A frame ends every hop_length samples of new audio
+        first_end = self.hop_length - self._since_frame
+        ends = np.arange(first_end, len(chunk) + 1, self.hop_length) + offset
+        self._since_frame = (self._since_frame + len(chunk)) % self.hop_length
+        self._history = data[-self.frame_length:].copy()
+
+        if len(ends) == 0:
+            return 0
+
+        frames = np.stack([data[end - self.frame_length:end] for end in ends])
+        for row in frame_features(frames, self.sr):
+            self._frames.append(row)
+            self._sums += row
+            if len(self._frames) > self.max_frames:
+                self._sums -= self._frames.popleft()
+        return len(ends)
+
+    def summary(self):
+        """Mean features over the current window (same keys as summarize())"""
+        count = max(1, len(self._frames))
+        energy, zero_crossing, spectral_centroid = self._sums / count
+        return {
+            "energy": float(max(energy, 0.0)),
+            "zero_crossing": float(max(zero_crossing, 0.0)),
+            "spectral_centroid": float(max(spectral_centroid, 0.0)),
+        }